@@ -8,9 +8,12 @@ from .models import (
     AuditSession,
     PenilaianDiri,
     Audit,
+    BlobBerkas,
+    UnggahanBertahap,
     DokumenPendukung,
     CatatanAudit,
-    RekomendasiTindakLanjut
+    RekomendasiTindakLanjut,
+    SnapshotLaporan,
 )
 
 # ----------------------------
@@ -204,4 +207,42 @@ class RekomendasiTindakLanjutAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('audit', 'audit__penilaian_diri', 'audit__penilaian_diri__elemen')
\ No newline at end of file
+        return qs.select_related('audit', 'audit__penilaian_diri', 'audit__penilaian_diri__elemen')
+
+# ----------------------------
+# Kelas Admin untuk SnapshotLaporan
+# ----------------------------
+@admin.register(SnapshotLaporan)
+class SnapshotLaporanAdmin(admin.ModelAdmin):
+    list_display = ('audit_session', 'skor_akhir', 'tanggal_dibuat')
+    search_fields = ('audit_session__program_studi__nama', 'audit_session__tahun_akademik')
+    ordering = ['-tanggal_dibuat']
+    readonly_fields = ('audit_session', 'skor_akhir', 'data', 'tanggal_dibuat')
+    list_select_related = ('audit_session', 'audit_session__program_studi')
+
+# ----------------------------
+# Kelas Admin untuk BlobBerkas
+# ----------------------------
+@admin.register(BlobBerkas)
+class BlobBerkasAdmin(admin.ModelAdmin):
+    list_display = ('nama_asli', 'hash', 'ukuran', 'jumlah_referensi', 'status_preview', 'tanggal_dibuat')
+    search_fields = ('hash', 'nama_asli')
+    list_filter = ('status_preview',)
+    ordering = ['-tanggal_dibuat']
+    readonly_fields = (
+        'hash', 'nama', 'ukuran', 'content_type', 'nama_asli', 'jumlah_referensi',
+        'status_preview', 'jumlah_halaman', 'tanggal_dibuat',
+    )
+
+# ----------------------------
+# Kelas Admin untuk UnggahanBertahap
+# ----------------------------
+@admin.register(UnggahanBertahap)
+class UnggahanBertahapAdmin(admin.ModelAdmin):
+    list_display = ('nama_berkas', 'pengguna', 'diterima', 'ukuran', 'status', 'tanggal_diperbarui')
+    search_fields = ('nama', 'nama_berkas', 'pengguna__username')
+    list_filter = ('status',)
+    ordering = ['-tanggal_dibuat']
+    raw_id_fields = ('penilaian_diri', 'dokumen')
+    readonly_fields = ('pengguna', 'ukuran', 'checksum', 'diterima', 'tanggal_dibuat', 'tanggal_diperbarui')
+    list_select_related = ('pengguna',)
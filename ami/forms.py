@@ -1,4 +1,6 @@
 # ami/forms.py
+import re
+
 from django import forms
 from django.contrib.auth.models import User
 from .models import (
@@ -14,7 +16,10 @@ from .models import (
     Elemen,
     KoordinatorProgramStudi,
     KategoriKondisi,
+    UnggahanBertahap,
 )
+from .utils.storage import content_type_berkas
+from .utils.unggahan import validasi_nama_berkas, validasi_ukuran_berkas
 
 class LembagaAkreditasiForm(forms.ModelForm):
     class Meta:
@@ -289,6 +294,62 @@ class PenilaianDiriForm(forms.ModelForm):
                 )
         return url
 
+class ObjekTermuatField(forms.ModelChoiceField):
+    """ModelChoiceField yang mencari objek lewat fungsi pencari (tanpa query per nilai)"""
+
+    def __init__(self, pencari, *args, **kwargs):
+        self.pencari = pencari
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.pencari(int(value))
+        except (TypeError, ValueError):
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return obj
+
+
+class BaseModelFormSetTermuat(forms.BaseModelFormSet):
+    """
+    ModelFormSet yang memvalidasi field id terhadap queryset formset yang
+    sudah dimuat, bukan dengan satu query per baris.
+    """
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        nama = self._pk_field.name
+        field = form.fields[nama]
+        form.fields[nama] = ObjekTermuatField(
+            self._existing_object, field.queryset,
+            initial=field.initial, required=False, widget=field.widget,
+        )
+
+
+class PenilaianDiriBatchForm(PenilaianDiriForm):
+    """Form per baris PenilaianDiriFormSet yang ikut mengirim versi baris saat halaman dibuka"""
+    versi = forms.IntegerField(widget=forms.HiddenInput, min_value=1)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['versi'].initial = self.instance.versi
+
+
+# Formset untuk mengisi seluruh elemen satu kriteria/sesi sekaligus. Queryset
+# perlu memuat elemen (select_related) agar validasi skor_maksimal di
+# PenilaianDiri.clean() tidak memicu query per baris.
+PenilaianDiriFormSet = forms.modelformset_factory(
+    PenilaianDiri,
+    form=PenilaianDiriBatchForm,
+    formset=BaseModelFormSetTermuat,
+    extra=0,
+    can_delete=False,
+)
+
 class AuditForm(forms.ModelForm):
     class Meta:
         model = Audit
@@ -310,6 +371,41 @@ class DokumenPendukungForm(forms.ModelForm):
             'deskripsi': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
         }
 
+    def clean_file(self):
+        berkas = self.cleaned_data['file']
+        if 'file' in self.changed_data:
+            validasi_nama_berkas(berkas.name)
+            validasi_ukuran_berkas(berkas.size)
+        return berkas
+
+class UnggahanBertahapForm(forms.ModelForm):
+    """
+    Data awal unggahan bertahap (JSON), isi berkasnya dikirim per potongan.
+    Aturan berkasnya sama dengan DokumenPendukungForm; content_type
+    ditentukan server dari ekstensi nama_berkas.
+    """
+    class Meta:
+        model = UnggahanBertahap
+        fields = ['nama', 'deskripsi', 'nama_berkas', 'ukuran', 'checksum']
+
+    def clean_nama_berkas(self):
+        return validasi_nama_berkas(self.cleaned_data['nama_berkas'])
+
+    def clean_ukuran(self):
+        ukuran = self.cleaned_data['ukuran']
+        validasi_ukuran_berkas(ukuran)
+        return ukuran
+
+    def clean_checksum(self):
+        checksum = self.cleaned_data['checksum'].lower()
+        if checksum and not re.fullmatch(r'[0-9a-f]{64}', checksum):
+            raise forms.ValidationError('Checksum harus berupa SHA-256 heksadesimal (64 karakter).')
+        return checksum
+
+    def save(self, commit=True):
+        self.instance.content_type = content_type_berkas(self.instance.nama_berkas)
+        return super().save(commit)
+
 class RekomendasiTindakLanjutForm(forms.ModelForm):
     class Meta:
         model = RekomendasiTindakLanjut
@@ -0,0 +1,23 @@
+# ami/management/commands/backfill_snapshot_laporan.py
+from django.core.management.base import BaseCommand
+from ami.models import AuditSession
+from ami.utils.laporan import buat_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Membuat snapshot laporan untuk sesi audit berstatus SELESAI yang belum memilikinya'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ulang', action='store_true', help='Buat ulang snapshot yang sudah ada')
+
+    def handle(self, *args, **options):
+        sessions = AuditSession.objects.filter(status='SELESAI').select_related('program_studi')
+        if not options['ulang']:
+            sessions = sessions.filter(snapshot_laporan__isnull=True)
+
+        total = 0
+        for session in sessions:
+            snapshot = buat_snapshot(session)
+            total += 1
+            self.stdout.write(f'{session}: skor akhir {snapshot.skor_akhir}')
+        self.stdout.write(self.style.SUCCESS(f'Total {total} snapshot laporan dibuat.'))
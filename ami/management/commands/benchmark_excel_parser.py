@@ -0,0 +1,166 @@
+# ami/management/commands/benchmark_excel_parser.py
+import os
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from ami.utils.excel_parser import RowClassifier, hash_konten
+from ami.utils.instrumen_import import baca_baris
+
+CONTOH_WORKBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'utils', 'template.xlsx')
+
+
+# ----------------------------
+# Klasifikasi lama (acuan)
+# ----------------------------
+# Salinan beku pencarian per baris dari import_audit_template sebelum
+# RowClassifier dipakai: setiap jenis dicari di semua sel dengan regex yang
+# dikompilasi ulang per sel. Satu-satunya perbedaan: kode indikator tanpa
+# kode memakai hash_konten, karena hash() bawaan berubah antar proses.
+# Jangan diubah mengikuti RowClassifier; fungsi ini menjadi pembanding.
+KRITERIA_MAP_LAMA = {
+    "Kondisi Eksternal": "Kondisi Eksternal",
+    "Kriteria 1 - Visi, Misi,Tujuan dan Strategi": "1",
+    "Kriteria 2 - Tata Kelola, Tata Pamong, dan Kerjasama": "2",
+    "Kriteria 3 - Mahasiswa": "3",
+    "Kriteria 4 - Sumber Daya Manusia": "4",
+    "Kriteria 5 - Keuangan,Sarana danPrasarana": "5",
+    "Kriteria 6 - Pendidikan": "6",
+    "Kriteria 7 - Penelitian": "7",
+    "Kriteria 8 - Pengabdian kepada Masyarakat": "8",
+    "Analisis dan Penetapan Program Pengembangan": "Analisis dan Penetapan Program Pengembangan"
+}
+
+ELEMEN_MAP_LAMA = {
+    "Konsistensi dengan hasil analisis SWOT dan/atau analisis lain serta rencana pengembangan ke depan.": "1.1",
+    "Kesesuaian visi, misi, tujuan, dan strategi": "1.2",
+    "Kesesuaian kurikulum dengan capaian pembelajaran lulusan": "6.1",
+    "Relevansi kurikulum dengan kebutuhan pengguna": "6.2",
+    "Rencana pembelajaran tiap mata kuliah": "6.3",
+    "Proses pembelajaran": "6.4",
+    "Penilaian pembelajaran": "6.5",
+    "Integrasi kegiatan penelitian dan PkM dalam pembelajaran": "6.6"
+}
+
+
+def _find_kriteria(values):
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        match = re.search(r'Kriteria\s*(\d+\.?\d*)\s*[-:]?\s*(.*)', value)
+        if match:
+            return (match.group(1), match.group(2).strip())
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        for kriteria_nama, kode in KRITERIA_MAP_LAMA.items():
+            if kriteria_nama in value:
+                return (kode, kriteria_nama)
+    return None
+
+
+def _find_elemen(values):
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        match = re.search(r'(\d+\.\d+)\s+(.*)', value)
+        if match:
+            return (match.group(1), match.group(2).strip())
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        for elemen_nama, kode in ELEMEN_MAP_LAMA.items():
+            if elemen_nama in value:
+                return (kode, elemen_nama)
+    return None
+
+
+def _find_indikator(values):
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        if "Tabel" in value or "INDIKATOR PENILAIAN" in value:
+            continue
+        match = re.search(r'([A-Z]\d+\.?\d*)\s*[-:]?\s*(.*)', value)
+        if match:
+            return (match.group(1), match.group(2).strip())
+        if len(value) > 50:
+            if not any(prefix in value for prefix in ["Skor", "Jika", "Faktor", "Keterangan"]):
+                return ("I" + hash_konten(value)[:8], value)
+    return None
+
+
+def _find_skor(values):
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        match = re.search(r'Skor\s*(\d+)\s*[=:]\s*(.*)', value)
+        if match:
+            return (float(match.group(1)), match.group(2).strip())
+        match_alt = re.search(r'Skor\s*(\d+)\s*\n(.*)', value)
+        if match_alt:
+            return (float(match_alt.group(1)), match_alt.group(2).strip())
+    return None
+
+
+def _find_rumus(values):
+    for value in values:
+        if not isinstance(value, str):
+            continue
+        match = re.search(r'Skor\s*=\s*(.*)', value)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def klasifikasi_lama(values):
+    """Klasifikasi satu baris dengan cara lama: setiap jenis dicari di seluruh sel, berurutan"""
+    for jenis, cari in (
+        ('kriteria', _find_kriteria),
+        ('elemen', _find_elemen),
+        ('indikator', _find_indikator),
+        ('skor', _find_skor),
+        ('rumus', _find_rumus),
+    ):
+        hasil = cari(values)
+        if hasil:
+            return (jenis, hasil)
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark klasifikasi baris template (RowClassifier vs pencarian per baris lama)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file_path', nargs='?', default=CONTOH_WORKBOOK, help='Workbook contoh (default: ami/utils/template.xlsx)')
+        parser.add_argument('--ulang', type=int, default=20, help='Jumlah pengulangan klasifikasi')
+
+    def handle(self, *args, **options):
+        mulai = time.perf_counter()
+        rows = list(baca_baris(options['file_path']))
+        waktu_baca = time.perf_counter() - mulai
+        ulang = options['ulang']
+        jumlah = len(rows) * ulang
+        self.stdout.write(f'{len(rows)} baris dibaca dalam {waktu_baca:.3f} s, {ulang}x pengulangan')
+
+        classifier = RowClassifier()
+        hasil = {}
+        for nama, fungsi in (
+            ('cara lama', klasifikasi_lama),
+            ('RowClassifier', classifier.klasifikasi),
+        ):
+            mulai = time.perf_counter()
+            for _ in range(ulang):
+                keluaran = [fungsi(values) for values in rows]
+            durasi = time.perf_counter() - mulai
+            hasil[nama] = keluaran
+            self.stdout.write(
+                f'  {nama:<20} {durasi:8.3f} s  {durasi / jumlah * 1e6:8.1f} µs/baris  {jumlah / durasi:10,.0f} baris/detik'
+            )
+
+        berbeda = sum(1 for a, b in zip(*hasil.values()) if a != b)
+        if berbeda:
+            self.stderr.write(self.style.WARNING(f'{berbeda} baris diklasifikasikan berbeda'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Hasil klasifikasi kedua cara identik.'))
@@ -0,0 +1,33 @@
+# ami/management/commands/buat_preview_berkas.py
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from ami.models import BlobBerkas
+from ami.utils.preview import buat_preview, jadwalkan_preview
+
+
+class Command(BaseCommand):
+    help = 'Membuat preview halaman pertama untuk blob berkas yang belum diproses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ulang', action='store_true',
+            help='Proses ulang blob berstatus tidak didukung/gagal (misalnya setelah Pillow/PyMuPDF dipasang)',
+        )
+        parser.add_argument('--antrian', action='store_true', help='Kirim ke Celery alih-alih diproses langsung')
+
+    def handle(self, *args, **options):
+        if options['ulang']:
+            BlobBerkas.objects.filter(status_preview__in=['TIDAK_DIDUKUNG', 'GAGAL']).update(status_preview='BELUM')
+        hashes = list(BlobBerkas.objects.filter(status_preview='BELUM').values_list('hash', flat=True))
+
+        if options['antrian']:
+            for hash_hex in hashes:
+                jadwalkan_preview(hash_hex)
+            self.stdout.write(self.style.SUCCESS(f'{len(hashes)} blob dikirim ke antrian preview.'))
+            return
+
+        hasil = Counter(buat_preview(hash_hex) for hash_hex in hashes)
+        ringkasan = ', '.join(f'{status}: {jumlah}' for status, jumlah in sorted(hasil.items()))
+        self.stdout.write(self.style.SUCCESS(f'{len(hashes)} blob diproses ({ringkasan or "-"}).'))
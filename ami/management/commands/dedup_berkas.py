@@ -0,0 +1,50 @@
+# ami/management/commands/dedup_berkas.py
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ami.models import DokumenPendukung, RekomendasiTindakLanjut
+from ami.utils.storage import hash_dari_nama
+
+FIELD_BERKAS = [
+    (DokumenPendukung, 'file'),
+    (RekomendasiTindakLanjut, 'bukti_tindak_lanjut'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Memindahkan berkas bukti lama (sebelum storage blob) ke blob berbasis isi agar duplikatnya disimpan sekali'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Tampilkan berkas yang akan dipindahkan tanpa mengubah apa pun')
+
+    def handle(self, *args, **options):
+        dipindah = hilang = 0
+        for model, field in FIELD_BERKAS:
+            storage = model._meta.get_field(field).storage
+            rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list('pk', field)
+            for pk, name in rows.iterator():
+                if hash_dari_nama(name) is not None:
+                    continue
+                if not storage.exists(name):
+                    hilang += 1
+                    self.stdout.write(self.style.WARNING(f'{model.__name__} {pk}: berkas {name} tidak ditemukan'))
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f'{model.__name__} {pk}: {name}')
+                    dipindah += 1
+                    continue
+                with storage.open(name) as berkas:
+                    berkas.name = os.path.basename(name)
+                    with transaction.atomic():
+                        nama_blob = storage.save(name, berkas)
+                        model.objects.filter(pk=pk).update(**{field: nama_blob})
+                # Berkas lama (di luar blob/) dihapus langsung oleh storage
+                storage.delete(name)
+                dipindah += 1
+
+        aksi = 'akan dipindahkan' if options['dry_run'] else 'dipindahkan ke blob'
+        self.stdout.write(self.style.SUCCESS(
+            f'{dipindah} berkas {aksi}, {hilang} berkas tidak ditemukan.'
+        ))
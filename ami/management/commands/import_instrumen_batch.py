@@ -0,0 +1,188 @@
+# ami/management/commands/import_instrumen_batch.py
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from ami.models import LembagaAkreditasi
+from ami.utils.instrumen_import import (
+    PARSER,
+    PencatatWaktu,
+    inisialisasi_worker,
+    parse_di_worker,
+    terapkan_instrumen,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mengimpor beberapa workbook instrumen sekaligus: parse paralel di proses worker, '
+        'lalu ditulis ke database per lembaga akreditasi'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'sumber', type=str,
+            help='Direktori berisi file .xlsx (nama file = kode/nama lembaga) atau manifest CSV '
+                 '(kolom: file, lembaga, jenis, sheet)',
+        )
+        parser.add_argument('--jenis', choices=sorted(PARSER), default='template',
+                            help='Jenis parser untuk mode direktori (default: template)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Jumlah proses worker')
+        parser.add_argument('--no-cache', action='store_true', help='Abaikan cache hasil parse dan baca ulang file Excel')
+        parser.add_argument('--batch-size', type=int, default=500, help='Jumlah baris per batch bulk_create/bulk_update')
+
+    def handle(self, *args, **options):
+        sumber = options['sumber']
+        if os.path.isdir(sumber):
+            daftar = self._dari_direktori(sumber, options['jenis'])
+        elif os.path.isfile(sumber):
+            daftar = self._dari_manifest(sumber)
+        else:
+            raise CommandError(f'Sumber tidak ditemukan: {sumber}')
+        if not daftar:
+            raise CommandError('Tidak ada workbook untuk diimpor.')
+
+        lembaga_map = self._cari_lembaga({item['lembaga'] for item in daftar})
+        for item in daftar:
+            if item['jenis'] not in PARSER:
+                raise CommandError(f"Jenis parser tidak dikenal untuk {item['file']}: {item['jenis']}")
+            if item['lembaga'] not in lembaga_map:
+                raise CommandError(f"Lembaga akreditasi \"{item['lembaga']}\" untuk {item['file']} tidak ditemukan.")
+
+        mulai = time.perf_counter()
+
+        # Tahap 1: parse paralel. Koneksi database ditutup dulu agar tidak
+        # diwariskan ke proses worker.
+        connections.close_all()
+        hasil_parse, gagal = {}, {}
+        workers = max(1, min(options['workers'], len(daftar)))
+        self.stdout.write(self.style.NOTICE(f'Mem-parse {len(daftar)} workbook dengan {workers} worker...'))
+        with ProcessPoolExecutor(max_workers=workers, initializer=inisialisasi_worker) as executor:
+            futures = {
+                executor.submit(
+                    parse_di_worker, item['jenis'], item['file'], item['sheet'], not options['no_cache']
+                ): item['file']
+                for item in daftar
+            }
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    hasil_parse[file_path] = future.result()
+                except Exception as e:
+                    gagal[file_path] = str(e)
+                    self.stderr.write(self.style.ERROR(f'Gagal mem-parse {file_path}: {e}'))
+        waktu_parse = time.perf_counter() - mulai
+
+        # Tahap 2: tulis ke database, satu transaksi per lembaga
+        per_lembaga = {}
+        for item in daftar:
+            per_lembaga.setdefault(item['lembaga'], []).append(item['file'])
+
+        laporan_lembaga, gagal_lembaga = [], {}
+        for kunci, files in per_lembaga.items():
+            lembaga = lembaga_map[kunci]
+            if any(f in gagal for f in files):
+                self.stderr.write(self.style.WARNING(f'{lembaga.nama}: dilewati karena ada workbook yang gagal di-parse'))
+                continue
+            kriteria_list = [k for f in files for k in hasil_parse[f]['kriteria']]
+            waktu = PencatatWaktu()
+            try:
+                statistik = terapkan_instrumen(lembaga, kriteria_list, batch_size=options['batch_size'], waktu=waktu)
+            except Exception as e:
+                # Transaksi lembaga ini sudah di-rollback; lembaga lain tetap ditulis
+                gagal_lembaga[lembaga.nama] = str(e)
+                self.stderr.write(self.style.ERROR(f'Gagal menulis {lembaga.nama}: {e}'))
+                continue
+            laporan_lembaga.append((lembaga, statistik, waktu.total))
+
+        total = time.perf_counter() - mulai
+        self._cetak_laporan(daftar, hasil_parse, gagal, laporan_lembaga, gagal_lembaga, waktu_parse, total)
+
+        # Exit code bukan nol agar cron/CI tidak menganggap impor yang gagal sebagian sebagai sukses
+        masalah = []
+        if gagal:
+            masalah.append(f'{len(gagal)} workbook gagal di-parse')
+        if gagal_lembaga:
+            masalah.append(f'{len(gagal_lembaga)} lembaga gagal ditulis ke database')
+        if masalah:
+            raise CommandError(f"Impor batch tidak lengkap: {', '.join(masalah)}.")
+        self.stdout.write(self.style.SUCCESS('Impor batch selesai.'))
+
+    def _dari_direktori(self, direktori, jenis):
+        return [
+            {
+                'file': os.path.join(direktori, nama),
+                'lembaga': os.path.splitext(nama)[0],
+                'jenis': jenis,
+                'sheet': None,
+            }
+            for nama in sorted(os.listdir(direktori))
+            if nama.lower().endswith('.xlsx') and not nama.startswith('~$')
+        ]
+
+    def _dari_manifest(self, manifest):
+        dasar = os.path.dirname(os.path.abspath(manifest))
+        daftar = []
+        with open(manifest, newline='', encoding='utf-8') as f:
+            for baris in csv.DictReader(f):
+                file_path = (baris.get('file') or '').strip()
+                if not file_path:
+                    continue
+                daftar.append({
+                    'file': os.path.join(dasar, file_path),
+                    'lembaga': (baris.get('lembaga') or '').strip(),
+                    'jenis': (baris.get('jenis') or '').strip() or 'template',
+                    'sheet': (baris.get('sheet') or '').strip() or None,
+                })
+        for item in daftar:
+            if not os.path.exists(item['file']):
+                raise CommandError(f"File tidak ditemukan: {item['file']}")
+        return daftar
+
+    def _cari_lembaga(self, kunci_set):
+        """Cocokkan kunci (kode atau nama, tanpa membedakan huruf besar/kecil) dengan LembagaAkreditasi"""
+        kondisi = Q()
+        for kunci in kunci_set:
+            kondisi |= Q(kode__iexact=kunci) | Q(nama__iexact=kunci)
+        hasil = {}
+        for lembaga in LembagaAkreditasi.objects.filter(kondisi):
+            for kunci in kunci_set:
+                if kunci.lower() in (lembaga.kode.lower(), lembaga.nama.lower()):
+                    hasil[kunci] = lembaga
+        return hasil
+
+    def _cetak_laporan(self, daftar, hasil_parse, gagal, laporan_lembaga, gagal_lembaga, waktu_parse, total):
+        self.stdout.write('')
+        self.stdout.write('Parse per workbook:')
+        for item in daftar:
+            file_path = item['file']
+            nama = os.path.basename(file_path)
+            if file_path in gagal:
+                self.stdout.write(f'  {nama:<40} GAGAL: {gagal[file_path]}')
+                continue
+            hasil = hasil_parse[file_path]
+            sumber = 'cache' if hasil['dari_cache'] else item['jenis']
+            self.stdout.write(
+                f"  {nama:<40} {hasil['durasi']:8.3f} s  {hasil['jumlah_baris']:6d} baris  ({sumber})"
+            )
+
+        self.stdout.write('Penulisan per lembaga:')
+        for lembaga, statistik, durasi in laporan_lembaga:
+            self.stdout.write(
+                f"  {lembaga.nama:<40} {durasi:8.3f} s  "
+                f"kriteria {statistik['kriteria_baru']}/{statistik['kriteria_diperbarui']}/{statistik['kriteria_tetap']}  "
+                f"elemen {statistik['elemen_baru']}/{statistik['elemen_diperbarui']}/{statistik['elemen_tetap']}  "
+                f"(baru/diperbarui/tidak berubah)"
+            )
+        for nama, pesan in gagal_lembaga.items():
+            self.stdout.write(f'  {nama:<40} GAGAL: {pesan}')
+
+        jumlah_baris = sum(h['jumlah_baris'] for h in hasil_parse.values())
+        kecepatan = jumlah_baris / total if total else 0
+        self.stdout.write(f'Parse paralel: {waktu_parse:.3f} s')
+        self.stdout.write(f'Total        : {total:.3f} s  ({jumlah_baris} baris, {kecepatan:,.0f} baris/detik)')
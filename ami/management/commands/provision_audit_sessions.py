@@ -0,0 +1,24 @@
+# ami/management/commands/provision_audit_sessions.py
+from django.core.management.base import BaseCommand
+from ami.models import AuditSession
+from ami.utils.provisioning import provision_audit_session
+
+
+class Command(BaseCommand):
+    help = 'Membuat baris PenilaianDiri dan Audit yang belum ada untuk sesi audit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', type=int, help='ID sesi audit tertentu (default: semua sesi)')
+
+    def handle(self, *args, **options):
+        sessions = AuditSession.objects.all()
+        if options['session']:
+            sessions = sessions.filter(pk=options['session'])
+
+        total = 0
+        for session in sessions:
+            dibuat = provision_audit_session(session)
+            total += dibuat
+            if dibuat:
+                self.stdout.write(f'{session}: {dibuat} penilaian diri dibuat')
+        self.stdout.write(self.style.SUCCESS(f'Total {total} penilaian diri dibuat.'))
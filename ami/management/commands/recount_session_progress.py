@@ -0,0 +1,31 @@
+# ami/management/commands/recount_session_progress.py
+from django.core.management.base import BaseCommand
+from ami.models import AuditSession
+from ami.utils.progres import KOLOM_PROGRES, hitung_ulang_progres
+
+
+class Command(BaseCommand):
+    help = 'Menghitung ulang penghitung progres sesi audit dan memperbaiki selisihnya'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', type=int, help='ID sesi audit tertentu (default: semua sesi)')
+
+    def handle(self, *args, **options):
+        sessions = AuditSession.objects.all()
+        if options['session']:
+            sessions = sessions.filter(pk=options['session'])
+        session_ids = list(sessions.values_list('id', flat=True))
+
+        sebelum = {row['id']: row for row in sessions.values('id', *KOLOM_PROGRES)}
+        hitung_ulang_progres(session_ids)
+
+        diperbaiki = 0
+        for row in AuditSession.objects.filter(pk__in=session_ids).values('id', *KOLOM_PROGRES):
+            lama = sebelum[row['id']]
+            berubah = [f'{k}: {lama[k]} -> {row[k]}' for k in KOLOM_PROGRES if lama[k] != row[k]]
+            if berubah:
+                diperbaiki += 1
+                self.stdout.write(f'Sesi {row["id"]}: ' + ', '.join(berubah))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(session_ids)} sesi dihitung ulang, {diperbaiki} sesi diperbaiki.'
+        ))
@@ -5,15 +5,17 @@ from ami.models import AuditSession
 class Command(BaseCommand):
     help = 'Update status AuditSession based on current date'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Tampilkan jumlah perubahan tanpa menyimpan')
+
     def handle(self, *args, **options):
-        sessions = AuditSession.objects.exclude(status='SELESAI')
-        updated = 0
-        for session in sessions:
-            old_status = session.status
-            session.update_status()
-            if session.status != old_status:
-                updated += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'Updated {session} from {old_status} to {session.status}')
-                )
-        self.stdout.write(self.style.SUCCESS(f'Total {updated} sessions updated.'))
\ No newline at end of file
+        dry_run = options['dry_run']
+        hasil = AuditSession.objects.terapkan_transisi_status(dry_run=dry_run)
+
+        for transisi, jumlah in hasil.items():
+            self.stdout.write(f'{transisi}: {jumlah} sesi')
+        total = sum(hasil.values())
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'[dry-run] Total {total} perubahan status, tidak ada yang disimpan.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Total {total} perubahan status.'))
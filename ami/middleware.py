@@ -0,0 +1,17 @@
+# ami/middleware.py
+from .utils.peran import PERAN_ANONIM, peran_pengguna
+
+
+class PeranPenggunaMiddleware:
+    """Pasang request.peran (role, program_studi, auditor) sekali per request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            request.peran = peran_pengguna(user)
+        else:
+            request.peran = PERAN_ANONIM
+        return self.get_response(request)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 10:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0009_alter_audit_deskripsi_kondisi'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='programstudi',
+            name='jenjang',
+            field=models.CharField(choices=[('D3', 'Diploma 3'), ('D4', 'Diploma 4'), ('S1', 'Sarjana'), ('S2', 'Magister'), ('S3', 'Doktor'), ('Profesi', 'Profesi')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='SnapshotLaporan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('skor_akhir', models.FloatField(default=0)),
+                ('data', models.JSONField()),
+                ('tanggal_dibuat', models.DateTimeField(auto_now_add=True)),
+                ('audit_session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot_laporan', to='ami.auditsession')),
+            ],
+            options={
+                'verbose_name': 'Snapshot Laporan',
+                'verbose_name_plural': 'Snapshot Laporan',
+                'ordering': ['-tanggal_dibuat'],
+            },
+        ),
+    ]
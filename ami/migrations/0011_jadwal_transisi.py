@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0010_snapshotlaporan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditsession',
+            name='jadwal_transisi',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='auditsession',
+            index=models.Index(fields=['status'], name='ami_auditse_status_c5d8e3_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2 on 2026-10-18 10:23
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def isi_progres(apps, schema_editor):
+    AuditSession = apps.get_model('ami', 'AuditSession')
+    PenilaianDiri = apps.get_model('ami', 'PenilaianDiri')
+    Audit = apps.get_model('ami', 'Audit')
+    DokumenPendukung = apps.get_model('ami', 'DokumenPendukung')
+
+    for session_id in AuditSession.objects.values_list('id', flat=True):
+        penilaian = PenilaianDiri.objects.filter(audit_session_id=session_id).aggregate(
+            elemen=Count('id'), terisi=Count('id', filter=Q(skor__isnull=False)),
+        )
+        audit = Audit.objects.filter(penilaian_diri__audit_session_id=session_id).aggregate(
+            teraudit=Count('id', filter=Q(skor__isnull=False)),
+            sesuai=Count('id', filter=Q(kategori_kondisi='SESUAI')),
+            kt_minor=Count('id', filter=Q(kategori_kondisi='KT_MINOR')),
+            kt_mayor=Count('id', filter=Q(kategori_kondisi='KT_MAYOR')),
+        )
+        AuditSession.objects.filter(pk=session_id).update(
+            jumlah_elemen=penilaian['elemen'],
+            jumlah_terisi=penilaian['terisi'],
+            jumlah_teraudit=audit['teraudit'],
+            jumlah_dokumen=DokumenPendukung.objects.filter(penilaian_diri__audit_session_id=session_id).count(),
+            jumlah_sesuai=audit['sesuai'],
+            jumlah_kt_minor=audit['kt_minor'],
+            jumlah_kt_mayor=audit['kt_mayor'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0011_jadwal_transisi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_dokumen',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_elemen',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_kt_mayor',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_kt_minor',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_sesuai',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_teraudit',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='auditsession',
+            name='jumlah_terisi',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(isi_progres, migrations.RunPython.noop),
+    ]
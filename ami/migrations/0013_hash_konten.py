@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-18 10:29
+
+import hashlib
+import unicodedata
+
+from django.db import migrations, models
+
+
+def hash_konten(*bagian):
+    # Salinan ami.utils.excel_parser.hash_konten saat migrasi ini dibuat, agar
+    # migrasi tidak berubah bila fungsi aslinya berubah
+    data = '\x1f'.join(
+        ' '.join(unicodedata.normalize('NFKC', str(b)).split()) if b is not None else ''
+        for b in bagian
+    )
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def isi_hash_konten(apps, schema_editor):
+    Kriteria = apps.get_model('ami', 'Kriteria')
+    Elemen = apps.get_model('ami', 'Elemen')
+
+    kriteria = list(Kriteria.objects.only('id', 'nama'))
+    for obj in kriteria:
+        obj.hash_konten = hash_konten(obj.nama)
+    Kriteria.objects.bulk_update(kriteria, ['hash_konten'], batch_size=500)
+
+    elemen = list(Elemen.objects.only('id', 'nama', 'panduan'))
+    for obj in elemen:
+        obj.hash_konten = hash_konten(obj.nama, obj.panduan)
+    Elemen.objects.bulk_update(elemen, ['hash_konten'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0012_progres_sesi'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='elemen',
+            name='hash_konten',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='kriteria',
+            name='hash_konten',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(isi_hash_konten, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0013_hash_konten'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audit',
+            name='versi',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='penilaiandiri',
+            name='versi',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
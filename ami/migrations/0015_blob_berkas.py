@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 10:46
+
+import ami.utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0014_versi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobBerkas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('nama', models.CharField(max_length=255)),
+                ('ukuran', models.PositiveBigIntegerField(default=0)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('nama_asli', models.CharField(blank=True, default='', max_length=255)),
+                ('jumlah_referensi', models.PositiveIntegerField(default=0)),
+                ('tanggal_dibuat', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Blob Berkas',
+                'verbose_name_plural': 'Blob Berkas',
+                'ordering': ['-tanggal_dibuat'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='dokumenpendukung',
+            name='file',
+            field=models.FileField(storage=ami.utils.storage.storage_berkas, upload_to='dokumen_pendukung/'),
+        ),
+        migrations.AlterField(
+            model_name='rekomendasitindaklanjut',
+            name='bukti_tindak_lanjut',
+            field=models.FileField(blank=True, null=True, storage=ami.utils.storage.storage_berkas, upload_to='tindak_lanjut/'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 10:49
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0015_blob_berkas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnggahanBertahap',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nama', models.CharField(max_length=255)),
+                ('deskripsi', models.TextField(blank=True, null=True)),
+                ('nama_berkas', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('ukuran', models.PositiveBigIntegerField()),
+                ('checksum', models.CharField(blank=True, default='', max_length=64)),
+                ('diterima', models.PositiveBigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('AKTIF', 'Sedang Diunggah'), ('SELESAI', 'Selesai')], default='AKTIF', max_length=10)),
+                ('tanggal_dibuat', models.DateTimeField(auto_now_add=True)),
+                ('tanggal_diperbarui', models.DateTimeField(auto_now=True)),
+                ('dokumen', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ami.dokumenpendukung')),
+                ('pengguna', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unggahan_bertahap', to=settings.AUTH_USER_MODEL)),
+                ('penilaian_diri', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unggahan_bertahap', to='ami.penilaiandiri')),
+            ],
+            options={
+                'verbose_name': 'Unggahan Bertahap',
+                'verbose_name_plural': 'Unggahan Bertahap',
+                'ordering': ['-tanggal_dibuat'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ami', '0016_unggahan_bertahap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blobberkas',
+            name='jumlah_halaman',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='blobberkas',
+            name='status_preview',
+            field=models.CharField(choices=[('BELUM', 'Belum Diproses'), ('SIAP', 'Siap'), ('TIDAK_DIDUKUNG', 'Tidak Didukung'), ('GAGAL', 'Gagal')], default='BELUM', max_length=15),
+        ),
+    ]
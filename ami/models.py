@@ -1,9 +1,15 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from ami.utils.excel_parser import hash_konten
+from ami.utils.storage import storage_berkas
+
 # Model untuk kategori kondisi yang digunakan oleh auditor
 class KategoriKondisi(models.TextChoices):
     SESUAI = 'SESUAI', _('Sesuai')
@@ -26,8 +32,27 @@ class LembagaAkreditasi(models.Model):
     def __str__(self):
         return self.nama
 
-class Kriteria(models.Model):
+class HashKontenMixin:
+    """
+    Simpan hash konten dari field FIELD_KONTEN setiap kali objek disimpan,
+    agar impor instrumen bisa melewati baris yang isinya tidak berubah.
+    """
+    FIELD_KONTEN = ()
+
+    def hitung_hash_konten(self):
+        return hash_konten(*(getattr(self, nama) for nama in self.FIELD_KONTEN))
+
+    def save(self, *args, **kwargs):
+        self.hash_konten = self.hitung_hash_konten()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.FIELD_KONTEN):
+            kwargs['update_fields'] = {*update_fields, 'hash_konten'}
+        super().save(*args, **kwargs)
+
+class Kriteria(HashKontenMixin, models.Model):
     """Model untuk kriteria penilaian (level tertinggi)"""
+    FIELD_KONTEN = ('nama',)
+
     lembaga_akreditasi = models.ForeignKey(LembagaAkreditasi, on_delete=models.CASCADE, related_name='kriteria')
     kode = models.CharField(max_length=30, null=True)
     nama = models.CharField(max_length=255)
@@ -36,7 +61,7 @@ class Kriteria(models.Model):
         ('aktif', 'aktif'),
         ('tidak aktif', 'tidak aktif'),
     ], default='aktif')
-    
+    hash_konten = models.CharField(max_length=32, blank=True, default='', editable=False)
     
     class Meta:
         verbose_name = "Kriteria"
@@ -47,8 +72,10 @@ class Kriteria(models.Model):
     def __str__(self):
         return f"{self.kode} - {self.nama}"
 
-class Elemen(models.Model):
+class Elemen(HashKontenMixin, models.Model):
     """Model untuk elemen penilaian (bagian dari kriteria)"""
+    FIELD_KONTEN = ('nama', 'panduan')
+
     kriteria = models.ForeignKey(Kriteria, on_delete=models.CASCADE, related_name='elemen')
     kode = models.CharField(max_length=30)
     nama = models.CharField(max_length=255)
@@ -59,6 +86,8 @@ class Elemen(models.Model):
         ('aktif', 'aktif'),
         ('tidak aktif', 'tidak aktif'),
     ], default='aktif')
+    hash_konten = models.CharField(max_length=32, blank=True, default='', editable=False)
+
     class Meta:
         verbose_name = "Elemen"
         verbose_name_plural = "Elemen"
@@ -156,8 +185,122 @@ class Auditor(models.Model):
     def __str__(self):
         return f"{self.nama_lengkap} ({self.nuptk})"
 
-class AuditSession(models.Model):
+# Urutan transisi status sesi audit berdasarkan tanggal
+TRANSISI_STATUS = (
+    ('DRAFT', 'PENILAIAN_MANDIRI'),
+    ('PENILAIAN_MANDIRI', 'PENILAIAN_AUDITOR'),
+    ('PENILAIAN_AUDITOR', 'SELESAI'),
+)
+
+def syarat_transisi(today):
+    """Kondisi tanggal untuk masuk ke setiap status (sama dengan AuditSession.update_status)"""
+    ada_jadwal = Q(tanggal_mulai_penilaian_mandiri__isnull=False)
+    return {
+        'PENILAIAN_MANDIRI': ada_jadwal & Q(tanggal_mulai_penilaian_mandiri__lte=today),
+        'PENILAIAN_AUDITOR': ada_jadwal & Q(
+            tanggal_selesai_penilaian_mandiri__lt=today,
+            tanggal_mulai_penilaian_auditor__lte=today,
+        ),
+        'SELESAI': ada_jadwal & Q(tanggal_selesai_penilaian_auditor__lt=today),
+    }
+
+def status_efektif_expr(today):
+    """
+    Ekspresi SQL status sesi audit menurut tanggal hari ini.
+
+    Setiap transisi di TRANSISI_STATUS diterapkan berurutan di atas status
+    tersimpan, sehingga status efektif tidak pernah mundur dari status yang
+    sudah ada di database.
+    """
+    syarat = syarat_transisi(today)
+    mencapai = {TRANSISI_STATUS[0][0]: Q(status=TRANSISI_STATUS[0][0])}
+    for asal, tujuan in TRANSISI_STATUS:
+        mencapai[tujuan] = Q(status=tujuan) | (mencapai[asal] & syarat[tujuan])
+    # Status tertinggi diperiksa terlebih dahulu
+    return models.Case(
+        *[models.When(mencapai[tujuan], then=models.Value(tujuan)) for _, tujuan in reversed(TRANSISI_STATUS)],
+        default=models.F('status'),
+        output_field=models.CharField(),
+    )
+
+class NilaiAwalMixin:
+    """
+    Simpan nilai field NILAI_DILACAK saat objek dimuat dari database, agar
+    signal bisa membandingkan nilai sebelum/sesudah simpan (selisih penghitung
+    progres, perubahan status sesi) tanpa query tambahan.
+    """
+    NILAI_DILACAK = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.tandai_nilai_awal()
+        return instance
+
+    def tandai_nilai_awal(self):
+        self._nilai_awal = {
+            nama: self.__dict__[nama] for nama in self.NILAI_DILACAK if nama in self.__dict__
+        }
+
+class AuditSessionQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Sesi audit yang boleh diakses user: semua untuk superuser, sesi prodi
+        untuk koordinator, dan sesi yang ditugaskan untuk auditor (ketua/anggota).
+        """
+        from .utils.peran import peran_pengguna
+
+        if user.is_superuser:
+            return self
+        peran = peran_pengguna(user)
+        kondisi = Q(pk__in=[])
+        if peran.program_studi is not None:
+            kondisi |= Q(program_studi_id=peran.program_studi.id)
+        if peran.auditor is not None:
+            anggota = AuditSession.auditor_anggota.through.objects.filter(
+                auditor_id=peran.auditor.id
+            ).values('auditsession_id')
+            kondisi |= Q(auditor_ketua_id=peran.auditor.id) | Q(pk__in=anggota)
+        return self.filter(kondisi)
+
+    def with_effective_status(self, today=None):
+        """Anotasi `status_efektif` yang diturunkan dari tanggal tanpa menulis ke database"""
+        return self.annotate(status_efektif=status_efektif_expr(today or timezone.now().date()))
+
+    def terapkan_transisi_status(self, today=None, dry_run=False):
+        """
+        Jalankan transisi status DRAFT → PENILAIAN_MANDIRI → PENILAIAN_AUDITOR → SELESAI
+        dengan satu UPDATE per transisi dalam satu transaksi.
+
+        Transisi dijalankan berurutan sehingga sesi yang tertinggal beberapa
+        fase langsung sampai ke status yang sesuai tanggalnya. Mengembalikan
+        jumlah baris per transisi; dengan dry_run=True perubahan di-rollback.
+        """
+        from .utils.laporan import buat_snapshot
+
+        today = today or timezone.now().date()
+        syarat = syarat_transisi(today)
+        hasil = {}
+        with transaction.atomic():
+            for asal, tujuan in TRANSISI_STATUS:
+                qs = self.filter(syarat[tujuan], status=asal)
+                if tujuan == 'SELESAI':
+                    selesai_ids = list(qs.values_list('id', flat=True))
+                    qs = self.model.objects.filter(pk__in=selesai_ids)
+                hasil[f'{asal}->{tujuan}'] = qs.update(status=tujuan)
+
+            if dry_run:
+                transaction.set_rollback(True)
+            else:
+                # update() tidak memicu post_save, jadi snapshot laporan dibuat di sini
+                for session in self.model.objects.filter(pk__in=selesai_ids).select_related('program_studi'):
+                    buat_snapshot(session)
+        return hasil
+
+class AuditSession(NilaiAwalMixin, models.Model):
     """Model untuk sesi audit (mengelompokkan penilaian untuk satu siklus audit)"""
+    NILAI_DILACAK = ('status',)
+
     program_studi = models.ForeignKey(ProgramStudi, on_delete=models.CASCADE, related_name='audit_sessions')
     tahun_akademik = models.CharField(max_length=9)  # Contoh: "2023/2024"
     semester = models.CharField(max_length=2, choices=[
@@ -177,7 +320,33 @@ class AuditSession(models.Model):
     
     auditor_ketua = models.ForeignKey(Auditor, on_delete=models.SET_NULL, null=True, blank=True, related_name='ketua_audit_sessions')
     auditor_anggota = models.ManyToManyField(Auditor, related_name='anggota_audit_sessions', blank=True)
+    # Tugas Celery per batas fase: {status_tujuan: {'task_id': ..., 'eta': ...}}
+    jadwal_transisi = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Penghitung progres, dijaga oleh ami.utils.progres (lihat recount_session_progress)
+    jumlah_elemen = models.PositiveIntegerField(default=0, editable=False)
+    jumlah_terisi = models.PositiveIntegerField(default=0, editable=False)
+    jumlah_teraudit = models.PositiveIntegerField(default=0, editable=False)
+    jumlah_dokumen = models.PositiveIntegerField(default=0, editable=False)
+    jumlah_sesuai = models.PositiveIntegerField(default=0, editable=False)
+    jumlah_kt_minor = models.PositiveIntegerField(default=0, editable=False)
+    jumlah_kt_mayor = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = AuditSessionQuerySet.as_manager()
     
+    @property
+    def persentase_terisi(self):
+        return (self.jumlah_terisi / self.jumlah_elemen * 100) if self.jumlah_elemen else 0
+
+    @property
+    def persentase_teraudit(self):
+        return (self.jumlah_teraudit / self.jumlah_elemen * 100) if self.jumlah_elemen else 0
+
+    def get_status_efektif_display(self):
+        """Label status efektif (dari with_effective_status) atau status tersimpan"""
+        status = getattr(self, 'status_efektif', self.status)
+        return dict(self._meta.get_field('status').flatchoices).get(status, status)
+
     def update_status(self):
         """Perbarui status berdasarkan tanggal saat ini."""
         today = timezone.now().date()
@@ -211,12 +380,29 @@ class AuditSession(models.Model):
         verbose_name_plural = "Sesi Audit"
         unique_together = ['program_studi', 'tahun_akademik', 'semester']
         ordering = ['-tanggal_mulai_penilaian_mandiri']
+        indexes = [models.Index(fields=['status'])]
     
     def __str__(self):
         return f"{self.program_studi} - {self.tahun_akademik} {self.semester}"
 
-class PenilaianDiri(models.Model):
+class VersiMixin:
+    """
+    Naikkan kolom versi setiap kali objek yang sudah ada disimpan, untuk
+    optimistic concurrency (lihat ami.utils.penilaian.perbarui_bersyarat).
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.versi += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'versi'}
+        super().save(*args, **kwargs)
+
+class PenilaianDiri(NilaiAwalMixin, VersiMixin, models.Model):
     """Model untuk penilaian diri yang dilakukan oleh program studi"""
+    NILAI_DILACAK = ('skor',)
+
     audit_session = models.ForeignKey(AuditSession, on_delete=models.CASCADE, related_name='penilaian_diri')
     elemen = models.ForeignKey(Elemen, on_delete=models.CASCADE, null=True)
     skor = models.FloatField(null=True, blank=True)
@@ -228,6 +414,7 @@ class PenilaianDiri(models.Model):
         ('TERISI', 'Sudah Terisi'),
         ('DIAJUKAN', 'Diajukan untuk Audit'),
     ], default='BELUM')
+    versi = models.PositiveIntegerField(default=1, editable=False)
     
     class Meta:
         verbose_name = "Penilaian Diri"
@@ -236,24 +423,29 @@ class PenilaianDiri(models.Model):
         ordering = ['elemen__kode']
     
     def clean(self):
+        from ami.utils.penilaian import validasi_skor
+
         super().clean()
         if self.skor is not None:
-            if self.skor < 0:
-                raise ValidationError({'skor': 'Skor tidak boleh kurang dari 0.'})
-            if self.elemen and self.skor > self.elemen.skor_maksimal:
-                raise ValidationError({
-                    'skor': f'Skor tidak boleh melebihi {self.elemen.skor_maksimal} (skor maksimal untuk indikator ini).'
-                })
+            validasi_skor(self.skor, self.elemen.skor_maksimal if self.elemen else None)
 
-    def save(self, *args, **kwargs):
-        self.full_clean()  # memastikan validasi dijalankan sebelum save
+    def save(self, *args, validate=True, **kwargs):
+        """
+        Simpan penilaian diri. Secara default full_clean() dijalankan dulu;
+        validate=False untuk pembaruan internal yang datanya sudah divalidasi
+        (mis. perubahan status, data dari form yang sudah is_valid()).
+        """
+        if validate:
+            self.full_clean()  # memastikan validasi dijalankan sebelum save
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.elemen.kode} - {self.audit_session.program_studi}"
 
-class Audit(models.Model):
+class Audit(NilaiAwalMixin, VersiMixin, models.Model):
     """Model untuk hasil audit yang dilakukan oleh auditor"""
+    NILAI_DILACAK = ('skor', 'kategori_kondisi')
+
     penilaian_diri = models.OneToOneField(PenilaianDiri, on_delete=models.CASCADE, related_name='audit')
     skor = models.FloatField(null=True, blank=True)
     deskripsi_kondisi = models.TextField(default="Tolong Tuliskan Deskrpisi Penilaian")
@@ -261,6 +453,7 @@ class Audit(models.Model):
     komentar = models.TextField(blank=True, null=True)
     tanggal_audit = models.DateTimeField(auto_now_add=True)
     auditor = models.ForeignKey(Auditor, on_delete=models.SET_NULL, null=True, blank=True)
+    versi = models.PositiveIntegerField(default=1, editable=False)
     
     class Meta:
         verbose_name = "Audit"
@@ -270,11 +463,48 @@ class Audit(models.Model):
     def __str__(self):
         return f"Audit {self.penilaian_diri.elemen.kode} - {self.penilaian_diri.audit_session.program_studi}"
 
-class DokumenPendukung(models.Model):
+class BlobBerkas(models.Model):
+    """Model untuk isi berkas unggahan yang disimpan sekali per hash (lihat ContentAddressedStorage)"""
+    hash = models.CharField(max_length=64, unique=True)  # SHA-256 isi berkas
+    nama = models.CharField(max_length=255)  # path blob di storage
+    ukuran = models.PositiveBigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    nama_asli = models.CharField(max_length=255, blank=True, default='')  # nama saat pertama diunggah
+    jumlah_referensi = models.PositiveIntegerField(default=0)
+    # Preview halaman pertama (lihat ami.utils.preview)
+    status_preview = models.CharField(max_length=15, choices=[
+        ('BELUM', 'Belum Diproses'),
+        ('SIAP', 'Siap'),
+        ('TIDAK_DIDUKUNG', 'Tidak Didukung'),
+        ('GAGAL', 'Gagal'),
+    ], default='BELUM')
+    jumlah_halaman = models.PositiveIntegerField(null=True, blank=True)
+    tanggal_dibuat = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Blob Berkas"
+        verbose_name_plural = "Blob Berkas"
+        ordering = ['-tanggal_dibuat']
+
+    def __str__(self):
+        return f"{self.nama_asli or self.hash} ({self.jumlah_referensi} referensi)"
+
+class BerkasBlobMixin:
+    """
+    Simpan objek pemilik FileField berkas blob dalam satu transaksi: referensi
+    blob ditambah saat field berkas disimpan (sebelum INSERT/UPDATE), jadi
+    harus ikut dibatalkan bila baris pemiliknya gagal disimpan.
+    """
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class DokumenPendukung(BerkasBlobMixin, models.Model):
     """Model untuk dokumen pendukung tambahan"""
     penilaian_diri = models.ForeignKey(PenilaianDiri, on_delete=models.CASCADE, related_name='dokumen_pendukung')
     nama = models.CharField(max_length=255)
-    file = models.FileField(upload_to='dokumen_pendukung/')
+    file = models.FileField(upload_to='dokumen_pendukung/', storage=storage_berkas)
     deskripsi = models.TextField(blank=True, null=True)
     tanggal_upload = models.DateTimeField(auto_now_add=True)
     
@@ -286,6 +516,36 @@ class DokumenPendukung(models.Model):
     def __str__(self):
         return f"{self.nama} - {self.penilaian_diri.elemen.kode}"
 
+class UnggahanBertahap(models.Model):
+    """Model untuk unggahan dokumen pendukung besar yang dikirim per potongan (chunk) dan dapat dilanjutkan"""
+    STATUS_CHOICES = [
+        ('AKTIF', 'Sedang Diunggah'),
+        ('SELESAI', 'Selesai'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    penilaian_diri = models.ForeignKey(PenilaianDiri, on_delete=models.CASCADE, related_name='unggahan_bertahap')
+    pengguna = models.ForeignKey(User, on_delete=models.CASCADE, related_name='unggahan_bertahap')
+    nama = models.CharField(max_length=255)  # nama DokumenPendukung yang akan dibuat
+    deskripsi = models.TextField(blank=True, null=True)
+    nama_berkas = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    ukuran = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64, blank=True, default='')  # SHA-256 heksadesimal dari klien
+    diterima = models.PositiveBigIntegerField(default=0)  # jumlah byte yang sudah ditulis (offset berikutnya)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='AKTIF')
+    dokumen = models.ForeignKey(DokumenPendukung, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    tanggal_dibuat = models.DateTimeField(auto_now_add=True)
+    tanggal_diperbarui = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Unggahan Bertahap"
+        verbose_name_plural = "Unggahan Bertahap"
+        ordering = ['-tanggal_dibuat']
+
+    def __str__(self):
+        return f"{self.nama_berkas} ({self.diterima}/{self.ukuran} byte)"
+
 class CatatanAudit(models.Model):
     """Model untuk catatan atau komentar selama proses audit"""
     audit = models.ForeignKey(Audit, on_delete=models.CASCADE, related_name='catatan')
@@ -302,7 +562,7 @@ class CatatanAudit(models.Model):
     def __str__(self):
         return f"Catatan oleh {self.auditor} pada {self.tanggal_catatan}"
 
-class RekomendasiTindakLanjut(models.Model):
+class RekomendasiTindakLanjut(BerkasBlobMixin, models.Model):
     """Model untuk rekomendasi tindak lanjut dari hasil audit"""
     audit = models.ForeignKey(Audit, on_delete=models.CASCADE, related_name='rekomendasi')
     deskripsi = models.TextField()
@@ -317,7 +577,7 @@ class RekomendasiTindakLanjut(models.Model):
         ('SEDANG', 'Sedang Ditindaklanjuti'),
         ('SELESAI', 'Selesai'),
     ], default='BELUM')
-    bukti_tindak_lanjut = models.FileField(upload_to='tindak_lanjut/', blank=True, null=True)
+    bukti_tindak_lanjut = models.FileField(upload_to='tindak_lanjut/', storage=storage_berkas, blank=True, null=True)
     
     class Meta:
         verbose_name = "Rekomendasi Tindak Lanjut"
@@ -325,4 +585,19 @@ class RekomendasiTindakLanjut(models.Model):
         ordering = ['-tenggat_waktu']
     
     def __str__(self):
-        return f"Rekomendasi untuk {self.audit.penilaian_diri.elemen.kode}"
\ No newline at end of file
+        return f"Rekomendasi untuk {self.audit.penilaian_diri.elemen.kode}"
+
+class SnapshotLaporan(models.Model):
+    """Model untuk hasil laporan yang dibekukan ketika sesi audit selesai"""
+    audit_session = models.OneToOneField(AuditSession, on_delete=models.CASCADE, related_name='snapshot_laporan')
+    skor_akhir = models.FloatField(default=0)
+    data = models.JSONField()  # hasil SessionReport.hitung()
+    tanggal_dibuat = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Snapshot Laporan"
+        verbose_name_plural = "Snapshot Laporan"
+        ordering = ['-tanggal_dibuat']
+
+    def __str__(self):
+        return f"Snapshot {self.audit_session}"
@@ -0,0 +1,249 @@
+# ami/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Audit,
+    AuditSession,
+    BlobBerkas,
+    DokumenPendukung,
+    Elemen,
+    Kriteria,
+    LembagaAkreditasi,
+    PenilaianDiri,
+    ProgramStudi,
+    RekomendasiTindakLanjut,
+    SnapshotLaporan,
+    UnggahanBertahap,
+)
+from .utils.katalog import BAGIAN_INSTRUMEN, BAGIAN_REFERENSI, katalog
+from .utils.laporan import buat_snapshot
+from .utils.penjadwalan import batalkan_transisi, jadwalkan_transisi
+from .utils.preview import jadwalkan_preview
+from .utils.progres import hitung_ulang_progres, kontribusi_progres, selisih_progres, ubah_progres
+from .utils.provisioning import provision_audit_session, provision_elemen
+from .utils.report_cache import naikkan_versi
+from .utils.storage import hash_dari_nama
+from .utils.unggahan import hapus_berkas_sementara
+
+
+@receiver(post_save, sender=AuditSession)
+def siapkan_penilaian_sesi(sender, instance, created, update_fields=None, **kwargs):
+    """Siapkan baris penilaian saat sesi dibuat atau prodinya diubah"""
+    # Perubahan status saja (update_status) tidak mengubah instrumen
+    if update_fields and set(update_fields) <= {'status'}:
+        return
+    provision_audit_session(instance)
+
+
+@receiver(post_save, sender=AuditSession)
+def bekukan_laporan_sesi(sender, instance, created, **kwargs):
+    """Simpan snapshot laporan ketika sesi menjadi SELESAI, hapus bila sesi dibuka kembali"""
+    # None bila status lama tidak diketahui (objek tidak dimuat dari database)
+    status_lama = getattr(instance, '_nilai_awal', {}).get('status')
+    if instance.status == 'SELESAI':
+        if status_lama not in (None, 'SELESAI'):
+            # Baru ditutup: bekukan ulang walaupun masih ada snapshot dari penutupan sebelumnya
+            buat_snapshot(instance)
+        elif not SnapshotLaporan.objects.filter(audit_session=instance).exists():
+            buat_snapshot(instance)
+    elif status_lama == 'SELESAI':
+        SnapshotLaporan.objects.filter(audit_session=instance).delete()
+    instance.tandai_nilai_awal()
+
+
+@receiver(post_save, sender=AuditSession)
+def jadwalkan_transisi_sesi(sender, instance, update_fields=None, **kwargs):
+    """Jadwalkan ulang tugas transisi fase setelah tanggal/status sesi tersimpan"""
+    if update_fields and set(update_fields) <= {'jadwal_transisi'}:
+        return
+    session_id = instance.pk
+    transaction.on_commit(lambda: jadwalkan_transisi(session_id))
+
+
+@receiver(post_delete, sender=AuditSession)
+def batalkan_transisi_sesi(sender, instance, **kwargs):
+    jadwal = instance.jadwal_transisi
+    transaction.on_commit(lambda: batalkan_transisi(jadwal))
+
+
+@receiver(post_save, sender=Elemen)
+def siapkan_penilaian_elemen(sender, instance, created, **kwargs):
+    """Tambahkan elemen baru ke sesi audit yang masih berjalan"""
+    if created:
+        provision_elemen(instance)
+
+
+# ----------------------------
+# Invalidasi cache laporan
+# ----------------------------
+def _session_id_penilaian(penilaian_diri_id):
+    return (
+        PenilaianDiri.objects.filter(pk=penilaian_diri_id)
+        .values_list('audit_session_id', flat=True)
+        .first()
+    )
+
+
+def _cari_session_id(instance):
+    if isinstance(instance, PenilaianDiri):
+        return instance.audit_session_id
+    if isinstance(instance, (Audit, DokumenPendukung)):
+        if instance._meta.get_field('penilaian_diri').is_cached(instance):
+            return instance.penilaian_diri.audit_session_id
+        return _session_id_penilaian(instance.penilaian_diri_id)
+    if isinstance(instance, RekomendasiTindakLanjut):
+        return (
+            Audit.objects.filter(pk=instance.audit_id)
+            .values_list('penilaian_diri__audit_session_id', flat=True)
+            .first()
+        )
+    return None
+
+
+def session_id_terkait(instance):
+    """Cari ID sesi audit dari objek turunan PenilaianDiri (disimpan pada objek)"""
+    if '_ami_session_id' not in instance.__dict__:
+        instance._ami_session_id = _cari_session_id(instance)
+    return instance._ami_session_id
+
+
+@receiver(post_save, sender=PenilaianDiri)
+@receiver(post_delete, sender=PenilaianDiri)
+@receiver(post_save, sender=Audit)
+@receiver(post_delete, sender=Audit)
+@receiver(post_save, sender=DokumenPendukung)
+@receiver(post_delete, sender=DokumenPendukung)
+@receiver(post_save, sender=RekomendasiTindakLanjut)
+@receiver(post_delete, sender=RekomendasiTindakLanjut)
+def invalidasi_laporan(sender, instance, **kwargs):
+    """Naikkan versi data laporan sesi setiap kali datanya berubah"""
+    session_id = session_id_terkait(instance)
+    if session_id is not None:
+        naikkan_versi(session_id)
+
+
+# ----------------------------
+# Penghitung progres sesi audit
+# ----------------------------
+@receiver(post_save, sender=PenilaianDiri)
+@receiver(post_save, sender=Audit)
+@receiver(post_save, sender=DokumenPendukung)
+def perbarui_progres_sesi(sender, instance, created, **kwargs):
+    """Perbarui penghitung progres sesi dengan selisih nilai sebelum/sesudah simpan"""
+    session_id = session_id_terkait(instance)
+    if session_id is None:
+        return
+    if created:
+        ubah_progres(session_id, kontribusi_progres(instance))
+    elif isinstance(instance, (PenilaianDiri, Audit)):
+        nilai_awal = getattr(instance, '_nilai_awal', None)
+        if nilai_awal is None or len(nilai_awal) < len(instance.NILAI_DILACAK):
+            # Nilai lama tidak diketahui (objek tidak dimuat dari database atau field ditunda)
+            hitung_ulang_progres([session_id])
+        else:
+            lama = kontribusi_progres(instance, nilai_awal)
+            ubah_progres(session_id, selisih_progres(lama, kontribusi_progres(instance)))
+    if isinstance(instance, (PenilaianDiri, Audit)):
+        instance.tandai_nilai_awal()
+
+
+@receiver(post_delete, sender=PenilaianDiri)
+@receiver(post_delete, sender=Audit)
+@receiver(post_delete, sender=DokumenPendukung)
+def kurangi_progres_sesi(sender, instance, **kwargs):
+    session_id = session_id_terkait(instance)
+    if session_id is not None:
+        nilai = getattr(instance, '_nilai_awal', None)
+        ubah_progres(session_id, selisih_progres(kontribusi_progres(instance, nilai), {}))
+
+
+# ----------------------------
+# Invalidasi katalog instrumen
+# ----------------------------
+@receiver(post_save, sender=Kriteria)
+@receiver(post_delete, sender=Kriteria)
+@receiver(post_save, sender=Elemen)
+@receiver(post_delete, sender=Elemen)
+def invalidasi_katalog_instrumen(sender, instance, **kwargs):
+    """Pohon instrumen berubah (kriteria/elemen bisa berpindah lembaga, jadi semua pohon dimuat ulang)"""
+    katalog.invalidasi(BAGIAN_INSTRUMEN)
+
+
+@receiver(post_save, sender=ProgramStudi)
+@receiver(post_delete, sender=ProgramStudi)
+def invalidasi_katalog_program_studi(sender, instance, **kwargs):
+    katalog.invalidasi(BAGIAN_REFERENSI)
+
+
+@receiver(post_save, sender=LembagaAkreditasi)
+@receiver(post_delete, sender=LembagaAkreditasi)
+def invalidasi_katalog_lembaga(sender, instance, **kwargs):
+    katalog.invalidasi(BAGIAN_INSTRUMEN, BAGIAN_REFERENSI)
+
+
+# ----------------------------
+# Referensi blob berkas bukti
+# ----------------------------
+FIELD_BERKAS = {
+    DokumenPendukung: ('file',),
+    RekomendasiTindakLanjut: ('bukti_tindak_lanjut',),
+}
+
+
+def _lepas_berkas(sender, field, name):
+    """Lepas referensi blob setelah commit (delete() pada ContentAddressedStorage)"""
+    if name:
+        storage = sender._meta.get_field(field).storage
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(pre_save, sender=DokumenPendukung)
+@receiver(pre_save, sender=RekomendasiTindakLanjut)
+def catat_berkas_lama(sender, instance, update_fields=None, **kwargs):
+    """Catat nama berkas lama yang akan diganti/dikosongkan oleh penyimpanan ini"""
+    fields = FIELD_BERKAS[sender]
+    if update_fields is not None:
+        fields = tuple(f for f in fields if f in update_fields)
+    instance._ami_berkas_lama = []
+    if instance.pk is None or not fields:
+        return
+    lama = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    if lama is None:
+        return
+    for field in fields:
+        if lama[field] and lama[field] != getattr(instance, field).name:
+            instance._ami_berkas_lama.append((field, lama[field]))
+
+
+@receiver(post_save, sender=DokumenPendukung)
+@receiver(post_save, sender=RekomendasiTindakLanjut)
+def lepas_berkas_lama(sender, instance, **kwargs):
+    for field, name in instance.__dict__.pop('_ami_berkas_lama', []):
+        _lepas_berkas(sender, field, name)
+
+
+@receiver(post_delete, sender=DokumenPendukung)
+@receiver(post_delete, sender=RekomendasiTindakLanjut)
+def lepas_berkas_terhapus(sender, instance, **kwargs):
+    for field in FIELD_BERKAS[sender]:
+        _lepas_berkas(sender, field, getattr(instance, field).name)
+
+
+@receiver(post_delete, sender=UnggahanBertahap)
+def hapus_unggahan_bertahap(sender, instance, **kwargs):
+    """Buang berkas sementara unggahan yang dibatalkan/kedaluwarsa"""
+    if instance.status == 'AKTIF':
+        transaction.on_commit(lambda: hapus_berkas_sementara(instance))
+
+
+# ----------------------------
+# Preview dokumen pendukung
+# ----------------------------
+@receiver(post_save, sender=DokumenPendukung)
+def jadwalkan_preview_dokumen(sender, instance, **kwargs):
+    """Buat preview di latar belakang untuk blob yang belum pernah diproses"""
+    hash_hex = hash_dari_nama(instance.file.name)
+    if hash_hex and BlobBerkas.objects.filter(hash=hash_hex, status_preview='BELUM').exists():
+        transaction.on_commit(lambda: jadwalkan_preview(hash_hex))
@@ -1,9 +1,31 @@
 # yourapp/tasks.py
 from celery import shared_task
 from .models import AuditSession
+from .utils.penjadwalan import jadwalkan_transisi, jadwalkan_transisi_mendatang
+from .utils.preview import buat_preview
+from .utils.unggahan import bersihkan_unggahan_kedaluwarsa
 
 @shared_task
 def update_audit_sessions_status():
-    sessions = AuditSession.objects.exclude(status='SELESAI')
-    for session in sessions:
-        session.update_status()  # Pastikan method ini sudah ada di model
\ No newline at end of file
+    # Sapuan harian: jaring pengaman bila tugas ETA per sesi terlewat, lalu
+    # kirim tugas ETA untuk batas fase yang sudah masuk jendela penjadwalan
+    hasil = AuditSession.objects.terapkan_transisi_status()
+    jadwalkan_transisi_mendatang()
+    return hasil
+
+@shared_task(ignore_result=True)
+def transisi_status_sesi(session_id):
+    # Dijadwalkan (ETA) tepat pada batas fase sesi oleh ami.utils.penjadwalan
+    hasil = AuditSession.objects.filter(pk=session_id).terapkan_transisi_status()
+    jadwalkan_transisi(session_id)
+    return hasil
+
+@shared_task
+def bersihkan_unggahan_bertahap():
+    # Unggahan bertahap yang ditinggalkan klien (lihat AMI_UNGGAHAN_KEDALUWARSA)
+    return bersihkan_unggahan_kedaluwarsa()
+
+@shared_task(ignore_result=True, soft_time_limit=120)
+def buat_preview_dokumen(hash_hex):
+    # Dijadwalkan setelah DokumenPendukung disimpan (ami.utils.preview.jadwalkan_preview)
+    return buat_preview(hash_hex)
@@ -1,3 +1,1223 @@
-from django.test import TestCase
+import csv
+import hashlib
+import importlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .management.commands.benchmark_excel_parser import CONTOH_WORKBOOK, klasifikasi_lama
+from .models import (
+    Audit,
+    Auditor,
+    AuditSession,
+    BlobBerkas,
+    DokumenPendukung,
+    Elemen,
+    KoordinatorProgramStudi,
+    Kriteria,
+    LembagaAkreditasi,
+    PenilaianDiri,
+    ProgramStudi,
+    SnapshotLaporan,
+    UnggahanBertahap,
+)
+from .forms import DokumenPendukungForm
+from .signals import bekukan_laporan_sesi
+from .utils.excel_parser import RowClassifier, hash_konten
+from .utils.instrumen_import import baca_baris, parse_dengan_cache, path_cache
+from .utils.instrumen_import import klasifikasi_banpt, parse_baris, struktur_banpt, terapkan_instrumen
+from .utils.katalog import katalog
+from .utils.laporan import SessionReport
+from .utils.pagination import KeysetPaginator
+from .utils.penjadwalan import jadwalkan_transisi, jadwalkan_transisi_mendatang
+from .utils.penilaian import simpan_penilaian, simpan_penilaian_bersyarat, validasi_penilaian
+from .utils.peran import peran_pengguna
+from .utils.preview import buat_preview, jadwalkan_preview
+from .utils.provisioning import provision_audit_session
+from .utils.report_cache import konteks_laporan, statistik_cache, versi_sesi
+from .utils.storage import hash_dari_nama, path_blob, path_preview, storage_berkas
+from .utils.unggahan import path_sementara, selesaikan_unggahan, tulis_chunk
+from .views import PESAN_KONFLIK_VERSI
+
+
+class DataAuditMixin:
+    """Satu lembaga dengan satu kriteria (tiga elemen), satu prodi dan satu sesi audit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lembaga = LembagaAkreditasi.objects.create(kode='LAMT', nama='LAM Teknik')
+        cls.kriteria = Kriteria.objects.create(lembaga_akreditasi=cls.lembaga, kode='K1', nama='Kriteria 1')
+        cls.elemen = [
+            Elemen.objects.create(kriteria=cls.kriteria, kode=f'1.{i}', nama=f'Elemen {i}')
+            for i in range(1, 4)
+        ]
+        cls.prodi = ProgramStudi.objects.create(
+            lembaga_akreditasi=cls.lembaga, kode='TI', nama='Teknik Informatika', fakultas='FATEK', jenjang='S1'
+        )
+        cls.admin = User.objects.create_superuser('admin', password='admin')
+        cls.user_koordinator = User.objects.create_user('koor', password='koor')
+        KoordinatorProgramStudi.objects.create(
+            user=cls.user_koordinator, nuptk='100', nama_lengkap='Koordinator TI', program_studi=cls.prodi
+        )
+        cls.user_auditor = User.objects.create_user('aud', password='aud')
+        cls.auditor = Auditor.objects.create(
+            user=cls.user_auditor, nuptk='200', nama_lengkap='Auditor', jabatan='Lektor', unit_kerja='FATEK'
+        )
+        cls.sesi = AuditSession.objects.create(
+            program_studi=cls.prodi, tahun_akademik='2025/2026', semester='G',
+            status='PENILAIAN_MANDIRI', auditor_ketua=cls.auditor,
+        )
+
+    def setUp(self):
+        super().setUp()
+        # Versi laporan/katalog di cache dan katalog di memori tidak ikut di-rollback antar test
+        cache.clear()
+        katalog.kosongkan()
+
+
+class ProvisioningTests(DataAuditMixin, TestCase):
+    def test_sesi_baru_mendapat_penilaian_dan_audit_untuk_semua_elemen(self):
+        penilaian = PenilaianDiri.objects.filter(audit_session=self.sesi)
+        self.assertEqual(sorted(penilaian.values_list('elemen_id', flat=True)), [e.pk for e in self.elemen])
+        self.assertEqual(Audit.objects.filter(penilaian_diri__audit_session=self.sesi).count(), 3)
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_elemen, 3)
+
+    def test_provision_menaikkan_versi_laporan(self):
+        versi = versi_sesi(self.sesi.pk)
+        Elemen.objects.bulk_create([Elemen(kriteria=self.kriteria, kode='1.4', nama='Elemen 4')])
+        provision_audit_session(self.sesi)
+        self.assertNotEqual(versi_sesi(self.sesi.pk), versi)
+
+    def test_provision_ulang_tidak_menggandakan_baris(self):
+        self.assertEqual(provision_audit_session(self.sesi), 0)
+        self.assertEqual(PenilaianDiri.objects.filter(audit_session=self.sesi).count(), 3)
+
+    def test_provision_tidak_memakai_katalog_yang_tertinggal(self):
+        katalog.pohon(self.lembaga.pk)
+        # bulk_create tidak memicu signal, jadi katalog di memori tidak diinvalidasi
+        elemen, = Elemen.objects.bulk_create([Elemen(kriteria=self.kriteria, kode='1.4', nama='Elemen 4')])
+        self.assertEqual(len(katalog.pohon(self.lembaga.pk).elemen_ids()), 3)
+        self.assertEqual(provision_audit_session(self.sesi), 1)
+        self.assertTrue(PenilaianDiri.objects.filter(audit_session=self.sesi, elemen=elemen).exists())
+
+    def test_elemen_baru_ditambahkan_ke_sesi_yang_berjalan(self):
+        elemen = Elemen.objects.create(kriteria=self.kriteria, kode='1.4', nama='Elemen 4')
+        penilaian = PenilaianDiri.objects.get(audit_session=self.sesi, elemen=elemen)
+        self.assertTrue(Audit.objects.filter(penilaian_diri=penilaian).exists())
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_elemen, 4)
+
+
+class SessionReportTests(DataAuditMixin, TestCase):
+    def test_statistik_dihitung_dari_penilaian_dan_audit(self):
+        p1, p2, _ = PenilaianDiri.objects.filter(audit_session=self.sesi).order_by('elemen__kode')
+        PenilaianDiri.objects.filter(pk=p1.pk).update(skor=4, bukti_dokumen='https://contoh.id/a')
+        PenilaianDiri.objects.filter(pk=p2.pk).update(skor=2)
+        Audit.objects.filter(penilaian_diri=p1).update(skor=3, kategori_kondisi='SESUAI')
+
+        katalog.pohon(self.lembaga.pk)
+        # Pohon instrumen dari katalog, penilaian beserta audit-nya satu query
+        with self.assertNumQueries(1):
+            data = SessionReport(self.sesi).hitung()
+        self.assertEqual(data['total_elemen'], 3)
+        self.assertEqual(data['elemen_terisi'], 2)
+        self.assertEqual(data['skor_akhir'], 3.0)
+        self.assertEqual(data['audit'], {'total': 3, 'terisi': 1, 'avg_skor': 3.0})
+        self.assertEqual(data['kategori_map'], {'SESUAI': 1})
+        self.assertEqual(data['dokumen']['belum_disiapkan'], 2)
+        self.assertEqual(data['kriteria'][0]['rata_rata'], 3.0)
+
+        konteks = SessionReport(self.sesi, data=data).konteks_laporan_audit()
+        self.assertEqual(konteks['indikator_terisi'], 2)
+
+
+class CacheLaporanTests(DataAuditMixin, TestCase):
+    def test_konteks_dipakai_ulang_sampai_data_sesi_berubah(self):
+        konteks_laporan(self.sesi, 'audit')
+        konteks_laporan(self.sesi, 'audit')
+        self.assertEqual(statistik_cache()['hit'], 1)
+
+        versi = versi_sesi(self.sesi.pk)
+        penilaian = self.sesi.penilaian_diri.first()
+        penilaian.skor = 3
+        penilaian.save()
+        self.assertNotEqual(versi_sesi(self.sesi.pk), versi)
+
+        konteks_laporan(self.sesi, 'audit')
+        self.assertEqual(statistik_cache()['miss'], 2)
+
+
+class SnapshotLaporanTests(DataAuditMixin, TestCase):
+    def _tutup_sesi(self):
+        sesi = AuditSession.objects.get(pk=self.sesi.pk)
+        sesi.status = 'SELESAI'
+        sesi.save()
+        return sesi
+
+    def test_snapshot_dibekukan_saat_sesi_selesai(self):
+        PenilaianDiri.objects.filter(audit_session=self.sesi).update(skor=2)
+        sesi = self._tutup_sesi()
+        self.assertEqual(SnapshotLaporan.objects.get(audit_session=sesi).skor_akhir, 2)
+
+        # Perubahan data dan penyimpanan ulang sesi yang sudah selesai tidak mengubah snapshot
+        PenilaianDiri.objects.filter(audit_session=sesi).update(skor=4)
+        sesi.tahun_akademik = '2024/2025'
+        sesi.save()
+        sesi = AuditSession.objects.get(pk=sesi.pk)
+        sesi.save()
+        self.assertEqual(SnapshotLaporan.objects.get(audit_session=sesi).skor_akhir, 2)
+        self.assertEqual(konteks_laporan(sesi, 'audit')['skor_akhir'], 2)
+
+    def test_snapshot_dihapus_hanya_saat_sesi_dibuka_kembali(self):
+        sesi = AuditSession.objects.get(pk=self.sesi.pk)
+        sesi.save()
+        sesi = self._tutup_sesi()
+
+        sesi.status = 'PENILAIAN_AUDITOR'
+        sesi.save()
+        self.assertFalse(SnapshotLaporan.objects.filter(audit_session=sesi).exists())
+
+        # Ditutup kembali: snapshot memakai data terbaru
+        PenilaianDiri.objects.filter(audit_session=sesi).update(skor=3)
+        sesi.status = 'SELESAI'
+        sesi.save()
+        self.assertEqual(SnapshotLaporan.objects.get(audit_session=sesi).skor_akhir, 3)
+
+    def test_simpan_sesi_yang_belum_selesai_tidak_menyentuh_snapshot(self):
+        sesi = AuditSession.objects.get(pk=self.sesi.pk)
+        with self.assertNumQueries(0):
+            bekukan_laporan_sesi(AuditSession, sesi, created=False)
+
+
+class TransisiStatusTests(DataAuditMixin, TestCase):
+    HARI_INI = date(2025, 10, 15)
+
+    def _sesi(self, tahun, status='DRAFT', **tanggal):
+        return AuditSession.objects.create(
+            program_studi=self.prodi, tahun_akademik=tahun, semester='G', status=status, **tanggal
+        )
+
+    def test_transisi_berurutan_dengan_update_massal(self):
+        tertinggal = self._sesi(
+            '2023/2024',
+            tanggal_mulai_penilaian_mandiri=date(2025, 8, 1),
+            tanggal_selesai_penilaian_mandiri=date(2025, 8, 31),
+            tanggal_mulai_penilaian_auditor=date(2025, 9, 1),
+            tanggal_selesai_penilaian_auditor=date(2025, 9, 30),
+        )
+        mandiri = self._sesi('2024/2025', tanggal_mulai_penilaian_mandiri=date(2025, 10, 1))
+        belum_dijadwalkan = self._sesi('2022/2023')
+
+        with CaptureQueriesContext(connection) as queries:
+            hasil = AuditSession.objects.terapkan_transisi_status(today=self.HARI_INI)
+        # Satu UPDATE per transisi, berapa pun jumlah sesinya
+        update = [q for q in queries if q['sql'].startswith('UPDATE "ami_auditsession"')]
+        self.assertEqual(len(update), 3)
+        self.assertEqual(hasil, {
+            'DRAFT->PENILAIAN_MANDIRI': 2,
+            'PENILAIAN_MANDIRI->PENILAIAN_AUDITOR': 1,
+            'PENILAIAN_AUDITOR->SELESAI': 1,
+        })
+        status = dict(AuditSession.objects.values_list('pk', 'status'))
+        self.assertEqual(status[tertinggal.pk], 'SELESAI')
+        self.assertEqual(status[mandiri.pk], 'PENILAIAN_MANDIRI')
+        self.assertEqual(status[belum_dijadwalkan.pk], 'DRAFT')
+        self.assertTrue(SnapshotLaporan.objects.filter(audit_session=tertinggal).exists())
+
+    def test_dry_run_tidak_menyimpan_perubahan(self):
+        sesi = self._sesi('2024/2025', tanggal_mulai_penilaian_mandiri=date(2025, 10, 1))
+        hasil = AuditSession.objects.terapkan_transisi_status(today=self.HARI_INI, dry_run=True)
+        self.assertEqual(hasil['DRAFT->PENILAIAN_MANDIRI'], 1)
+        sesi.refresh_from_db()
+        self.assertEqual(sesi.status, 'DRAFT')
+
+
+class StatusEfektifTests(DataAuditMixin, TestCase):
+    def test_status_efektif_diturunkan_dari_tanggal_tanpa_menulis(self):
+        sesi = AuditSession.objects.create(
+            program_studi=self.prodi, tahun_akademik='2024/2025', semester='G',
+            tanggal_mulai_penilaian_mandiri=date(2025, 8, 1),
+            tanggal_selesai_penilaian_mandiri=date(2025, 8, 31),
+            tanggal_mulai_penilaian_auditor=date(2025, 9, 1),
+        )
+        hasil = AuditSession.objects.with_effective_status(today=date(2025, 9, 15)).get(pk=sesi.pk)
+        self.assertEqual(hasil.status_efektif, 'PENILAIAN_AUDITOR')
+        hasil = AuditSession.objects.with_effective_status(today=date(2025, 7, 1)).get(pk=sesi.pk)
+        self.assertEqual(hasil.status_efektif, 'DRAFT')
+
+        self.client.force_login(self.admin)
+        respons = self.client.get(reverse('ami:audit_session_detail', args=[sesi.pk]))
+        self.assertEqual(respons.status_code, 200)
+        sesi.refresh_from_db()
+        self.assertEqual(sesi.status, 'DRAFT')
+
+    def test_status_efektif_tidak_mundur_dari_status_tersimpan(self):
+        hasil = AuditSession.objects.with_effective_status(today=date(2025, 1, 1)).get(pk=self.sesi.pk)
+        self.assertEqual(hasil.status_efektif, 'PENILAIAN_MANDIRI')
+
+
+class PenjadwalanTransisiTests(DataAuditMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        from .tasks import transisi_status_sesi
+
+        # Broker Celery diganti mock; tugas yang dikirim dicatat di apply_async
+        self.apply_async = self.enterContext(mock.patch.object(
+            transisi_status_sesi, 'apply_async', side_effect=lambda **kw: mock.Mock(id=f'tugas-{kw["eta"]:%m%d}'),
+        ))
+        self.enterContext(mock.patch.object(transisi_status_sesi.app, 'connection_for_write'))
+        self.revoke = self.enterContext(mock.patch('ami.utils.penjadwalan._revoke'))
+
+    def _sesi(self, **tanggal):
+        return AuditSession.objects.create(
+            program_studi=self.prodi, tahun_akademik='2024/2025', semester='G', **tanggal
+        )
+
+    def test_batas_fase_yang_sudah_lewat_langsung_diterapkan(self):
+        hari_ini = datetime.now(dt_timezone.utc).date()
+        sesi = self._sesi(tanggal_mulai_penilaian_mandiri=hari_ini - timedelta(days=3))
+        self.assertEqual(jadwalkan_transisi(sesi.pk), {})
+        sesi.refresh_from_db()
+        self.assertEqual(sesi.status, 'PENILAIAN_MANDIRI')
+        self.apply_async.assert_not_called()
+
+    def test_tugas_eta_dijadwalkan_ulang_saat_tanggal_berubah(self):
+        besok = datetime.now(dt_timezone.utc).date() + timedelta(days=1)
+        sesi = self._sesi(tanggal_mulai_penilaian_mandiri=besok)
+        jadwal = jadwalkan_transisi(sesi.pk)
+        eta = datetime.combine(besok, datetime.min.time(), tzinfo=dt_timezone.utc)
+        self.assertEqual(jadwal, {'PENILAIAN_MANDIRI': {'task_id': f'tugas-{eta:%m%d}', 'eta': eta.isoformat()}})
+
+        # Jadwal yang sama tidak dikirim ulang
+        jadwalkan_transisi(sesi.pk)
+        self.assertEqual(self.apply_async.call_count, 1)
+
+        # Batas yang bergeser ke luar jendela dibatalkan tanpa dikirim ulang
+        AuditSession.objects.filter(pk=sesi.pk).update(tanggal_mulai_penilaian_mandiri=besok + timedelta(days=1))
+        self.assertEqual(jadwalkan_transisi(sesi.pk), {})
+        self.revoke.assert_called_once_with(f'tugas-{eta:%m%d}')
+        self.assertEqual(self.apply_async.call_count, 1)
+
+    def test_batas_jauh_dijadwalkan_oleh_sapuan_harian(self):
+        hari_ini = datetime.now(dt_timezone.utc).date()
+        sesi = self._sesi(
+            tanggal_mulai_penilaian_mandiri=hari_ini + timedelta(days=1),
+            tanggal_selesai_penilaian_mandiri=hari_ini + timedelta(days=30),
+            tanggal_mulai_penilaian_auditor=hari_ini + timedelta(days=31),
+            tanggal_selesai_penilaian_auditor=hari_ini + timedelta(days=60),
+        )
+        self.assertEqual(list(jadwalkan_transisi(sesi.pk)), ['PENILAIAN_MANDIRI'])
+
+        # Sapuan pada hari sebelum batas berikutnya mengirim tugasnya
+        kemudian = datetime.combine(hari_ini + timedelta(days=30), datetime.min.time(), tzinfo=dt_timezone.utc)
+        AuditSession.objects.filter(pk=sesi.pk).update(status='PENILAIAN_MANDIRI')
+        with mock.patch('django.utils.timezone.now', return_value=kemudian + timedelta(minutes=5)):
+            self.assertEqual(jadwalkan_transisi_mendatang(), 1)
+        self.assertEqual(list(AuditSession.objects.get(pk=sesi.pk).jadwal_transisi), ['PENILAIAN_AUDITOR'])
+
+
+class AksesSesiTests(DataAuditMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        prodi_lain = ProgramStudi.objects.create(
+            lembaga_akreditasi=cls.lembaga, kode='SI', nama='Sistem Informasi', fakultas='FATEK', jenjang='S1'
+        )
+        cls.sesi_lain = AuditSession.objects.create(program_studi=prodi_lain, tahun_akademik='2025/2026', semester='G')
+        cls.user_anggota = User.objects.create_user('anggota', password='anggota')
+        anggota = Auditor.objects.create(
+            user=cls.user_anggota, nuptk='300', nama_lengkap='Anggota', jabatan='Lektor', unit_kerja='FATEK'
+        )
+        cls.sesi_lain.auditor_anggota.add(anggota)
+
+    def _terlihat(self, user):
+        return set(AuditSession.objects.visible_to(user).values_list('pk', flat=True))
+
+    def test_visible_to_menyaring_di_sql_per_peran(self):
+        self.assertEqual(self._terlihat(self.admin), {self.sesi.pk, self.sesi_lain.pk})
+        self.assertEqual(self._terlihat(self.user_koordinator), {self.sesi.pk})
+        self.assertEqual(self._terlihat(self.user_auditor), {self.sesi.pk})
+        self.assertEqual(self._terlihat(self.user_anggota), {self.sesi_lain.pk})
+        self.assertEqual(self._terlihat(User.objects.create_user('tamu')), set())
+
+    def test_peran_dimuat_sekali_per_user(self):
+        user = User.objects.get(pk=self.user_koordinator.pk)
+        with self.assertNumQueries(1):
+            peran = peran_pengguna(user)
+            peran_pengguna(user)
+            user.koordinatorprogramstudi
+        self.assertEqual(peran.role, 'koordinator')
+        self.assertEqual(peran.program_studi.pk, self.prodi.pk)
+
+    def test_view_menolak_sesi_di_luar_akses(self):
+        self.client.force_login(self.user_koordinator)
+        respons = self.client.get(reverse('ami:laporan_audit', args=[self.sesi_lain.pk]))
+        self.assertEqual(respons.status_code, 403)
+        respons = self.client.get(reverse('ami:laporan_audit', args=[self.sesi.pk]))
+        self.assertEqual(respons.status_code, 200)
+
+
+class PenghitungProgresTests(DataAuditMixin, TestCase):
+    def _progres(self):
+        return AuditSession.objects.values('jumlah_elemen', 'jumlah_terisi', 'jumlah_teraudit', 'jumlah_sesuai').get(
+            pk=self.sesi.pk
+        )
+
+    def test_penghitung_mengikuti_perubahan_tanpa_hitung_ulang(self):
+        penilaian = PenilaianDiri.objects.filter(audit_session=self.sesi).first()
+        penilaian.skor = 3
+        penilaian.save()
+        audit = Audit.objects.get(penilaian_diri=penilaian)
+        audit.skor = 3
+        audit.kategori_kondisi = 'SESUAI'
+        audit.save()
+        self.assertEqual(self._progres(), {
+            'jumlah_elemen': 3, 'jumlah_terisi': 1, 'jumlah_teraudit': 1, 'jumlah_sesuai': 1,
+        })
+
+        # Menyimpan ulang nilai yang sama tidak mengubah penghitung
+        penilaian.save()
+        audit.kategori_kondisi = 'KT_MINOR'
+        audit.save()
+        self.assertEqual(self._progres()['jumlah_sesuai'], 0)
+
+        penilaian.delete()
+        self.assertEqual(self._progres(), {
+            'jumlah_elemen': 2, 'jumlah_terisi': 0, 'jumlah_teraudit': 0, 'jumlah_sesuai': 0,
+        })
+
+    def test_recount_memperbaiki_selisih(self):
+        PenilaianDiri.objects.filter(audit_session=self.sesi).update(skor=2)
+        self.assertEqual(self._progres()['jumlah_terisi'], 0)
+        call_command('recount_session_progress', session=self.sesi.pk, stdout=io.StringIO())
+        self.assertEqual(self._progres()['jumlah_terisi'], 3)
+
+
+class KeysetPaginationTests(DataAuditMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Beberapa tanggal sama dan beberapa kosong (NULLS LAST)
+        for i in range(7):
+            AuditSession.objects.create(
+                program_studi=cls.prodi, tahun_akademik=f'20{10 + i}/20{11 + i}', semester='P',
+                tanggal_mulai_penilaian_mandiri=date(2025, 1, 1 + i // 2) if i < 5 else None,
+            )
+
+    def _urutan(self):
+        return list(
+            AuditSession.objects.order_by(
+                F('tanggal_mulai_penilaian_mandiri').desc(nulls_last=True), '-pk'
+            ).values_list('pk', flat=True)
+        )
+
+    def test_maju_dan_mundur_tanpa_duplikat(self):
+        paginator = KeysetPaginator(AuditSession.objects.all(), per_page=3)
+        halaman, token = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.get_page(token)
+            halaman.append([s.pk for s in page])
+            if not page.has_next():
+                break
+            token = page.next_token
+        self.assertEqual([pk for h in halaman for pk in h], self._urutan())
+        self.assertFalse(paginator.get_page().has_previous())
+
+        sebelumnya = paginator.get_page(page.previous_token)
+        self.assertEqual([s.pk for s in sebelumnya], halaman[-2])
+        self.assertTrue(sebelumnya.has_next())
+
+    def test_token_tidak_valid_kembali_ke_halaman_pertama(self):
+        paginator = KeysetPaginator(AuditSession.objects.all(), per_page=3)
+        page = paginator.get_page('bukan-token')
+        self.assertEqual([s.pk for s in page], self._urutan()[:3])
+
+
+class ImporInstrumenTests(DataAuditMixin, TestCase):
+    BARIS_TEMPLATE = [
+        ['Kriteria 1 - Kriteria 1'],
+        ['1.1 Elemen 1'],
+        ['1.4 Elemen baru'],
+        ['A1 - Indikator satu'],
+        ['Skor 4: sangat baik'],
+        ['Skor 3: baik'],
+        ['Skor = (A+B)/2'],
+        ['Keterangan tambahan'],
+    ]
+
+    def test_parse_template_per_baris(self):
+        kriteria_list, jumlah_baris = parse_baris(iter(self.BARIS_TEMPLATE))
+        self.assertEqual(jumlah_baris, 8)
+        self.assertEqual([e['kode'] for e in kriteria_list[0]['elemen']], ['1.1', '1.4'])
+        self.assertEqual(kriteria_list[0]['elemen'][1]['indikator'], [{
+            'kode': 'A1', 'deskripsi': 'Indikator satu',
+            'skor': [[4.0, 'sangat baik'], [3.0, 'baik']], 'rumus': '(A+B)/2',
+        }])
+
+    def test_terapkan_membuat_elemen_baru_dan_menyiapkan_sesi(self):
+        kriteria_list, _ = parse_baris(iter(self.BARIS_TEMPLATE))
+        kriteria_list[0]['kode'] = 'K1'
+        statistik = terapkan_instrumen(self.lembaga, kriteria_list)
+        self.assertEqual(statistik['elemen_baru'], 1)
+        self.assertEqual(statistik['elemen_tetap'], 1)
+        elemen = Elemen.objects.get(kriteria=self.kriteria, kode='1.4')
+        self.assertIn('Skor 4: sangat baik', elemen.panduan)
+        self.assertTrue(PenilaianDiri.objects.filter(audit_session=self.sesi, elemen=elemen).exists())
+        self.assertEqual(katalog.pohon(self.lembaga.pk).jumlah_elemen, 4)
+
+    def test_impor_menaikkan_versi_laporan_sesi(self):
+        versi = versi_sesi(self.sesi.pk)
+        kriteria_list = [{'kode': 'K1', 'nama': 'Kriteria 1', 'elemen': [
+            {'kode': '1.1', 'nama': 'Elemen 1 diperbarui', 'indikator': []},
+        ]}]
+        self.assertEqual(terapkan_instrumen(self.lembaga, kriteria_list)['elemen_diperbarui'], 1)
+        self.assertNotEqual(versi_sesi(self.sesi.pk), versi)
+
+        # Impor ulang tanpa perubahan tidak membuang cache laporan
+        versi = versi_sesi(self.sesi.pk)
+        terapkan_instrumen(self.lembaga, kriteria_list)
+        self.assertEqual(versi_sesi(self.sesi.pk), versi)
+
+    def test_kode_elemen_panjang_dipotong_sebelum_dicocokkan(self):
+        kode = '1.5 ' + 'x' * 40
+        kriteria_list = [{'kode': 'K1', 'nama': 'Kriteria 1', 'elemen': [
+            {'kode': kode, 'nama': 'Elemen panjang', 'indikator': []},
+        ]}]
+        self.assertEqual(terapkan_instrumen(self.lembaga, kriteria_list)['elemen_baru'], 1)
+        # Impor ulang mengenali elemen yang kodenya sudah dipotong
+        statistik = terapkan_instrumen(self.lembaga, kriteria_list)
+        self.assertEqual((statistik['elemen_baru'], statistik['elemen_tetap']), (0, 1))
+        self.assertEqual(Elemen.objects.filter(kriteria=self.kriteria, kode=kode[:30]).count(), 1)
+
+
+class KlasifikasiBanptTests(SimpleTestCase):
+    def test_baris_diklasifikasikan_tanpa_iterasi_per_baris(self):
+        indikator = 'Kejelasan visi, misi, tujuan dan strategi program studi'
+        teks = pd.Series({
+            0: 'PENILAIAN AKREDITASI PROGRAM STUDI',
+            1: 'Tabel 1.a.1 Visi misi',
+            2: f'{indikator} Skor 4 Sangat jelas Skor 3 Jelas',
+            3: f'{indikator} Skor 4 Sangat jelas',
+            4: '85 % Sangat Baik',
+            5: 'Tabel 2.b Tata kelola',
+            6: 'Skor = 2 sesuai rumus',
+            7: 'Catatan',
+        })
+        baris, skor = klasifikasi_banpt(teks)
+        self.assertNotIn(0, baris.index)
+        self.assertEqual(
+            list(baris['jenis'].astype(str)),
+            ['tabel', 'indikator', 'teks', 'persen', 'tabel', 'indikator', 'teks'],
+        )
+
+        kriteria_list = struktur_banpt(baris, skor)
+        self.assertEqual([k['kode'] for k in kriteria_list], ['K1', 'K2'])
+        elemen = kriteria_list[0]['elemen'][0]
+        self.assertEqual(elemen['kode'], 'A.')
+        self.assertEqual([i['kode'] for i in elemen['indikator']], ['A.1'])
+        self.assertEqual(elemen['indikator'][0]['skor'], [[4.0, 'Sangat jelas'], [3.0, 'Jelas']])
+        self.assertEqual(kriteria_list[1]['elemen'][0]['indikator'][0]['skor'], [[2.0, 'sesuai rumus']])
+
+
+class HashKontenTests(DataAuditMixin, TestCase):
+    def test_hash_stabil_dan_mengabaikan_spasi_berlebih(self):
+        self.assertEqual(hash_konten('Visi  misi\n', None), hash_konten('Visi misi', ''))
+        self.assertNotEqual(hash_konten('Visi misi'), hash_konten('Visi', 'misi'))
+        migrasi = importlib.import_module('ami.migrations.0013_hash_konten')
+        self.assertEqual(migrasi.hash_konten('Visi  misi', None), hash_konten('Visi  misi', None))
+
+    def test_hash_diperbarui_saat_disimpan(self):
+        elemen = self.elemen[0]
+        self.assertEqual(elemen.hash_konten, hash_konten(elemen.nama, elemen.panduan))
+        elemen.panduan = 'Panduan baru'
+        elemen.save(update_fields=['panduan'])
+        elemen.refresh_from_db()
+        self.assertEqual(elemen.hash_konten, hash_konten(elemen.nama, 'Panduan baru'))
+
+    def test_impor_ulang_tanpa_perubahan_tidak_menulis(self):
+        kriteria_list = [{'kode': 'K1', 'nama': 'Kriteria 1', 'elemen': [
+            {'kode': e.kode, 'nama': e.nama, 'indikator': [
+                {'kode': 'A1', 'deskripsi': 'Indikator', 'skor': [[4, 'Baik']], 'rumus': None},
+            ]} for e in self.elemen
+        ]}]
+        self.assertEqual(terapkan_instrumen(self.lembaga, kriteria_list)['elemen_diperbarui'], 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            statistik = terapkan_instrumen(self.lembaga, kriteria_list)
+        self.assertEqual((statistik['kriteria_tetap'], statistik['elemen_tetap']), (1, 3))
+        self.assertFalse([q for q in queries if q['sql'].startswith(('UPDATE', 'INSERT'))])
+
+
+class RowClassifierTests(SimpleTestCase):
+    BARIS_KHUSUS = [
+        # Pola kode di sel mana pun menang atas nama spesifik di sel sebelumnya
+        ['Kondisi Eksternal', 'Kriteria 3 - Mahasiswa baru'],
+        ['Proses pembelajaran', '6.7 Evaluasi'],
+        ['Tabel 5.a LKPS', 'A1 - Indikator'],
+        ['Skor 4: memenuhi A2'],
+        ['Skor 3\nCukup'],
+        ['Skor = (A + B) / 2'],
+        ['Indikator tanpa kode yang cukup panjang untuk dikenali sebagai indikator'],
+        ['Keterangan yang cukup panjang tetapi bukan indikator karena diawali kata kunci'],
+        [12, None, 'Kriteria 10: Luaran'],
+        ['teks biasa'],
+    ]
+
+    def test_hasil_sama_dengan_klasifikasi_lama(self):
+        classifier = RowClassifier()
+        rows = list(baca_baris(CONTOH_WORKBOOK)) + self.BARIS_KHUSUS
+        for values in rows:
+            with self.subTest(values=values):
+                self.assertEqual(classifier.klasifikasi(values), klasifikasi_lama(values))
+
+
+class CacheParseTests(SimpleTestCase):
+    def setUp(self):
+        self.direktori = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.direktori)
+        self.enterContext(override_settings(AMI_IMPORT_CACHE_DIR=self.direktori))
+        self.workbook = shutil.copy(CONTOH_WORKBOOK, self.direktori)
+
+    def test_parse_ulang_dilayani_dari_cache(self):
+        hasil, jumlah_baris, dari_cache = parse_dengan_cache('template', self.workbook)
+        self.assertFalse(dari_cache)
+        self.assertEqual(parse_dengan_cache('template', self.workbook), (hasil, jumlah_baris, True))
+        # Jenis parser lain memakai kunci cache berbeda
+        self.assertNotEqual(path_cache(self.workbook, 'template'), path_cache(self.workbook, 'banpt'))
+        self.assertFalse(parse_dengan_cache('template', self.workbook, pakai_cache=False)[2])
+
+    def test_cache_rusak_diabaikan(self):
+        hasil, _, _ = parse_dengan_cache('template', self.workbook)
+        path_cache(self.workbook, 'template').write_text('bukan json')
+        ulang, _, dari_cache = parse_dengan_cache('template', self.workbook)
+        self.assertFalse(dari_cache)
+        self.assertEqual(ulang, hasil)
+
+
+class ImporBatchTests(DataAuditMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.direktori = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.direktori)
+        self.enterContext(override_settings(AMI_IMPORT_CACHE_DIR=os.path.join(self.direktori, 'cache')))
+        self.lembaga_lain = LembagaAkreditasi.objects.create(kode='LAMB', nama='LAM Lain')
+        for kode in ('LAMT', 'LAMB'):
+            shutil.copy(CONTOH_WORKBOOK, os.path.join(self.direktori, f'{kode}.xlsx'))
+
+    def test_kegagalan_satu_lembaga_tidak_menghentikan_lembaga_lain(self):
+        from .management.commands import import_instrumen_batch
+
+        asli = import_instrumen_batch.terapkan_instrumen
+
+        def terapkan(lembaga, *args, **kwargs):
+            if lembaga.kode == 'LAMB':
+                raise ValueError('data tidak valid')
+            return asli(lembaga, *args, **kwargs)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch.object(import_instrumen_batch, 'terapkan_instrumen', side_effect=terapkan), \
+                self.assertRaisesMessage(CommandError, '1 lembaga gagal ditulis ke database'):
+            call_command('import_instrumen_batch', self.direktori, workers=1, stdout=stdout, stderr=stderr)
+
+        self.assertIn('Gagal menulis LAM Lain: data tidak valid', stderr.getvalue())
+        self.assertIn('GAGAL: data tidak valid', stdout.getvalue())
+        self.assertGreater(Kriteria.objects.filter(lembaga_akreditasi=self.lembaga).count(), 1)
+        self.assertFalse(Kriteria.objects.filter(lembaga_akreditasi=self.lembaga_lain).exists())
+
+    def test_impor_tanpa_kegagalan_selesai_normal(self):
+        stdout = io.StringIO()
+        call_command('import_instrumen_batch', self.direktori, workers=1, stdout=stdout, stderr=io.StringIO())
+        self.assertIn('Impor batch selesai.', stdout.getvalue())
+
+
+class PenilaianDiriBatchTests(DataAuditMixin, TestCase):
+    def _data(self, skor):
+        penilaian = PenilaianDiri.objects.filter(audit_session=self.sesi).order_by('elemen__kode')
+        data = {
+            'form-TOTAL_FORMS': str(len(penilaian)),
+            'form-INITIAL_FORMS': str(len(penilaian)),
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for i, (p, nilai) in enumerate(zip(penilaian, skor)):
+            data.update({
+                f'form-{i}-id': str(p.pk),
+                f'form-{i}-versi': str(p.versi),
+                f'form-{i}-skor': '' if nilai is None else str(nilai),
+                f'form-{i}-bukti_dokumen': '',
+                f'form-{i}-komentar': '',
+            })
+        return data
+
+    def _url(self):
+        return reverse('ami:penilaian_diri_batch', args=[self.sesi.pk]) + f'?kriteria={self.kriteria.pk}'
+
+    def test_baris_yang_berubah_disimpan_sekaligus(self):
+        self.client.force_login(self.user_koordinator)
+        with CaptureQueriesContext(connection) as queries:
+            respons = self.client.post(self._url(), self._data([3, None, 2]))
+        self.assertRedirects(respons, reverse('ami:penilaian_diri_list', args=[self.sesi.pk]), fetch_redirect_response=False)
+
+        update = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "ami_penilaiandiri"')]
+        self.assertEqual(len(update), 1)
+        skor = dict(PenilaianDiri.objects.filter(audit_session=self.sesi).values_list('elemen__kode', 'skor'))
+        self.assertEqual(skor, {'1.1': 3, '1.2': None, '1.3': 2})
+        status = set(PenilaianDiri.objects.filter(skor__isnull=False).values_list('status', flat=True))
+        self.assertEqual(status, {'TERISI'})
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_terisi, 2)
+
+    def test_skor_melebihi_maksimal_ditolak(self):
+        self.client.force_login(self.user_koordinator)
+        respons = self.client.post(self._url(), self._data([9, None, None]))
+        self.assertEqual(respons.status_code, 200)
+        self.assertTrue(respons.context['formset'].errors[0])
+        self.assertFalse(PenilaianDiri.objects.filter(skor__isnull=False).exists())
+
+    def test_batch_tidak_menimpa_autosave_setelah_halaman_dibuka(self):
+        self.client.force_login(self.user_koordinator)
+        data = self._data([3, None, 2])
+        pertama = PenilaianDiri.objects.get(audit_session=self.sesi, elemen__kode='1.1')
+        respons = self.client.patch(
+            reverse('ami:penilaian_diri_autosave', args=[pertama.pk]),
+            json.dumps({'versi': pertama.versi, 'skor': 1}), content_type='application/json',
+        )
+        self.assertEqual(respons.status_code, 200)
+
+        respons = self.client.post(self._url(), data)
+        self.assertRedirects(respons, self._url(), fetch_redirect_response=False)
+        skor = dict(PenilaianDiri.objects.filter(audit_session=self.sesi).values_list('elemen__kode', 'skor'))
+        self.assertEqual(skor, {'1.1': 1, '1.2': None, '1.3': 2})
+        pesan = [str(m) for m in get_messages(respons.wsgi_request)]
+        self.assertTrue(any('1.1' in p and 'tidak disimpan' in p for p in pesan), pesan)
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_terisi, 2)
+
+    def test_pengguna_lain_ditolak(self):
+        self.client.force_login(self.user_auditor)
+        respons = self.client.post(self._url(), self._data([3, 3, 3]))
+        self.assertEqual(respons.status_code, 403)
+        self.assertFalse(PenilaianDiri.objects.filter(skor__isnull=False).exists())
+
+
+class SimpanPenilaianTests(DataAuditMixin, TestCase):
+    def _penilaian(self):
+        return list(PenilaianDiri.objects.filter(audit_session=self.sesi).order_by('elemen__kode'))
+
+    def test_validasi_massal_satu_query_elemen(self):
+        penilaian = self._penilaian()
+        penilaian[0].skor, penilaian[1].skor, penilaian[2].skor = 5, -1, 4
+        with self.assertNumQueries(1):
+            kesalahan = validasi_penilaian(penilaian)
+        self.assertEqual(sorted(kesalahan), [0, 1])
+        # Skor maksimal yang sudah diketahui tidak dimuat ulang
+        with self.assertNumQueries(0):
+            validasi_penilaian(penilaian, {e.pk: e.skor_maksimal for e in self.elemen})
+
+    def test_simpan_menolak_seluruh_batch_bila_ada_yang_tidak_valid(self):
+        penilaian = self._penilaian()
+        penilaian[0].skor, penilaian[1].skor = 3, 7
+        with self.assertRaises(ValidationError) as ctx:
+            simpan_penilaian(penilaian, ['skor'])
+        self.assertEqual(list(ctx.exception.error_dict), [str(penilaian[1].pk)])
+        self.assertFalse(PenilaianDiri.objects.filter(skor__isnull=False).exists())
+
+    def test_simpan_mengisi_status_dan_penghitung(self):
+        penilaian = self._penilaian()
+        penilaian[0].skor, penilaian[2].skor = 3, 1
+        self.assertEqual(simpan_penilaian(penilaian, ['skor']), 3)
+        status = dict(PenilaianDiri.objects.filter(audit_session=self.sesi).values_list('elemen__kode', 'status'))
+        self.assertEqual(status['1.1'], 'TERISI')
+        self.assertEqual(status['1.3'], 'TERISI')
+        self.assertNotEqual(status['1.2'], 'TERISI')
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_terisi, 2)
+
+    def test_simpan_bersyarat_melewati_baris_dengan_versi_usang(self):
+        penilaian = self._penilaian()
+        versi = {p.pk: p.versi for p in penilaian}
+        PenilaianDiri.objects.filter(pk=penilaian[1].pk).update(versi=F('versi') + 1)
+        penilaian[0].skor, penilaian[1].skor = 3, 2
+
+        konflik = simpan_penilaian_bersyarat(penilaian[:2], versi, ['skor'])
+        self.assertEqual(konflik, [penilaian[1]])
+        skor = dict(PenilaianDiri.objects.filter(audit_session=self.sesi).values_list('elemen__kode', 'skor'))
+        self.assertEqual(skor, {'1.1': 3, '1.2': None, '1.3': None})
+        self.assertEqual(penilaian[0].versi, versi[penilaian[0].pk] + 1)
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_terisi, 1)
+
+
+class KonflikVersiTests(DataAuditMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.penilaian = PenilaianDiri.objects.filter(audit_session=self.sesi).order_by('elemen__kode').first()
+        self.audit = Audit.objects.get(penilaian_diri=self.penilaian)
+
+    def _autosave(self, nama_url, pk, data):
+        return self.client.patch(reverse(nama_url, args=[pk]), json.dumps(data), content_type='application/json')
+
+    def test_autosave_menaikkan_versi_dan_menolak_versi_usang(self):
+        self.client.force_login(self.user_koordinator)
+        respons = self._autosave('ami:penilaian_diri_autosave', self.penilaian.pk, {'versi': 1, 'skor': 3})
+        self.assertEqual(respons.status_code, 200)
+        self.assertEqual(respons.json()['versi'], 2)
+
+        respons = self._autosave('ami:penilaian_diri_autosave', self.penilaian.pk, {'versi': 1, 'skor': 1})
+        self.assertEqual(respons.status_code, 409)
+        self.assertEqual(respons.json()['versi'], 2)
+        self.assertEqual(respons.json()['data']['skor'], 3)
+        self.penilaian.refresh_from_db()
+        self.assertEqual((self.penilaian.skor, self.penilaian.status), (3, 'TERISI'))
+
+    def test_autosave_menolak_data_tidak_valid(self):
+        self.client.force_login(self.user_koordinator)
+        for data in ({'skor': 3}, {'versi': 1, 'elemen': 2}, {'versi': 1, 'skor': 9}):
+            respons = self._autosave('ami:penilaian_diri_autosave', self.penilaian.pk, data)
+            self.assertEqual(respons.status_code, 400, data)
+        respons = self.client.patch(
+            reverse('ami:penilaian_diri_autosave', args=[self.penilaian.pk]), 'bukan json', content_type='application/json'
+        )
+        self.assertEqual(respons.status_code, 400)
+        self.penilaian.refresh_from_db()
+        self.assertEqual(self.penilaian.versi, 1)
+
+    def test_simpan_batch_membuat_autosave_lama_konflik(self):
+        simpan_penilaian([self.penilaian], ['skor'])
+        self.assertEqual(self.penilaian.versi, 2)
+        self.client.force_login(self.user_koordinator)
+        respons = self._autosave('ami:penilaian_diri_autosave', self.penilaian.pk, {'versi': 1, 'skor': 2})
+        self.assertEqual(respons.status_code, 409)
+
+    def test_form_edit_disimpan_bersyarat(self):
+        self.client.force_login(self.user_koordinator)
+        url = reverse('ami:penilaian_diri_update', args=[self.penilaian.pk])
+        data = {'skor': '2', 'bukti_dokumen': '', 'komentar': 'baru'}
+        respons = self.client.post(url, {**data, 'versi': '1'})
+        self.assertEqual(respons.status_code, 302)
+        self.penilaian.refresh_from_db()
+        self.assertEqual((self.penilaian.skor, self.penilaian.status, self.penilaian.versi), (2, 'TERISI', 2))
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_terisi, 1)
+
+        # Form yang dibuka sebelum penyimpanan pertama tidak menimpa perubahan itu
+        respons = self.client.post(url, {**data, 'skor': '4', 'versi': '1'})
+        self.assertEqual(respons.status_code, 200)
+        self.assertIn(PESAN_KONFLIK_VERSI, respons.context['form'].non_field_errors())
+        self.penilaian.refresh_from_db()
+        self.assertEqual((self.penilaian.skor, self.penilaian.versi), (2, 2))
+
+    def test_form_audit_disimpan_bersyarat(self):
+        AuditSession.objects.filter(pk=self.sesi.pk).update(status='PENILAIAN_AUDITOR')
+        self.client.force_login(self.user_auditor)
+        url = reverse('ami:audit_update', args=[self.audit.pk])
+        data = {'skor': '3', 'deskripsi_kondisi': 'Sesuai', 'kategori_kondisi': 'SESUAI'}
+        self.assertEqual(self.client.post(url, {**data, 'versi': '1'}).status_code, 302)
+        respons = self.client.post(url, {**data, 'kategori_kondisi': 'KT_MINOR', 'versi': '1'})
+        self.assertEqual(respons.status_code, 200)
+        self.audit.refresh_from_db()
+        self.assertEqual((self.audit.kategori_kondisi, self.audit.auditor_id, self.audit.versi), ('SESUAI', self.auditor.pk, 2))
+        self.sesi.refresh_from_db()
+        self.assertEqual(self.sesi.jumlah_sesuai, 1)
+
+
+class BerkasMediaMixin(DataAuditMixin):
+    """MEDIA_ROOT di direktori sementara untuk test yang menyimpan berkas blob"""
+
+    def setUp(self):
+        super().setUp()
+        direktori = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, direktori)
+        self.enterContext(override_settings(MEDIA_ROOT=direktori))
+        self.storage = storage_berkas()
+        self.jadwalkan_preview = self.enterContext(mock.patch('ami.signals.jadwalkan_preview'))
+        self.penilaian = PenilaianDiri.objects.filter(audit_session=self.sesi).order_by('elemen__kode').first()
+
+    def _dokumen(self, isi, nama='bukti.pdf', penilaian=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return DokumenPendukung.objects.create(
+                penilaian_diri=penilaian or self.penilaian, nama='Bukti', file=ContentFile(isi, name=nama)
+            )
+
+
+class ReferensiBlobTests(BerkasMediaMixin, TestCase):
+    def _hapus(self, dokumen):
+        with self.captureOnCommitCallbacks(execute=True):
+            dokumen.delete()
+
+    def test_isi_sama_disimpan_sekali_dan_dihapus_setelah_referensi_habis(self):
+        d1 = self._dokumen(b'isi bukti')
+        d2 = self._dokumen(b'isi bukti', nama='salinan.pdf')
+        self.assertEqual(d1.file.name, d2.file.name)
+        blob = BlobBerkas.objects.get()
+        self.assertEqual((blob.jumlah_referensi, blob.nama_asli), (2, 'bukti.pdf'))
+        path = self.storage.path(d1.file.name)
+        self.assertTrue(os.path.exists(path))
+
+        self._hapus(d1)
+        self.assertEqual(BlobBerkas.objects.get().jumlah_referensi, 1)
+        self.assertTrue(os.path.exists(path))
+        self._hapus(d2)
+        self.assertFalse(BlobBerkas.objects.exists())
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(os.listdir(self.storage.direktori_sementara('hapus')), [])
+
+    def test_referensi_dibatalkan_bila_penyimpanan_pemilik_gagal(self):
+        def gagal(**kwargs):
+            raise DatabaseError('gagal')
+
+        # Kegagalan setelah baris pemilik ditulis, masih di dalam save()
+        post_save.connect(gagal, sender=DokumenPendukung)
+        self.addCleanup(post_save.disconnect, gagal, sender=DokumenPendukung)
+        with self.assertRaises(DatabaseError), self.captureOnCommitCallbacks(execute=True):
+            DokumenPendukung.objects.create(
+                penilaian_diri=self.penilaian, nama='Bukti', file=ContentFile(b'isi', name='bukti.pdf')
+            )
+        self.assertFalse(DokumenPendukung.objects.exists())
+        self.assertFalse(BlobBerkas.objects.exists())
+        self.assertFalse(os.path.exists(self.storage.path(path_blob(hashlib.sha256(b'isi').hexdigest()))))
+        # Berkas sementaranya dibuang oleh sapuan berkala
+        self.assertEqual(self.storage.bersihkan_sementara(-1), 1)
+
+    def test_blob_yang_dibuat_ulang_tidak_ikut_terhapus(self):
+        dokumen = self._dokumen(b'isi bukti')
+        name = dokumen.file.name
+        DokumenPendukung.objects.filter(pk=dokumen.pk).delete()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.storage.delete(name)
+            # Isi yang sama diunggah lagi sebelum berkas blob lama sempat dihapus
+            DokumenPendukung.objects.create(
+                penilaian_diri=self.penilaian, nama='Bukti', file=ContentFile(b'isi bukti', name='bukti.pdf')
+            )
+        for callback in callbacks:
+            callback()
+        self.assertEqual(BlobBerkas.objects.get().jumlah_referensi, 1)
+        with open(self.storage.path(name), 'rb') as berkas:
+            self.assertEqual(berkas.read(), b'isi bukti')
+
+    def test_blob_dikembalikan_bila_baris_dibuat_ulang_saat_dihapus(self):
+        dokumen = self._dokumen(b'isi bukti')
+        name, hash_hex = dokumen.file.name, hash_dari_nama(dokumen.file.name)
+        DokumenPendukung.objects.filter(pk=dokumen.pk).delete()
+        BlobBerkas.objects.all().delete()
+        # Baris dibuat ulang oleh unggahan lain di antara pengecekan pertama dan
+        # pemindahan berkas, sementara blobnya sudah diletakkan lebih dulu
+        with mock.patch.object(type(self.storage), '_blob_dirujuk', side_effect=[False, True]):
+            self.storage._hapus_blob(name, hash_hex)
+        with open(self.storage.path(name), 'rb') as berkas:
+            self.assertEqual(berkas.read(), b'isi bukti')
+        self.assertEqual(os.listdir(self.storage.direktori_sementara('hapus')), [])
+
+
+@override_settings(AMI_UNGGAHAN_CHUNK=4)
+class UnggahanBertahapTests(BerkasMediaMixin, TestCase):
+    ISI = b'isi dokumen bukti'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user_koordinator)
+
+    def _mulai(self, **data):
+        respons = self.client.post(
+            reverse('ami:unggahan_mulai', args=[self.penilaian.pk]),
+            json.dumps({'nama': 'Bukti', 'nama_berkas': 'bukti.pdf', 'ukuran': len(self.ISI), **data}),
+            content_type='application/json',
+        )
+        self.assertEqual(respons.status_code, 201, respons.content)
+        return respons.json()
+
+    def _kirim(self, unggahan, offset, data, checksum=None):
+        headers = {'Upload-Offset': str(offset)}
+        if checksum is not False:
+            headers['Upload-Checksum'] = checksum or hashlib.sha256(data).hexdigest()
+        return self.client.put(unggahan['url'], data, content_type='application/octet-stream', headers=headers)
+
+    def _kirim_semua(self, unggahan):
+        for offset in range(0, len(self.ISI), 4):
+            respons = self._kirim(unggahan, offset, self.ISI[offset:offset + 4])
+            self.assertEqual(respons.status_code, 200, respons.content)
+
+    def test_unggahan_lengkap_tanpa_checksum_berkas(self):
+        unggahan = self._mulai()
+        self._kirim_semua(unggahan)
+        with self.captureOnCommitCallbacks(execute=True):
+            respons = self.client.post(unggahan['url_selesai'], '{}', content_type='application/json')
+        self.assertEqual(respons.status_code, 201, respons.content)
+
+        dokumen = DokumenPendukung.objects.get(pk=respons.json()['dokumen_id'])
+        self.assertEqual(dokumen.file.name, path_blob(hashlib.sha256(self.ISI).hexdigest()))
+        with dokumen.file.open('rb') as berkas:
+            self.assertEqual(berkas.read(), self.ISI)
+        self.assertEqual(UnggahanBertahap.objects.get(pk=unggahan['id']).status, 'SELESAI')
+
+    def test_checksum_berkas_dari_klien_tetap_diperiksa(self):
+        unggahan = self._mulai(checksum='0' * 64)
+        self._kirim_semua(unggahan)
+        respons = self.client.post(unggahan['url_selesai'], '{}', content_type='application/json')
+        self.assertEqual(respons.status_code, 400)
+        self.assertEqual(respons.json()['offset'], 0)
+        self.assertFalse(DokumenPendukung.objects.exists())
+
+    def test_potongan_rusak_atau_offset_salah_ditolak(self):
+        unggahan = self._mulai()
+        self.assertEqual(self._kirim(unggahan, 0, b'isi ').json()['offset'], 4)
+
+        respons = self._kirim(unggahan, 0, b'isi ')
+        self.assertEqual((respons.status_code, respons.json()['offset']), (409, 4))
+        respons = self._kirim(unggahan, 4, b'doku', checksum='0' * 64)
+        self.assertEqual((respons.status_code, respons.json()['offset']), (400, 4))
+        self.assertEqual(self._kirim(unggahan, 4, b'doku', checksum=False).json()['offset'], 8)
+
+    def test_offset_dibaca_ulang_setelah_berkas_dikunci(self):
+        data = self._mulai()
+        unggahan = UnggahanBertahap.objects.get(pk=data['id'])
+        # Objek di memori usang: permintaan lain sudah menulis potongan pertama
+        self._kirim(data, 0, b'isi ')
+        with self.assertRaises(ValidationError) as ctx:
+            tulis_chunk(unggahan, 0, io.BytesIO(b'isi '), 4)
+        self.assertEqual(ctx.exception.code, 'offset')
+        self.assertEqual(unggahan.diterima, 4)
+
+    def test_offset_dicatat_bersyarat(self):
+        data = self._mulai()
+        unggahan = UnggahanBertahap.objects.get(pk=data['id'])
+
+        class StreamBalapan(io.BytesIO):
+            def read(self, n=-1):
+                # Penulis lain sempat mencatat offset saat stream masih dibaca
+                UnggahanBertahap.objects.filter(pk=unggahan.pk).update(diterima=4)
+                return super().read(n)
+
+        with self.assertRaises(ValidationError) as ctx:
+            tulis_chunk(unggahan, 0, StreamBalapan(b'isi '), 4)
+        self.assertEqual(ctx.exception.code, 'offset')
+        self.assertEqual(UnggahanBertahap.objects.get(pk=unggahan.pk).diterima, 4)
+
+    def test_jenis_berkas_diperiksa_dan_content_type_dari_server(self):
+        respons = self.client.post(
+            reverse('ami:unggahan_mulai', args=[self.penilaian.pk]),
+            json.dumps({'nama': 'Bukti', 'nama_berkas': 'bukti.html', 'ukuran': len(self.ISI)}),
+            content_type='application/json',
+        )
+        self.assertEqual(respons.status_code, 400)
+        self.assertIn('nama_berkas', respons.json()['errors'])
+
+        data = self._mulai(nama_berkas='../laporan.PDF', content_type='text/html')
+        unggahan = UnggahanBertahap.objects.get(pk=data['id'])
+        self.assertEqual((unggahan.nama_berkas, unggahan.content_type), ('laporan.PDF', 'application/pdf'))
+
+    def test_aturan_berkas_sama_dengan_unggahan_biasa(self):
+        form = DokumenPendukungForm({'nama': 'Bukti'}, {
+            'file': SimpleUploadedFile('bukti.html', b'<script></script>', content_type='application/pdf'),
+        })
+        self.assertIn('file', form.errors)
+        form = DokumenPendukungForm({'nama': 'Bukti'}, {'file': SimpleUploadedFile('bukti.pdf', self.ISI)})
+        self.assertTrue(form.is_valid(), form.errors)
+        with override_settings(AMI_UNGGAHAN_MAKS=4):
+            form = DokumenPendukungForm({'nama': 'Bukti'}, {'file': SimpleUploadedFile('bukti.pdf', self.ISI)})
+            self.assertIn('file', form.errors)
+
+    def test_penyelesaian_yang_gagal_dapat_diulang(self):
+        data = self._mulai()
+        self._kirim_semua(data)
+        unggahan = UnggahanBertahap.objects.get(pk=data['id'])
+
+        def gagal(**kwargs):
+            raise DatabaseError('gagal')
+
+        post_save.connect(gagal, sender=DokumenPendukung)
+        try:
+            with self.assertRaises(DatabaseError), self.captureOnCommitCallbacks(execute=True):
+                selesaikan_unggahan(unggahan)
+        finally:
+            post_save.disconnect(gagal, sender=DokumenPendukung)
+        # Berkas sementara belum dipindah ke blob dan unggahan masih aktif
+        self.assertTrue(os.path.exists(path_sementara(unggahan)))
+        self.assertFalse(os.path.exists(self.storage.path(path_blob(hashlib.sha256(self.ISI).hexdigest()))))
+        unggahan.refresh_from_db()
+        self.assertEqual(unggahan.status, 'AKTIF')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dokumen = selesaikan_unggahan(unggahan)
+        self.assertFalse(os.path.exists(path_sementara(unggahan)))
+        with dokumen.file.open('rb') as berkas:
+            self.assertEqual(berkas.read(), self.ISI)
+
+
+class UnduhBerkasTests(BerkasMediaMixin, TestCase):
+    ISI = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.dokumen = self._dokumen(self.ISI, nama='laporan.pdf')
+        self.url = reverse('ami:dokumen_pendukung_unduh', args=[self.dokumen.pk])
+        self.etag = f'"{hashlib.sha256(self.ISI).hexdigest()}"'
+        self.client.force_login(self.user_koordinator)
+
+    def test_unduh_utuh_dengan_etag(self):
+        respons = self.client.get(self.url)
+        self.assertEqual(respons.status_code, 200)
+        self.assertEqual(b''.join(respons.streaming_content), self.ISI)
+        self.assertEqual(respons['Content-Length'], '10')
+        self.assertEqual(respons['ETag'], self.etag)
+        self.assertEqual(respons['Content-Type'], 'application/pdf')
+        self.assertTrue(respons['Content-Disposition'].startswith('inline'))
+        self.assertIn('Bukti.pdf', respons['Content-Disposition'])
+        self.assertEqual(respons['Content-Security-Policy'], 'sandbox')
+
+        respons = self.client.get(self.url, headers={'If-None-Match': self.etag})
+        self.assertEqual(respons.status_code, 304)
+
+    def test_jenis_berbahaya_selalu_diunduh_sebagai_lampiran(self):
+        dokumen = self._dokumen(b'<script>alert(1)</script>', nama='serangan.html')
+        # Baris blob lama menyimpan content type dari header klien
+        BlobBerkas.objects.filter(hash=hash_dari_nama(dokumen.file.name)).update(content_type='application/pdf')
+        respons = self.client.get(reverse('ami:dokumen_pendukung_unduh', args=[dokumen.pk]))
+        self.assertEqual(respons.status_code, 200)
+        self.assertEqual(respons['Content-Type'], 'text/html')
+        self.assertTrue(respons['Content-Disposition'].startswith('attachment'))
+        self.assertIn('Bukti.html', respons['Content-Disposition'])
+        self.assertEqual(respons['Content-Security-Policy'], 'sandbox')
+
+    def test_range(self):
+        respons = self.client.get(self.url, headers={'Range': 'bytes=2-5'})
+        self.assertEqual(respons.status_code, 206)
+        self.assertEqual(b''.join(respons.streaming_content), b'2345')
+        self.assertEqual(respons['Content-Range'], 'bytes 2-5/10')
+
+        respons = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(respons.streaming_content), b'789')
+
+        respons = self.client.get(self.url, headers={'Range': 'bytes=20-'})
+        self.assertEqual(respons.status_code, 416)
+        self.assertEqual(respons['Content-Range'], 'bytes */10')
+
+    @override_settings(AMI_MEDIA_OFFLOAD='x-accel-redirect', AMI_MEDIA_INTERNAL_URL='/media-internal/')
+    def test_offload_ke_web_server(self):
+        respons = self.client.get(self.url)
+        self.assertEqual(respons['X-Accel-Redirect'], '/media-internal/' + self.dokumen.file.name)
+        self.assertEqual(respons.content, b'')
+
+    def test_berkas_hilang_menjadi_404(self):
+        os.remove(self.storage.path(self.dokumen.file.name))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ArsipSesiTests(BerkasMediaMixin, TestCase):
+    def test_arsip_berisi_berkas_dan_manifest(self):
+        p1, p2, _ = PenilaianDiri.objects.filter(audit_session=self.sesi).order_by('elemen__kode')
+        PenilaianDiri.objects.filter(pk=p1.pk).update(bukti_dokumen='https://drive.google.com/bukti')
+        self._dokumen(b'pertama', penilaian=p1)
+        self._dokumen(b'kedua', penilaian=p1)
+        hilang = self._dokumen(b'hilang', penilaian=p2)
+        os.remove(self.storage.path(hilang.file.name))
+
+        self.client.force_login(self.user_auditor)
+        respons = self.client.get(reverse('ami:audit_session_arsip', args=[self.sesi.pk]))
+        self.assertEqual(respons.status_code, 200)
+        self.assertEqual(respons['Content-Type'], 'application/zip')
+        arsip = zipfile.ZipFile(io.BytesIO(b''.join(respons.streaming_content)))
+        self.assertIsNone(arsip.testzip())
+        self.assertEqual(arsip.namelist(), ['K1/1.1/Bukti.pdf', 'K1/1.1/Bukti (2).pdf', 'manifest.csv'])
+        self.assertEqual(arsip.read('K1/1.1/Bukti.pdf'), b'pertama')
+        self.assertEqual(arsip.read('K1/1.1/Bukti (2).pdf'), b'kedua')
+
+        manifest = list(csv.DictReader(io.StringIO(arsip.read('manifest.csv').decode('utf-8-sig'))))
+        self.assertEqual([row['elemen'] for row in manifest], ['1.1', '1.2', '1.3'])
+        self.assertEqual(manifest[0]['bukti_dokumen'], 'https://drive.google.com/bukti')
+        self.assertEqual(manifest[0]['berkas'], 'K1/1.1/Bukti.pdf; K1/1.1/Bukti (2).pdf')
+        self.assertEqual(manifest[1]['berkas_tidak_ditemukan'], 'K1/1.2/Bukti.pdf')
+
+    def test_arsip_menolak_pengguna_tanpa_akses(self):
+        self.client.force_login(User.objects.create_user('tamu'))
+        respons = self.client.get(reverse('ami:audit_session_arsip', args=[self.sesi.pk]))
+        self.assertEqual(respons.status_code, 403)
+
+
+class PreviewDokumenTests(BerkasMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dokumen = self._dokumen(b'%PDF-1.4 isi', nama='laporan.pdf')
+        self.hash = hash_dari_nama(self.dokumen.file.name)
+
+    def _blob(self):
+        return BlobBerkas.objects.values('status_preview', 'jumlah_halaman').get(hash=self.hash)
+
+    def test_preview_dijadwalkan_untuk_blob_baru(self):
+        self.jadwalkan_preview.assert_called_once_with(self.hash)
+        BlobBerkas.objects.filter(hash=self.hash).update(status_preview='SIAP')
+        self._dokumen(b'%PDF-1.4 isi', nama='salinan.pdf')
+        self.jadwalkan_preview.assert_called_once()
+
+    def test_broker_mati_tidak_menggagalkan_penjadwalan(self):
+        from .tasks import buat_preview_dokumen
+
+        with mock.patch.object(buat_preview_dokumen.app, 'connection_for_write', side_effect=OSError('broker')), \
+                self.assertLogs('ami.utils.preview', 'WARNING'):
+            jadwalkan_preview(self.hash)
+
+    def test_preview_disimpan_dan_dipakai_ulang(self):
+        with mock.patch('ami.utils.preview.render_preview', return_value=(b'png', 3)) as render:
+            self.assertEqual(buat_preview(self.hash), 'SIAP')
+            self.assertEqual(self._blob(), {'status_preview': 'SIAP', 'jumlah_halaman': 3})
+            # Blob yang sama diproses ulang memakai preview di disk
+            BlobBerkas.objects.filter(hash=self.hash).update(status_preview='BELUM', jumlah_halaman=None)
+            self.assertEqual(buat_preview(self.hash), 'SIAP')
+        render.assert_called_once()
+        self.assertEqual(self._blob()['jumlah_halaman'], 3)
+
+        self.client.force_login(self.user_koordinator)
+        respons = self.client.get(reverse('ami:dokumen_pendukung_preview', args=[self.dokumen.pk]))
+        self.assertEqual(respons['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(respons.streaming_content), b'png')
+
+    def test_tanpa_pillow_dan_pymupdf_tidak_didukung(self):
+        with mock.patch.dict('sys.modules', {'PIL': None, 'pymupdf': None, 'fitz': None}):
+            self.assertEqual(buat_preview(self.hash), 'TIDAK_DIDUKUNG')
+        self.assertEqual(self._blob(), {'status_preview': 'TIDAK_DIDUKUNG', 'jumlah_halaman': None})
+        self.assertFalse(os.path.exists(self.storage.path(path_preview(self.hash))))
+
+        self.client.force_login(self.user_koordinator)
+        respons = self.client.get(reverse('ami:dokumen_pendukung_preview', args=[self.dokumen.pk]))
+        self.assertEqual(respons.status_code, 404)
+
+    def test_render_gagal(self):
+        with mock.patch('ami.utils.preview.render_preview', side_effect=ValueError('rusak')), \
+                self.assertLogs('ami.utils.preview', 'ERROR'):
+            self.assertEqual(buat_preview(self.hash), 'GAGAL')
+
+    @unittest.skipUnless(importlib.util.find_spec('PIL'), 'Pillow tidak terpasang')
+    def test_preview_gambar_dengan_pillow(self):
+        from PIL import Image
+
+        gambar = io.BytesIO()
+        Image.new('RGB', (1200, 800), 'red').save(gambar, 'JPEG')
+        hash_hex = hash_dari_nama(self._dokumen(gambar.getvalue(), nama='foto.jpg').file.name)
+        self.assertEqual(buat_preview(hash_hex), 'SIAP')
+        with Image.open(self.storage.path(path_preview(hash_hex))) as preview:
+            self.assertEqual(preview.format, 'PNG')
+            self.assertLessEqual(preview.width, 320)
@@ -1,7 +1,9 @@
-from django.urls import path
+import re
+
+from django.urls import path, re_path
+from django.views.static import serve
 from . import views
 from django.conf import settings
-from django.conf.urls.static import static
 
 app_name = 'ami'
 
@@ -55,6 +57,7 @@ urlpatterns = [
     path('audit-session/', views.audit_session_list, name='audit_session_list'),
     path('audit-session/create/', views.audit_session_create, name='audit_session_create'),
     path('audit-session/<int:pk>/', views.audit_session_detail, name='audit_session_detail'),
+    path('audit-session/<int:pk>/arsip/', views.audit_session_arsip, name='audit_session_arsip'),
     path('audit-session/<int:pk>/edit/', views.audit_session_update, name='audit_session_update'),
     path('audit-session/<int:pk>/delete/', views.audit_session_delete, name='audit_session_delete'),
 
@@ -62,18 +65,27 @@ urlpatterns = [
     path('penilaian-diri/<int:session_id>/', views.penilaian_diri_list, name='penilaian_diri_list'),
     path('penilaian-diri/<int:session_id>/create/', views.penilaian_diri_create, name='penilaian_diri_create'),
     path('penilaian-diri/<int:pk>/edit/', views.penilaian_diri_update, name='penilaian_diri_update'),
+    path('penilaian-diri/<int:session_id>/batch/', views.penilaian_diri_batch, name='penilaian_diri_batch'),
+    path('api/penilaian-diri/<int:pk>/', views.penilaian_diri_autosave, name='penilaian_diri_autosave'),
     path('penilaian-submit-penilaian-diri/<int:session_id>/', views.submit_penilaian_diri, name='submit_penilaian_diri'),
     # Audit
     path('audit/<int:session_id>/', views.audit_list, name='audit_list'),
     path('audit/<int:pk>/edit/', views.audit_update, name='audit_update'),
+    path('api/audit/<int:pk>/', views.audit_autosave, name='audit_autosave'),
 
     # Dokumen Pendukung
     path('dokumen-pendukung/<int:penilaian_id>/create/', views.dokumen_pendukung_create, name='dokumen_pendukung_create'),
     path('dokumen-pendukung/<int:pk>/delete/', views.dokumen_pendukung_delete, name='dokumen_pendukung_delete'),
+    path('dokumen-pendukung/<int:pk>/unduh/', views.dokumen_pendukung_unduh, name='dokumen_pendukung_unduh'),
+    path('dokumen-pendukung/<int:pk>/preview/', views.dokumen_pendukung_preview, name='dokumen_pendukung_preview'),
+    path('api/dokumen-pendukung/<int:penilaian_id>/unggahan/', views.unggahan_mulai, name='unggahan_mulai'),
+    path('api/unggahan/<uuid:pk>/', views.unggahan_detail, name='unggahan_detail'),
+    path('api/unggahan/<uuid:pk>/selesai/', views.unggahan_selesai, name='unggahan_selesai'),
 
     # Rekomendasi Tindak Lanjut
     path('rekomendasi/<int:session_id>/', views.rekomendasi_tindak_lanjut_list, name='rekomendasi_tindak_lanjut_list'),
     path('rekomendasi/<int:pk>/edit/', views.rekomendasi_tindak_lanjut_update, name='rekomendasi_tindak_lanjut_update'),
+    path('rekomendasi/<int:pk>/bukti/', views.rekomendasi_bukti_unduh, name='rekomendasi_bukti_unduh'),
 
    # Laporan Audit
     path("laporan/", views.laporan_index_audit, name="laporan_index_audit"),
@@ -85,9 +97,17 @@ urlpatterns = [
 
     #Laporan internal
     path('laporan/internal/<int:session_id>/', views.laporan_internal, name='laporan_internal'),
+    path('api/laporan/cache-stats/', views.laporan_cache_stats, name='laporan_cache_stats'),
 
 ]
 
 #untuk gambar
+# Hanya berkas di akar MEDIA_ROOT (logo, dll.); berkas bukti di subdirektori
+# (blob/, preview/, dokumen_pendukung/, tindak_lanjut/) wajib lewat view berizin
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>[^/]+)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve, {'document_root': settings.MEDIA_ROOT},
+        ),
+    ]
\ No newline at end of file
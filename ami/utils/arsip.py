@@ -0,0 +1,164 @@
+# ami/utils/arsip.py
+import csv
+import io
+import os
+import re
+import zipfile
+
+from django.utils import timezone
+
+from ami.models import BlobBerkas, DokumenPendukung, PenilaianDiri, RekomendasiTindakLanjut
+
+from .katalog import katalog
+from .storage import UKURAN_CHUNK, hash_dari_nama, storage_berkas
+
+NAMA_MANIFEST = 'manifest.csv'
+POLA_KARAKTER_TERLARANG = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
+
+
+class _PenampungZip:
+    """
+    Tujuan tulis ZipFile yang tidak dapat di-seek: byte yang ditulis ditampung
+    lalu diambil generator setelah setiap potongan, sehingga memori yang
+    dipakai sebatas satu potongan. ZipFile otomatis memakai data descriptor
+    karena ukuran tiap berkas tidak bisa ditulis ulang ke header.
+    """
+
+    def __init__(self):
+        self._potongan = []
+
+    def write(self, data):
+        self._potongan.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def ambil(self):
+        data = b''.join(self._potongan)
+        self._potongan = []
+        return data
+
+
+def _bagian_path(teks, cadangan):
+    """Komponen path di arsip yang aman untuk semua sistem operasi"""
+    teks = POLA_KARAKTER_TERLARANG.sub('_', str(teks or '')).strip(' .')
+    return teks[:100] or cadangan
+
+
+def _waktu_zip(waktu):
+    waktu = timezone.localtime(waktu) if waktu and timezone.is_aware(waktu) else waktu
+    if waktu is None or waktu.year < 1980:
+        return (1980, 1, 1, 0, 0, 0)
+    return waktu.timetuple()[:6]
+
+
+def daftar_berkas_sesi(audit_session):
+    """
+    Daftar berkas bukti sesi audit beserta path-nya di arsip, urut kode
+    kriteria/elemen: [(penilaian_id, path_arsip, nama_storage, waktu)], dan
+    baris manifest per elemen {penilaian_id: {...}}.
+    """
+    pohon = katalog.pohon(audit_session.program_studi.lembaga_akreditasi_id)
+    penilaian = {
+        row['id']: row for row in PenilaianDiri.objects.filter(
+            audit_session=audit_session, elemen_id__in=pohon.elemen_by_id
+        ).values('id', 'elemen_id', 'bukti_dokumen')
+    }
+    urutan = {e.id: i for i, e in enumerate(pohon.semua_elemen())}
+
+    berkas = [
+        (row['penilaian_diri_id'], row['nama'], row['file'], row['tanggal_upload'])
+        for row in DokumenPendukung.objects.filter(penilaian_diri_id__in=penilaian)
+        .order_by('tanggal_upload', 'id').values('penilaian_diri_id', 'nama', 'file', 'tanggal_upload')
+    ]
+    berkas += [
+        (row['audit__penilaian_diri_id'], f'Tindak lanjut {row["id"]}', row['bukti_tindak_lanjut'], None)
+        for row in RekomendasiTindakLanjut.objects.filter(audit__penilaian_diri_id__in=penilaian)
+        .exclude(bukti_tindak_lanjut='').exclude(bukti_tindak_lanjut__isnull=True)
+        .order_by('id').values('id', 'audit__penilaian_diri_id', 'bukti_tindak_lanjut')
+    ]
+    # Nama asli blob (untuk ekstensi) dimuat sekaligus
+    nama_asli = dict(BlobBerkas.objects.filter(
+        hash__in={hash_dari_nama(b[2]) for b in berkas} - {None}
+    ).values_list('hash', 'nama_asli'))
+
+    hasil, terpakai = [], set()
+    for penilaian_id, nama, nama_storage, waktu in sorted(
+        berkas, key=lambda b: urutan[penilaian[b[0]]['elemen_id']]
+    ):
+        elemen = pohon.elemen_by_id[penilaian[penilaian_id]['elemen_id']]
+        kriteria = pohon.kriteria_by_id[elemen.kriteria_id]
+        hash_hex = hash_dari_nama(nama_storage)
+        ekstensi = os.path.splitext(nama_asli.get(hash_hex, '') if hash_hex else nama_storage)[1]
+        folder = f'{_bagian_path(kriteria.kode, str(kriteria.id))}/{_bagian_path(elemen.kode, str(elemen.id))}'
+        dasar = _bagian_path(nama, 'dokumen')
+        if dasar.lower().endswith(ekstensi.lower()):
+            dasar = dasar[:len(dasar) - len(ekstensi)]
+        path, nomor = f'{folder}/{dasar}{ekstensi}', 1
+        while path.lower() in terpakai:
+            nomor += 1
+            path = f'{folder}/{dasar} ({nomor}){ekstensi}'
+        terpakai.add(path.lower())
+        hasil.append((penilaian_id, path, nama_storage, waktu))
+
+    manifest = {}
+    for penilaian_id, row in sorted(penilaian.items(), key=lambda item: urutan[item[1]['elemen_id']]):
+        elemen = pohon.elemen_by_id[row['elemen_id']]
+        manifest[penilaian_id] = {
+            'kriteria': pohon.kriteria_by_id[elemen.kriteria_id].kode,
+            'elemen': elemen.kode,
+            'nama_elemen': elemen.nama,
+            'bukti_dokumen': row['bukti_dokumen'] or '',
+        }
+    return hasil, manifest
+
+
+def stream_arsip_sesi(audit_session):
+    """
+    Generator isi ZIP seluruh bukti sesi audit: berkas per kriteria/elemen
+    lalu manifest.csv (link bukti_dokumen dan berkas per elemen). Tidak ada
+    berkas sementara; setiap berkas dibaca dan dikirim per potongan.
+    Daftar berkas dimuat saat fungsi dipanggil, sebelum respons mulai dikirim.
+    """
+    berkas, manifest = daftar_berkas_sesi(audit_session)
+    return (data for data in _tulis_arsip(berkas, manifest) if data)
+
+
+def _tulis_arsip(berkas, manifest):
+    storage = storage_berkas()
+    penampung = _PenampungZip()
+    berkas_per_elemen, hilang = {}, {}
+
+    with zipfile.ZipFile(penampung, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as arsip:
+        for penilaian_id, path, nama_storage, waktu in berkas:
+            try:
+                sumber = storage.open(nama_storage, 'rb')
+            except FileNotFoundError:
+                hilang.setdefault(penilaian_id, []).append(path)
+                continue
+            info = zipfile.ZipInfo(path, date_time=_waktu_zip(waktu))
+            # Bukti umumnya PDF/gambar yang sudah terkompresi, jadi disimpan apa adanya
+            info.compress_type = zipfile.ZIP_STORED
+            with sumber, arsip.open(info, mode='w', force_zip64=True) as tujuan:
+                for chunk in iter(lambda: sumber.read(UKURAN_CHUNK), b''):
+                    tujuan.write(chunk)
+                    yield penampung.ambil()
+            yield penampung.ambil()
+            berkas_per_elemen.setdefault(penilaian_id, []).append(path)
+
+        teks = io.StringIO()
+        writer = csv.writer(teks)
+        writer.writerow(['kriteria', 'elemen', 'nama_elemen', 'bukti_dokumen', 'berkas', 'berkas_tidak_ditemukan'])
+        for penilaian_id, row in manifest.items():
+            writer.writerow([
+                row['kriteria'], row['elemen'], row['nama_elemen'], row['bukti_dokumen'],
+                '; '.join(berkas_per_elemen.get(penilaian_id, [])),
+                '; '.join(hilang.get(penilaian_id, [])),
+            ])
+        info = zipfile.ZipInfo(NAMA_MANIFEST, date_time=_waktu_zip(timezone.now()))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # BOM agar Excel membaca CSV sebagai UTF-8
+        arsip.writestr(info, '\ufeff' + teks.getvalue())
+        yield penampung.ambil()
+    yield penampung.ambil()
@@ -1,127 +1,311 @@
 # ami/utils/excel_parser.py
+import hashlib
 import re
+import unicodedata
+from collections import deque
+
+
+def normalisasi_teks(teks):
+    """Normalisasi teks sebelum di-hash: NFKC dan spasi berlebih dirapikan"""
+    if teks is None:
+        return ''
+    teks = unicodedata.normalize('NFKC', str(teks))
+    return ' '.join(teks.split())
+
+
+def hash_konten(*bagian):
+    """
+    Hash konten (BLAKE2b, 128 bit) dari satu atau beberapa teks.
+
+    Berbeda dengan hash() bawaan Python, nilainya stabil antar proses
+    (tidak bergantung PYTHONHASHSEED) sehingga bisa disimpan dan dibandingkan
+    pada impor berikutnya.
+    """
+    data = '\x1f'.join(normalisasi_teks(b) for b in bagian)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# ----------------------------
+# Pola template
+# ----------------------------
+# Kriteria dengan nama spesifik (dicocokkan sebagai substring, urutan = prioritas)
+KRITERIA_MAP = {
+    "Kondisi Eksternal": "Kondisi Eksternal",
+    "Kriteria 1 - Visi, Misi,Tujuan dan Strategi": "1",
+    "Kriteria 2 - Tata Kelola, Tata Pamong, dan Kerjasama": "2",
+    "Kriteria 3 - Mahasiswa": "3",
+    "Kriteria 4 - Sumber Daya Manusia": "4",
+    "Kriteria 5 - Keuangan,Sarana danPrasarana": "5",
+    "Kriteria 6 - Pendidikan": "6",
+    "Kriteria 7 - Penelitian": "7",
+    "Kriteria 8 - Pengabdian kepada Masyarakat": "8",
+    "Analisis dan Penetapan Program Pengembangan": "Analisis dan Penetapan Program Pengembangan"
+}
+
+# Elemen dengan nama spesifik
+ELEMEN_MAP = {
+    "Konsistensi dengan hasil analisis SWOT dan/atau analisis lain serta rencana pengembangan ke depan.": "1.1",
+    "Kesesuaian visi, misi, tujuan, dan strategi": "1.2",
+    "Kesesuaian kurikulum dengan capaian pembelajaran lulusan": "6.1",
+    "Relevansi kurikulum dengan kebutuhan pengguna": "6.2",
+    "Rencana pembelajaran tiap mata kuliah": "6.3",
+    "Proses pembelajaran": "6.4",
+    "Penilaian pembelajaran": "6.5",
+    "Integrasi kegiatan penelitian dan PkM dalam pembelajaran": "6.6"
+}
+
+# Sel yang mengandung teks ini bukan indikator (judul tabel/kolom)
+BUKAN_INDIKATOR = ["Tabel", "INDIKATOR PENILAIAN"]
+
+# Indikator tanpa kode tidak boleh diawali/mengandung teks ini
+BUKAN_INDIKATOR_TANPA_KODE = ["Skor", "Jika", "Faktor", "Keterangan"]
+
+POLA_KRITERIA = re.compile(r'Kriteria\s*(\d+\.?\d*)\s*[-:]?\s*(.*)')
+POLA_ELEMEN = re.compile(r'(\d+\.\d+)\s+(.*)')
+POLA_INDIKATOR = re.compile(r'([A-Z]\d+\.?\d*)\s*[-:]?\s*(.*)')
+POLA_SKOR = re.compile(r'Skor\s*(\d+)\s*[=:]\s*(.*)')
+POLA_SKOR_ALT = re.compile(r'Skor\s*(\d+)\s*\n(.*)')
+POLA_RUMUS = re.compile(r'Skor\s*=\s*(.*)')
+
+# Pola kertas kerja BAN-PT (dipakai oleh klasifikasi tervektorisasi pandas)
+POLA_NON_ASCII = re.compile(r'[^\x00-\x7F]+')
+POLA_SPASI = re.compile(r'\s+')
+POLA_HEADER_BANPT = re.compile(r'PENILAIAN AKREDITASI PROGRAM STUDI')
+POLA_TABEL = re.compile(r'Tabel\s+(\d+)\.([a-zA-Z]+)(?:\.(\d+))?')
+POLA_BARIS_SKOR = re.compile(r'Skor\s+\d+|Skor\s*=\s*\d+')
+POLA_PERSEN = re.compile(r'%\s+(?:Sangat Baik|Baik|Cukup|Kurang)')
+POLA_DESKRIPSI_SKOR = re.compile(
+    r'(?:Skor\s*(\d+\.?\d*)|(\d+)\s*=\s*|Skor\s*=\s*(\d+\.?\d*))\s*[:=]?\s*(.*?)(?=\s*Skor\s*\d+|$)',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class PencocokLiteral:
+    """
+    Pencocok banyak literal sekaligus (Aho–Corasick).
+
+    Seluruh literal dicari dalam satu kali pemindaian teks, berapapun jumlah
+    literalnya. Setiap literal diberi label; hasil pencarian berupa dict
+    label → indeks literal terkecil yang ditemukan (indeks = urutan saat
+    didaftarkan, sehingga prioritas seperti urutan dict tetap terjaga).
+    """
+
+    def __init__(self, literal):
+        # literal: iterable (label, teks)
+        literal = list(literal)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for indeks, (label, teks) in enumerate(literal):
+            node = 0
+            for karakter in teks:
+                berikut = self._goto[node].get(karakter)
+                if berikut is None:
+                    berikut = len(self._goto)
+                    self._goto[node][karakter] = berikut
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = berikut
+            self._output[node].append((label, indeks))
+        self._bangun_fail()
+        # Posisi awal kemunculan literal berikutnya dicari oleh mesin regex (C),
+        # sehingga sel tanpa literal sama sekali tidak dipindai per karakter
+        self._awal = re.compile('|'.join(sorted({re.escape(teks) for _, teks in literal}, key=len, reverse=True)))
+
+    def _bangun_fail(self):
+        antrean = deque(self._goto[0].values())
+        while antrean:
+            node = antrean.popleft()
+            for karakter, anak in self._goto[node].items():
+                antrean.append(anak)
+                fail = self._fail[node]
+                while fail and karakter not in self._goto[fail]:
+                    fail = self._fail[fail]
+                kandidat = self._goto[fail].get(karakter, 0)
+                self._fail[anak] = kandidat if kandidat != anak else 0
+                self._output[anak] = self._output[anak] + self._output[self._fail[anak]]
+
+    def cari(self, teks):
+        """Kembalikan dict label → indeks literal terkecil yang muncul di teks"""
+        goto, fail, output = self._goto, self._fail, self._output
+        awal = self._awal.search
+        hasil = {}
+        node = 0
+        posisi, panjang = 0, len(teks)
+        while posisi < panjang:
+            if not node:
+                # Di akar: lompat langsung ke awal kemunculan literal berikutnya
+                match = awal(teks, posisi)
+                if match is None:
+                    break
+                posisi = match.start()
+            karakter = teks[posisi]
+            while node and karakter not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(karakter, 0)
+            for label, indeks in output[node]:
+                if indeks < hasil.get(label, indeks + 1):
+                    hasil[label] = indeks
+            posisi += 1
+        return hasil
+
+
+class RowClassifier:
+    """
+    Klasifikasi baris template audit dalam satu kali pemindaian.
+
+    Seluruh regex dikompilasi sekali (tingkat modul) dan pencarian literal
+    (KRITERIA_MAP, ELEMEN_MAP, daftar pengecualian indikator, serta kata
+    kunci "Kriteria"/"Skor" sebagai penyaring sebelum regex) dilakukan dengan
+    satu automaton Aho–Corasick per sel.
+
+    ``klasifikasi(values)`` mengembalikan (jenis, hasil) dengan jenis salah
+    satu dari JENIS (urutan = prioritas), atau None.
+    """
+    JENIS = ('kriteria', 'elemen', 'indikator', 'skor', 'rumus')
+
+    def __init__(self, kriteria_map=None, elemen_map=None):
+        self.kriteria_map = list((kriteria_map or KRITERIA_MAP).items())
+        self.elemen_map = list((elemen_map or ELEMEN_MAP).items())
+
+        literal = [('kata_kriteria', 'Kriteria'), ('kata_skor', 'Skor')]
+        literal += [('kriteria', nama) for nama, _ in self.kriteria_map]
+        literal += [('elemen', nama) for nama, _ in self.elemen_map]
+        literal += [('bukan_indikator', teks) for teks in BUKAN_INDIKATOR]
+        literal += [('tanpa_kode', teks) for teks in BUKAN_INDIKATOR_TANPA_KODE]
+        self._pencocok = PencocokLiteral(literal)
+        # Offset indeks literal per label agar bisa dipetakan kembali ke map
+        self._offset_kriteria = 2
+        self._offset_elemen = self._offset_kriteria + len(self.kriteria_map)
+        # Pola kode kriteria/elemen di sel mana pun menang atas nama spesifik
+        # (KRITERIA_MAP/ELEMEN_MAP), seperti pencarian per baris sebelumnya
+        self._pemeriksa = (
+            ('kriteria', self._kriteria_pola),
+            ('kriteria', self._kriteria_nama),
+            ('elemen', self._elemen_pola),
+            ('elemen', self._elemen_nama),
+            ('indikator', self._indikator),
+            ('skor', self._skor),
+            ('rumus', self._rumus),
+        )
+
+    # ----------------------------
+    # Per jenis, untuk satu sel yang sudah dipindai
+    # ----------------------------
+    def _kriteria_pola(self, value, temuan):
+        if 'kata_kriteria' in temuan:
+            match = POLA_KRITERIA.search(value)
+            if match:
+                return (match.group(1), match.group(2).strip())
+        return None
+
+    def _kriteria_nama(self, value, temuan):
+        if 'kriteria' in temuan:
+            nama, kode = self.kriteria_map[temuan['kriteria'] - self._offset_kriteria]
+            return (kode, nama)
+        return None
+
+    def _kriteria(self, value, temuan):
+        return self._kriteria_pola(value, temuan) or self._kriteria_nama(value, temuan)
+
+    def _elemen_pola(self, value, temuan):
+        match = POLA_ELEMEN.search(value)
+        if match:
+            return (match.group(1), match.group(2).strip())
+        return None
+
+    def _elemen_nama(self, value, temuan):
+        if 'elemen' in temuan:
+            nama, kode = self.elemen_map[temuan['elemen'] - self._offset_elemen]
+            return (kode, nama)
+        return None
+
+    def _elemen(self, value, temuan):
+        return self._elemen_pola(value, temuan) or self._elemen_nama(value, temuan)
+
+    def _indikator(self, value, temuan):
+        if 'bukan_indikator' in temuan:
+            return None
+        match = POLA_INDIKATOR.search(value)
+        if match:
+            return (match.group(1), match.group(2).strip())
+        # Indikator tanpa kode eksplisit biasanya panjang dan bukan deskripsi skor
+        if len(value) > 50 and 'tanpa_kode' not in temuan:
+            return ("I" + hash_konten(value)[:8], value)
+        return None
+
+    def _skor(self, value, temuan):
+        if 'kata_skor' not in temuan:
+            return None
+        match = POLA_SKOR.search(value) or POLA_SKOR_ALT.search(value)
+        if match:
+            return (float(match.group(1)), match.group(2).strip())
+        return None
+
+    def _rumus(self, value, temuan):
+        if 'kata_skor' not in temuan:
+            return None
+        match = POLA_RUMUS.search(value)
+        if match:
+            return match.group(1).strip()
+        return None
+
+    def klasifikasi_sel(self, jenis, value):
+        """Klasifikasi satu sel untuk satu jenis (None bila tidak cocok)"""
+        if not isinstance(value, str):
+            return None
+        return getattr(self, f'_{jenis}')(value, self._pencocok.cari(value))
+
+    def klasifikasi(self, values):
+        """
+        Klasifikasi satu baris (daftar nilai sel).
+
+        Jenis dengan prioritas lebih tinggi menang walaupun ditemukan pada sel
+        yang lebih belakang; jenis yang prioritasnya di bawah hasil terbaik
+        sementara tidak dicek lagi.
+        """
+        terbaik = None
+        peringkat = len(self._pemeriksa)
+        for value in values:
+            if not isinstance(value, str):
+                continue
+            temuan = self._pencocok.cari(value)
+            for i in range(peringkat):
+                jenis, periksa = self._pemeriksa[i]
+                hasil = periksa(value, temuan)
+                if hasil:
+                    terbaik = (jenis, hasil)
+                    peringkat = i
+                    break
+            if peringkat == 0:
+                break
+        return terbaik
+
+
+_classifier = RowClassifier()
+
 
 def parse_kriteria(cell_value):
     """Menganalisis apakah nilai sel adalah kriteria"""
-    if not isinstance(cell_value, str):
-        return None
-    
-    # Pola umum: "Kriteria 1 - Visi, Misi, Tujuan dan Strategi"
-    pattern = r'Kriteria\s*(\d+\.?\d*)\s*[-:]?\s*(.*)'
-    match = re.search(pattern, cell_value)
-    if match:
-        kode = match.group(1)
-        nama = match.group(2).strip()
-        return (kode, nama)
-    
-    # Cek untuk kriteria dengan nama spesifik
-    kriteria_map = {
-        "Kondisi Eksternal": "Kondisi Eksternal",
-        "Kriteria 1 - Visi, Misi,Tujuan dan Strategi": "1",
-        "Kriteria 2 - Tata Kelola, Tata Pamong, dan Kerjasama": "2",
-        "Kriteria 3 - Mahasiswa": "3",
-        "Kriteria 4 - Sumber Daya Manusia": "4",
-        "Kriteria 5 - Keuangan,Sarana danPrasarana": "5",
-        "Kriteria 6 - Pendidikan": "6",
-        "Kriteria 7 - Penelitian": "7",
-        "Kriteria 8 - Pengabdian kepada Masyarakat": "8",
-        "Analisis dan Penetapan Program Pengembangan": "Analisis dan Penetapan Program Pengembangan"
-    }
-    
-    for kriteria_nama, kode in kriteria_map.items():
-        if kriteria_nama in cell_value:
-            return (kode, kriteria_nama)
-    
-    return None
+    return _classifier.klasifikasi_sel('kriteria', cell_value)
+
 
 def parse_elemen(cell_value):
     """Menganalisis apakah nilai sel adalah elemen"""
-    if not isinstance(cell_value, str):
-        return None
-    
-    # Pola umum elemen: "1.1 Konsistensi dengan hasil analisis SWOT"
-    pattern = r'(\d+\.\d+)\s+(.*)'
-    match = re.search(pattern, cell_value)
-    if match:
-        kode = match.group(1)
-        nama = match.group(2).strip()
-        return (kode, nama)
-    
-    # Cek elemen spesifik
-    elemen_map = {
-        "Konsistensi dengan hasil analisis SWOT dan/atau analisis lain serta rencana pengembangan ke depan.": "1.1",
-        "Kesesuaian visi, misi, tujuan, dan strategi": "1.2",
-        "Kesesuaian kurikulum dengan capaian pembelajaran lulusan": "6.1",
-        "Relevansi kurikulum dengan kebutuhan pengguna": "6.2",
-        "Rencana pembelajaran tiap mata kuliah": "6.3",
-        "Proses pembelajaran": "6.4",
-        "Penilaian pembelajaran": "6.5",
-        "Integrasi kegiatan penelitian dan PkM dalam pembelajaran": "6.6"
-    }
-    
-    for elemen_nama, kode in elemen_map.items():
-        if elemen_nama in cell_value:
-            return (kode, elemen_nama)
-    
-    return None
+    return _classifier.klasifikasi_sel('elemen', cell_value)
+
 
 def parse_indikator(cell_value):
     """Menganalisis apakah nilai sel adalah indikator penilaian"""
-    if not isinstance(cell_value, str):
-        return None
-    
-    # Cari pola seperti "Tabel 5.a LKPS" atau "INDIKATOR PENILAIAN"
-    if "Tabel" in cell_value or "INDIKATOR PENILAIAN" in cell_value:
-        return None
-    
-    # Cari pola indikator dengan kode
-    pattern = r'([A-Z]\d+\.?\d*)\s*[-:]?\s*(.*)'
-    match = re.search(pattern, cell_value)
-    if match:
-        kode = match.group(1)
-        deskripsi = match.group(2).strip()
-        return (kode, deskripsi)
-    
-    # Cari indikator tanpa kode eksplisit
-    if len(cell_value) > 50:  # Indikator biasanya panjang
-        # Cek apakah ini benar-benar indikator dan bukan deskripsi skor
-        if not any(prefix in cell_value for prefix in ["Skor", "Jika", "Faktor", "Keterangan"]):
-            return ("I" + str(hash(cell_value) % 1000), cell_value)
-    
-    return None
+    return _classifier.klasifikasi_sel('indikator', cell_value)
+
 
 def parse_skor(cell_value):
     """Menganalisis apakah nilai sel adalah deskripsi skor"""
-    if not isinstance(cell_value, str):
-        return None
-    
-    # Pola umum: "Skor 0 = Deskripsi..." atau "Skor 0\nDeskripsi..."
-    pattern = r'Skor\s*(\d+)\s*[=:]\s*(.*)'
-    match = re.search(pattern, cell_value)
-    if match:
-        skor = float(match.group(1))
-        deskripsi = match.group(2).strip()
-        return (skor, deskripsi)
-    
-    # Pola alternatif: "Skor 0\nDeskripsi..."
-    pattern_alt = r'Skor\s*(\d+)\s*\n(.*)'
-    match_alt = re.search(pattern_alt, cell_value)
-    if match_alt:
-        skor = float(match_alt.group(1))
-        deskripsi = match_alt.group(2).strip()
-        return (skor, deskripsi)
-    
-    return None
+    return _classifier.klasifikasi_sel('skor', cell_value)
+
 
 def parse_rumus(cell_value):
     """Menganalisis apakah nilai sel adalah rumus perhitungan"""
-    if not isinstance(cell_value, str):
-        return None
-    
-    # Pola umum rumus: "Skor = (A + B) / 2"
-    pattern = r'Skor\s*=\s*(.*)'
-    match = re.search(pattern, cell_value)
-    if match:
-        return match.group(1).strip()
-    
-    return None
\ No newline at end of file
+    return _classifier.klasifikasi_sel('rumus', cell_value)
@@ -0,0 +1,519 @@
+# ami/utils/instrumen_import.py
+"""
+Pipeline impor instrumen akreditasi dari file Excel.
+
+Impor dibagi menjadi dua tahap:
+
+1. parse  - workbook dibaca dan setiap baris diklasifikasikan menjadi
+   struktur kriteria → elemen → indikator berupa dict/list biasa (tanpa
+   akses database). Template audit dibaca secara streaming (read_only,
+   values_only); kertas kerja BAN-PT diklasifikasikan dengan operasi
+   string pandas yang tervektorisasi.
+2. terapkan - struktur tersebut ditulis ke database untuk satu lembaga:
+   data lama dimuat sekali per lembaga, lalu ditulis dengan
+   bulk_create/bulk_update per batch dalam satu transaksi.
+
+Model IndikatorPenilaian/SkorIndikator tidak ada di aplikasi ini, sehingga
+indikator beserta deskripsi skor dan rumusnya disimpan sebagai teks
+Elemen.panduan.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from ami.models import AuditSession, Elemen, Kriteria
+
+from .excel_parser import (
+    POLA_BARIS_SKOR,
+    POLA_DESKRIPSI_SKOR,
+    POLA_HEADER_BANPT,
+    POLA_NON_ASCII,
+    POLA_PERSEN,
+    POLA_SPASI,
+    POLA_TABEL,
+    RowClassifier,
+    hash_konten,
+)
+from .katalog import BAGIAN_INSTRUMEN, katalog
+from .provisioning import provision_audit_session
+from .report_cache import naikkan_versi
+
+
+class PencatatWaktu:
+    """Mencatat durasi setiap fase impor"""
+
+    def __init__(self):
+        self.fase = {}
+
+    @contextmanager
+    def catat(self, nama):
+        mulai = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fase[nama] = self.fase.get(nama, 0.0) + time.perf_counter() - mulai
+
+    @property
+    def total(self):
+        return sum(self.fase.values())
+
+    def ringkasan(self, jumlah_baris):
+        """Baris-baris ringkasan waktu per fase dan kecepatan (baris/detik)"""
+        baris = []
+        for nama, durasi in self.fase.items():
+            baris.append(f'{nama:<14} {durasi:8.3f} s')
+        total = self.total
+        kecepatan = jumlah_baris / total if total else 0
+        baris.append(f'{"total":<14} {total:8.3f} s  ({jumlah_baris} baris, {kecepatan:,.0f} baris/detik)')
+        return baris
+
+
+# ----------------------------
+# Tahap parse
+# ----------------------------
+def baca_baris(file_path, sheet_name=None):
+    """Baca workbook secara streaming, menghasilkan nilai sel tidak kosong per baris"""
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        for row in sheet.iter_rows(values_only=True):
+            yield [value for value in row if value is not None]
+    finally:
+        workbook.close()
+
+
+def parse_baris(rows, classifier=None):
+    """
+    Klasifikasikan baris template menjadi daftar kriteria.
+
+    Mengembalikan (kriteria_list, jumlah_baris) dengan struktur:
+    [{'kode', 'nama', 'elemen': [{'kode', 'nama', 'indikator': [
+        {'kode', 'deskripsi', 'skor': [[skor, deskripsi], ...], 'rumus'}
+    ]}]}]
+    """
+    classifier = classifier or RowClassifier()
+    kriteria_list = []
+    current_kriteria = None
+    current_elemen = None
+    current_indikator = None
+    jumlah_baris = 0
+
+    for values in rows:
+        jumlah_baris += 1
+        hasil = classifier.klasifikasi(values)
+        if hasil is None:
+            continue
+        jenis, data = hasil
+
+        if jenis == 'kriteria':
+            kode, nama = data
+            current_kriteria = {'kode': kode, 'nama': nama, 'elemen': []}
+            kriteria_list.append(current_kriteria)
+            current_elemen = None
+            current_indikator = None
+        elif jenis == 'elemen' and current_kriteria:
+            kode, nama = data
+            current_elemen = {'kode': kode, 'nama': nama, 'indikator': []}
+            current_kriteria['elemen'].append(current_elemen)
+            current_indikator = None
+        elif jenis == 'indikator' and current_elemen:
+            kode, deskripsi = data
+            current_indikator = {'kode': kode, 'deskripsi': deskripsi, 'skor': [], 'rumus': None}
+            current_elemen['indikator'].append(current_indikator)
+        elif jenis == 'skor' and current_indikator:
+            current_indikator['skor'].append(list(data))
+        elif jenis == 'rumus' and current_indikator:
+            current_indikator['rumus'] = data
+
+    return kriteria_list, jumlah_baris
+
+
+def parse_template(file_path, sheet_name=None):
+    """Tahap parse untuk satu file template (tanpa akses database)"""
+    return parse_baris(baca_baris(file_path, sheet_name))
+
+
+def baca_teks_baris(file_path, sheet_name):
+    """Baca sheet dan gabungkan sel tidak kosong per baris menjadi teks yang sudah dibersihkan"""
+    df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, dtype=object)
+    sel = df.stack().astype(str)
+    sel = (
+        sel.str.replace(POLA_NON_ASCII, '', regex=True)
+        .str.replace(POLA_SPASI, ' ', regex=True)
+        .str.strip()
+    )
+    sel = sel[sel != '']
+    return sel.groupby(level=0).agg(' '.join), len(df)
+
+
+def klasifikasi_banpt(teks):
+    """
+    Klasifikasikan teks per baris kertas kerja BAN-PT dalam satu kali proses.
+
+    Mengembalikan (baris, skor):
+    - baris: DataFrame per baris dengan kolom jenis (tabel/indikator/persen/teks),
+      kriteria, elemen, indikator (nomor urut dalam elemen) dan teks
+    - skor: DataFrame deskripsi skor per baris indikator (kolom skor, deskripsi)
+    """
+    teks = teks[~teks.str.contains(POLA_HEADER_BANPT)]
+    tabel = teks.str.extract(POLA_TABEL)
+
+    baris = pd.DataFrame({
+        'teks': teks,
+        'kriteria': tabel[0].ffill(),
+        'elemen': tabel[1].str.upper().ffill(),
+    })
+    ada_tabel = tabel[0].notna()
+    ada_skor = teks.str.contains(POLA_BARIS_SKOR) & baris['elemen'].notna()
+    baris['jenis'] = pd.Categorical(
+        np.select(
+            [ada_skor, ada_tabel, teks.str.contains(POLA_PERSEN)],
+            ['indikator', 'tabel', 'persen'],
+            default='teks',
+        ),
+        categories=['tabel', 'indikator', 'persen', 'teks'],
+    )
+
+    # Indikator yang sama (50 karakter pertama) dalam satu elemen hanya dihitung sekali
+    indikator = baris[baris['jenis'] == 'indikator']
+    duplikat = indikator.assign(awal=indikator['teks'].str[:50]).duplicated(['kriteria', 'elemen', 'awal'])
+    baris.loc[duplikat[duplikat].index, 'jenis'] = 'teks'
+    indikator_mask = baris['jenis'] == 'indikator'
+    baris['indikator'] = (
+        baris[indikator_mask].groupby(['kriteria', 'elemen']).cumcount().add(1).astype('Int64')
+    )
+
+    skor = baris.loc[indikator_mask, 'teks'].str.extractall(POLA_DESKRIPSI_SKOR)
+    if skor.empty:
+        skor = pd.DataFrame({'skor': pd.Series(dtype=float), 'deskripsi': pd.Series(dtype=str)})
+    else:
+        skor = pd.DataFrame({
+            'skor': skor[[0, 1, 2]].bfill(axis=1)[0].astype(float),
+            'deskripsi': skor[3].str.strip(),
+        })
+        skor = skor[skor['deskripsi'] != ''].droplevel('match')
+    return baris, skor
+
+
+def struktur_banpt(baris, skor):
+    """Ubah hasil klasifikasi BAN-PT menjadi struktur kriteria → elemen → indikator"""
+    kriteria_list = {}
+    elemen_map = {}
+    pasangan = baris[['kriteria', 'elemen']].dropna().drop_duplicates()
+    for nomor, kode_elemen in pasangan.itertuples(index=False):
+        kriteria = kriteria_list.setdefault(nomor, {
+            'kode': f'K{nomor}',
+            'nama': f'Kriteria {nomor}',
+            'deskripsi': f'Kriteria {nomor} dari BAN-PT',
+            'elemen': [],
+        })
+        elemen = {
+            'kode': f'{kode_elemen}.',
+            'nama': f'Elemen {kode_elemen}',
+            'deskripsi': f'Elemen {kode_elemen} dari Kriteria {nomor}',
+            'indikator': [],
+        }
+        kriteria['elemen'].append(elemen)
+        elemen_map[(nomor, kode_elemen)] = elemen
+
+    skor_per_baris = {}
+    for index, nilai, deskripsi in skor.itertuples():
+        skor_per_baris.setdefault(index, []).append([nilai, deskripsi])
+
+    indikator = baris[baris['jenis'] == 'indikator']
+    for index, nomor, kode_elemen, urutan, teks in indikator[['kriteria', 'elemen', 'indikator', 'teks']].itertuples():
+        elemen = elemen_map[(nomor, kode_elemen)]
+        elemen['indikator'].append({
+            'kode': f"{elemen['kode']}{urutan}",
+            'deskripsi': teks,
+            'skor': skor_per_baris.get(index, []),
+            'rumus': None,
+        })
+    return list(kriteria_list.values())
+
+
+def parse_banpt(file_path, sheet_name=None):
+    """Tahap parse untuk kertas kerja BAN-PT (tanpa akses database)"""
+    teks, jumlah_baris = baca_teks_baris(file_path, sheet_name or 'Kertas Kerja')
+    baris, skor = klasifikasi_banpt(teks)
+    return struktur_banpt(baris, skor), jumlah_baris
+
+
+# ----------------------------
+# Cache hasil parse
+# ----------------------------
+# Naikkan bila struktur hasil parse berubah agar cache lama tidak terpakai
+VERSI_CACHE = 1
+
+PARSER = {
+    'template': parse_template,
+    'banpt': parse_banpt,
+}
+
+
+def hash_file(file_path, ukuran_blok=1024 * 1024):
+    """Hash BLAKE2b isi file, dibaca per blok"""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for blok in iter(lambda: f.read(ukuran_blok), b''):
+            hasher.update(blok)
+    return hasher.hexdigest()
+
+
+def _direktori_cache():
+    return Path(getattr(settings, 'AMI_IMPORT_CACHE_DIR', Path(settings.BASE_DIR) / '.cache' / 'import'))
+
+
+def path_cache(file_path, jenis, sheet_name=None):
+    """Lokasi cache hasil parse untuk isi file, jenis parser dan sheet tertentu"""
+    kunci = hash_konten(hash_file(file_path), jenis, sheet_name or '', str(VERSI_CACHE))
+    return _direktori_cache() / f'{jenis}-{kunci}.jsonl'
+
+
+def _baca_cache(path):
+    """Baca cache JSON Lines: baris pertama metadata, selanjutnya satu kriteria per baris"""
+    with open(path, encoding='utf-8') as f:
+        meta = json.loads(f.readline())
+        if meta.get('versi') != VERSI_CACHE:
+            return None
+        kriteria_list = [json.loads(baris) for baris in f if baris.strip()]
+    return kriteria_list, meta['jumlah_baris']
+
+
+def _tulis_cache(path, kriteria_list, jumlah_baris):
+    """Tulis cache secara atomik (file sementara lalu os.replace)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, sementara = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'versi': VERSI_CACHE, 'jumlah_baris': jumlah_baris}) + '\n')
+            for kriteria in kriteria_list:
+                f.write(json.dumps(kriteria, ensure_ascii=False) + '\n')
+        os.replace(sementara, path)
+    except BaseException:
+        os.unlink(sementara)
+        raise
+
+
+def parse_dengan_cache(jenis, file_path, sheet_name=None, pakai_cache=True):
+    """
+    Jalankan tahap parse dengan cache berdasarkan hash isi file.
+
+    Mengembalikan (kriteria_list, jumlah_baris, dari_cache). Dengan
+    pakai_cache=False file selalu di-parse ulang dan cache ditimpa.
+    """
+    path = path_cache(file_path, jenis, sheet_name)
+    if pakai_cache and path.exists():
+        try:
+            hasil = _baca_cache(path)
+        except (OSError, ValueError, KeyError):
+            hasil = None
+        if hasil is not None:
+            return (*hasil, True)
+
+    kriteria_list, jumlah_baris = PARSER[jenis](file_path, sheet_name)
+    try:
+        _tulis_cache(path, kriteria_list, jumlah_baris)
+    except OSError:
+        # Cache hanya optimasi, impor tetap berjalan walau tidak bisa ditulis
+        pass
+    return kriteria_list, jumlah_baris, False
+
+
+# ----------------------------
+# Parse paralel (ProcessPoolExecutor)
+# ----------------------------
+def inisialisasi_worker():
+    """Initializer proses worker: pastikan Django siap bila proses dibuat dengan spawn"""
+    import django
+
+    django.setup()
+
+
+def parse_di_worker(jenis, file_path, sheet_name=None, pakai_cache=True):
+    """
+    Tahap parse untuk dijalankan di proses worker.
+
+    Fungsi tingkat modul agar bisa di-pickle; hanya membaca file (dan cache
+    parse), tidak menyentuh database. Mengembalikan dict berisi hasil parse
+    dan durasinya.
+    """
+    mulai = time.perf_counter()
+    kriteria_list, jumlah_baris, dari_cache = parse_dengan_cache(jenis, file_path, sheet_name, pakai_cache)
+    return {
+        'kriteria': kriteria_list,
+        'jumlah_baris': jumlah_baris,
+        'dari_cache': dari_cache,
+        'durasi': time.perf_counter() - mulai,
+    }
+
+
+# ----------------------------
+# Tahap terapkan
+# ----------------------------
+def format_panduan(indikator_list):
+    """Susun teks panduan elemen dari indikator, deskripsi skor dan rumus"""
+    bagian = []
+    for indikator in indikator_list:
+        baris = [f"{indikator['kode']} - {indikator['deskripsi']}".strip(' -')]
+        for skor, deskripsi in indikator['skor']:
+            baris.append(f'Skor {skor:g}: {deskripsi}')
+        if indikator.get('rumus'):
+            baris.append(f"Rumus: {indikator['rumus']}")
+        bagian.append('\n'.join(baris))
+    return '\n\n'.join(bagian)
+
+
+def _potong(model, field, nilai):
+    max_length = model._meta.get_field(field).max_length
+    return nilai[:max_length] if nilai and max_length else nilai
+
+
+def _gabung_kriteria(kriteria_list):
+    """Gabungkan kriteria/elemen dengan kode sama yang muncul lebih dari sekali"""
+    hasil = {}
+    for data in kriteria_list:
+        kode = _potong(Kriteria, 'kode', data['kode'])
+        kriteria = hasil.setdefault(kode, {
+            'kode': kode, 'nama': data['nama'],
+            'deskripsi': data.get('deskripsi'), 'elemen': {},
+        })
+        for elemen in data['elemen']:
+            # Kode dipotong sebelum digabung agar cocok dengan kode yang tersimpan
+            kode_elemen = _potong(Elemen, 'kode', elemen['kode'])
+            gabungan = kriteria['elemen'].setdefault(kode_elemen, {
+                'kode': kode_elemen, 'nama': elemen['nama'],
+                'deskripsi': elemen.get('deskripsi'), 'indikator': [],
+            })
+            gabungan['indikator'].extend(elemen['indikator'])
+    return hasil
+
+
+def terapkan_instrumen(lembaga, kriteria_list, batch_size=500, waktu=None):
+    """
+    Tulis hasil parse ke database untuk satu lembaga akreditasi.
+
+    Kode dan hash konten kriteria/elemen yang sudah ada dimuat dengan satu
+    query masing-masing, lalu dibandingkan dengan hash konten dari workbook:
+    baris baru dibuat dengan bulk_create, baris yang hash-nya berbeda
+    diperbarui dengan bulk_update, dan baris yang sama tidak disentuh.
+    Karena bulk_create tidak memicu signal, katalog instrumen diinvalidasi,
+    sesi audit yang masih berjalan disiapkan ulang dan versi laporan sesi
+    lembaga tersebut dinaikkan secara eksplisit.
+    """
+    waktu = waktu or PencatatWaktu()
+    data_kriteria = _gabung_kriteria(kriteria_list)
+
+    with transaction.atomic():
+        with waktu.catat('prefetch'):
+            kriteria_ada = {
+                k.kode: k
+                for k in Kriteria.objects.filter(lembaga_akreditasi=lembaga).only('id', 'kode', 'hash_konten')
+            }
+            elemen_ada = {
+                (e.kriteria_id, e.kode): e
+                for e in Elemen.objects.filter(kriteria__lembaga_akreditasi=lembaga)
+                .only('id', 'kriteria_id', 'kode', 'nama', 'hash_konten')
+            }
+
+        with waktu.catat('tulis'):
+            kriteria_baru, kriteria_ubah, kriteria_tetap = [], [], 0
+            for kode, data in data_kriteria.items():
+                nama = _potong(Kriteria, 'nama', data['nama'])
+                hash_baru = hash_konten(nama)
+                kriteria = kriteria_ada.get(kode)
+                if kriteria is None:
+                    kriteria = Kriteria(
+                        lembaga_akreditasi=lembaga, kode=kode, nama=nama,
+                        deskripsi=data['deskripsi'], hash_konten=hash_baru,
+                    )
+                    kriteria_baru.append(kriteria)
+                    kriteria_ada[kode] = kriteria
+                elif kriteria.hash_konten != hash_baru:
+                    kriteria.nama = nama
+                    kriteria.hash_konten = hash_baru
+                    kriteria_ubah.append(kriteria)
+                else:
+                    kriteria_tetap += 1
+            Kriteria.objects.bulk_create(kriteria_baru, batch_size=batch_size)
+            Kriteria.objects.bulk_update(kriteria_ubah, ['nama', 'hash_konten'], batch_size=batch_size)
+
+            elemen_baru, elemen_ubah, elemen_tetap = [], [], 0
+            tanpa_panduan = []
+            for kode_kriteria, data in data_kriteria.items():
+                kriteria = kriteria_ada[kode_kriteria]
+                for kode, data_elemen in data['elemen'].items():
+                    nama = _potong(Elemen, 'nama', data_elemen['nama'])
+                    panduan = format_panduan(data_elemen['indikator']) or None
+                    elemen = elemen_ada.get((kriteria.pk, kode))
+                    if elemen is None:
+                        elemen_baru.append(Elemen(
+                            kriteria=kriteria, kode=kode, nama=nama,
+                            deskripsi=data_elemen['deskripsi'], panduan=panduan,
+                            hash_konten=hash_konten(nama, panduan),
+                        ))
+                    elif panduan is None:
+                        # Workbook tidak memuat indikator: panduan lama dipertahankan
+                        if elemen.nama != nama:
+                            elemen.nama = nama
+                            tanpa_panduan.append(elemen)
+                        else:
+                            elemen_tetap += 1
+                    elif elemen.hash_konten != hash_konten(nama, panduan):
+                        elemen.nama = nama
+                        elemen.panduan = panduan
+                        elemen.hash_konten = hash_konten(nama, panduan)
+                        elemen_ubah.append(elemen)
+                    else:
+                        elemen_tetap += 1
+
+            if tanpa_panduan:
+                panduan_lama = dict(
+                    Elemen.objects.filter(pk__in=[e.pk for e in tanpa_panduan]).values_list('pk', 'panduan')
+                )
+                for elemen in tanpa_panduan:
+                    elemen.panduan = panduan_lama[elemen.pk]
+                    elemen.hash_konten = hash_konten(elemen.nama, elemen.panduan)
+                elemen_ubah.extend(tanpa_panduan)
+
+            Elemen.objects.bulk_create(elemen_baru, batch_size=batch_size)
+            Elemen.objects.bulk_update(elemen_ubah, ['nama', 'panduan', 'hash_konten'], batch_size=batch_size)
+
+        # bulk_create/bulk_update tidak memicu signal invalidasi katalog
+        if kriteria_baru or kriteria_ubah or elemen_baru or elemen_ubah:
+            katalog.invalidasi(BAGIAN_INSTRUMEN)
+
+        with waktu.catat('provisioning'):
+            if elemen_baru:
+                sessions = AuditSession.objects.filter(
+                    program_studi__lembaga_akreditasi=lembaga
+                ).exclude(status='SELESAI')
+                for session in sessions:
+                    provision_audit_session(session)
+
+    # bulk_create/bulk_update juga tidak memicu signal versi laporan: nama
+    # kriteria/elemen di laporan seluruh sesi lembaga ini bisa berubah
+    if kriteria_baru or kriteria_ubah or elemen_baru or elemen_ubah:
+        for session_id in AuditSession.objects.filter(
+            program_studi__lembaga_akreditasi=lembaga
+        ).values_list('pk', flat=True):
+            naikkan_versi(session_id)
+
+    return {
+        'kriteria_baru': len(kriteria_baru),
+        'kriteria_diperbarui': len(kriteria_ubah),
+        'kriteria_tetap': kriteria_tetap,
+        'elemen_baru': len(elemen_baru),
+        'elemen_diperbarui': len(elemen_ubah),
+        'elemen_tetap': elemen_tetap,
+    }
@@ -0,0 +1,229 @@
+# ami/utils/katalog.py
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from ami.models import Elemen, Kriteria, LembagaAkreditasi, ProgramStudi
+
+VERSI_KEY = 'ami:katalog:versi:{bagian}'
+
+# instrumen: pohon Kriteria→Elemen seluruh lembaga; referensi: daftar
+# ProgramStudi dan LembagaAkreditasi untuk dropdown filter
+BAGIAN_INSTRUMEN = 'instrumen'
+BAGIAN_REFERENSI = 'referensi'
+
+_LABEL_STATUS = dict(Elemen._meta.get_field('status').choices)
+
+
+class _ItemKatalog:
+    """Atribut bersama item katalog agar bisa dipakai template seperti objek model"""
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_status_display(self):
+        return _LABEL_STATUS.get(self.status, self.status)
+
+
+class ElemenKatalog(_ItemKatalog, namedtuple('ElemenKatalog', [
+    'id', 'kriteria_id', 'kode', 'nama', 'skor_maksimal', 'status',
+])):
+    __slots__ = ()
+
+
+class KriteriaKatalog(_ItemKatalog, namedtuple('KriteriaKatalog', [
+    'id', 'lembaga_akreditasi_id', 'kode', 'nama', 'deskripsi', 'status', 'elemen',
+])):
+    __slots__ = ()
+
+    # Kriteria dibandingkan dan di-hash per id (elemen tidak ikut dibandingkan)
+    def __eq__(self, other):
+        return isinstance(other, KriteriaKatalog) and other.id == self.id
+
+    def __hash__(self):
+        return hash(('kriteria', self.id))
+
+
+LembagaKatalog = namedtuple('LembagaKatalog', ['id', 'kode', 'nama'])
+ProgramStudiKatalog = namedtuple('ProgramStudiKatalog', [
+    'id', 'kode', 'nama', 'jenjang', 'fakultas', 'lembaga_akreditasi_id',
+])
+
+
+class PohonInstrumen:
+    """Pohon Kriteria→Elemen satu lembaga akreditasi (tidak dapat diubah)"""
+    __slots__ = ('lembaga_id', 'kriteria', 'kriteria_by_id', 'elemen_by_id')
+
+    def __init__(self, lembaga_id, kriteria):
+        self.lembaga_id = lembaga_id
+        self.kriteria = tuple(kriteria)
+        self.kriteria_by_id = MappingProxyType({k.id: k for k in self.kriteria})
+        self.elemen_by_id = MappingProxyType({e.id: e for k in self.kriteria for e in k.elemen})
+
+    def semua_elemen(self, aktif_saja=False):
+        return [
+            e for k in self.kriteria for e in k.elemen
+            if not aktif_saja or e.status == 'aktif'
+        ]
+
+    def elemen_ids(self, aktif_saja=False):
+        return [e.id for e in self.semua_elemen(aktif_saja)]
+
+    @property
+    def kriteria_ids(self):
+        return list(self.kriteria_by_id)
+
+    @property
+    def jumlah_elemen(self):
+        return len(self.elemen_by_id)
+
+    def kelompokkan(self, items, kriteria_id):
+        """
+        Kelompokkan items per kriteria dengan urutan kriteria katalog:
+        {KriteriaKatalog: [item, ...]}. kriteria_id adalah fungsi item → id
+        kriteria; item dari kriteria di luar pohon diabaikan.
+        """
+        kelompok = {k: [] for k in self.kriteria}
+        for item in items:
+            k = self.kriteria_by_id.get(kriteria_id(item))
+            if k is not None:
+                kelompok[k].append(item)
+        return {k: daftar for k, daftar in kelompok.items() if daftar}
+
+
+def _timeout():
+    # Batas umur data di memori, untuk backend cache yang tidak dibagi antar
+    # proses (LocMem) sehingga versi dari proses lain tidak terlihat
+    return getattr(settings, 'AMI_KATALOG_TIMEOUT', 5 * 60)
+
+
+def _versi(bagian):
+    """Versi katalog (lihat versi_sesi di report_cache): nilai awal memakai waktu saat ini"""
+    key = VERSI_KEY.format(bagian=bagian)
+    versi = cache.get(key)
+    if versi is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        versi = cache.get(key)
+    return versi
+
+
+def _naikkan_versi(bagian):
+    key = VERSI_KEY.format(bagian=bagian)
+    cache.add(key, time.time_ns(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+class InstrumentCatalog:
+    """
+    Cache per proses untuk pohon instrumen (Kriteria→Elemen) per lembaga dan
+    daftar referensi (ProgramStudi, LembagaAkreditasi).
+
+    Data disimpan di memori proses sebagai struktur tidak dapat diubah
+    (namedtuple/tuple/MappingProxyType) sehingga aman dibagi antar thread
+    dan antar request. Keabsahannya dicek terhadap nomor versi di cache
+    Django: signal save/delete model terkait menaikkan versi, lalu setiap
+    proses memuat ulang datanya saat dibutuhkan berikutnya (paling lambat
+    setelah AMI_KATALOG_TIMEOUT detik).
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _ambil(self, bagian, kunci, muat):
+        versi = _versi(bagian)
+        sekarang = time.monotonic()
+        tersimpan = self._data.get(kunci)
+        if tersimpan is not None and tersimpan[0] == versi and tersimpan[1] > sekarang:
+            return tersimpan[2]
+        # Versi dibaca sebelum memuat: bila data berubah selama memuat, versi
+        # sudah naik dan data ini akan dimuat ulang pada akses berikutnya
+        nilai = muat()
+        with self._lock:
+            self._data[kunci] = (versi, sekarang + _timeout(), nilai)
+        return nilai
+
+    # ----------------------------
+    # Pohon instrumen
+    # ----------------------------
+    def pohon(self, lembaga_id):
+        """PohonInstrumen lembaga akreditasi (dua query saat dimuat ulang)"""
+        return self._ambil(BAGIAN_INSTRUMEN, ('pohon', lembaga_id), lambda: self._muat_pohon(lembaga_id))
+
+    def pohon_program_studi(self, program_studi_id):
+        """PohonInstrumen lembaga akreditasi milik program studi"""
+        prodi = self.program_studi_by_id().get(program_studi_id)
+        return self.pohon(prodi.lembaga_akreditasi_id if prodi else None)
+
+    def _muat_pohon(self, lembaga_id):
+        elemen_per_kriteria = {}
+        for e in (
+            Elemen.objects.filter(kriteria__lembaga_akreditasi_id=lembaga_id)
+            .order_by('kode')
+            .values_list('id', 'kriteria_id', 'kode', 'nama', 'skor_maksimal', 'status')
+        ):
+            elemen = ElemenKatalog(*e)
+            elemen_per_kriteria.setdefault(elemen.kriteria_id, []).append(elemen)
+        kriteria = [
+            KriteriaKatalog(*k, elemen=tuple(elemen_per_kriteria.get(k[0], ())))
+            for k in Kriteria.objects.filter(lembaga_akreditasi_id=lembaga_id)
+            .order_by('kode')
+            .values_list('id', 'lembaga_akreditasi_id', 'kode', 'nama', 'deskripsi', 'status')
+        ]
+        return PohonInstrumen(lembaga_id, kriteria)
+
+    # ----------------------------
+    # Referensi untuk dropdown
+    # ----------------------------
+    def lembaga_akreditasi(self):
+        """Seluruh lembaga akreditasi, urut nama"""
+        return self._ambil(BAGIAN_REFERENSI, ('lembaga',), lambda: tuple(
+            LembagaKatalog(*row)
+            for row in LembagaAkreditasi.objects.order_by('nama').values_list('id', 'kode', 'nama')
+        ))
+
+    def program_studi(self):
+        """Seluruh program studi, urut nama"""
+        return self._ambil(BAGIAN_REFERENSI, ('program_studi',), lambda: tuple(
+            ProgramStudiKatalog(*row)
+            for row in ProgramStudi.objects.order_by('nama').values_list(
+                'id', 'kode', 'nama', 'jenjang', 'fakultas', 'lembaga_akreditasi_id'
+            )
+        ))
+
+    def program_studi_by_id(self):
+        return self._ambil(BAGIAN_REFERENSI, ('program_studi_by_id',), lambda: MappingProxyType(
+            {prodi.id: prodi for prodi in self.program_studi()}
+        ))
+
+    # ----------------------------
+    # Invalidasi
+    # ----------------------------
+    def invalidasi(self, *bagian):
+        """
+        Tandai bagian katalog sebagai usang. Versi dinaikkan sekarang (untuk
+        proses ini, yang sudah melihat data dalam transaksinya) dan sekali lagi
+        setelah commit agar proses lain tidak menyimpan data sebelum commit.
+        """
+        bagian = bagian or (BAGIAN_INSTRUMEN, BAGIAN_REFERENSI)
+        for b in bagian:
+            _naikkan_versi(b)
+        transaction.on_commit(lambda: [_naikkan_versi(b) for b in bagian])
+
+    def kosongkan(self):
+        """Buang seluruh data katalog di memori proses ini"""
+        with self._lock:
+            self._data.clear()
+
+
+katalog = InstrumentCatalog()
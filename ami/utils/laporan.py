@@ -0,0 +1,220 @@
+# ami/utils/laporan.py
+import json
+
+from ami.models import KategoriKondisi, PenilaianDiri, SnapshotLaporan
+
+from .katalog import katalog
+
+KATEGORI_LABEL = dict(KategoriKondisi.choices)
+
+
+def _rata_rata(total, count):
+    return round(total / count, 2) if count else 0
+
+
+class SessionReport:
+    """
+    Mesin perhitungan laporan untuk satu sesi audit.
+
+    Seluruh PenilaianDiri beserta Audit-nya dimuat dalam satu query, data
+    kriteria/elemen diambil dari katalog instrumen, lalu semua statistik
+    dihitung dalam satu kali iterasi. Hasilnya (``data``) hanya berisi tipe dasar
+    sehingga bisa di-cache atau disimpan sebagai JSON.
+    """
+
+    def __init__(self, audit_session, data=None):
+        self.audit_session = audit_session
+        self._data = data
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = self.hitung()
+        return self._data
+
+    def _muat_penilaian(self, pohon):
+        """
+        PenilaianDiri sesi yang elemennya termasuk pohon instrumen lembaga,
+        urut kode kriteria lalu kode elemen. Data kriteria/elemen diambil dari
+        katalog sehingga tidak perlu join ke tabel instrumen.
+        """
+        urutan_kriteria = {k.id: i for i, k in enumerate(pohon.kriteria)}
+        penilaian_list = [
+            p for p in PenilaianDiri.objects.filter(audit_session=self.audit_session)
+            .select_related('audit', 'audit__auditor')
+            if p.elemen_id in pohon.elemen_by_id
+        ]
+        penilaian_list.sort(key=lambda p: (
+            urutan_kriteria[pohon.elemen_by_id[p.elemen_id].kriteria_id],
+            pohon.elemen_by_id[p.elemen_id].kode,
+        ))
+        return penilaian_list
+
+    def hitung(self):
+        """Hitung seluruh statistik laporan dalam satu kali iterasi"""
+        pohon = katalog.pohon(self.audit_session.program_studi.lembaga_akreditasi_id)
+
+        kriteria = {}
+        kategori_map = {}
+        temuan = []
+        total_elemen = elemen_terisi = dokumen_tersedia = 0
+        total_skor = 0.0
+        total_audit = audit_terisi = 0
+        total_skor_audit = 0.0
+
+        for penilaian in self._muat_penilaian(pohon):
+            elemen = pohon.elemen_by_id[penilaian.elemen_id]
+            k = kriteria.get(elemen.kriteria_id)
+            if k is None:
+                info = pohon.kriteria_by_id[elemen.kriteria_id]
+                k = kriteria[elemen.kriteria_id] = {
+                    'id': elemen.kriteria_id,
+                    'kode': info.kode,
+                    'nama': info.nama,
+                    'jumlah_elemen': 0,
+                    'count': 0,
+                    'total_skor': 0.0,
+                    'jumlah_audit': 0,
+                    'count_audit': 0,
+                    'total_skor_audit': 0.0,
+                }
+
+            total_elemen += 1
+            k['jumlah_elemen'] += 1
+            if penilaian.skor is not None:
+                elemen_terisi += 1
+                total_skor += penilaian.skor
+                k['count'] += 1
+                k['total_skor'] += penilaian.skor
+            if penilaian.bukti_dokumen:
+                dokumen_tersedia += 1
+
+            audit = getattr(penilaian, 'audit', None)
+            if audit is None:
+                continue
+            total_audit += 1
+            k['jumlah_audit'] += 1
+            if audit.skor is not None:
+                audit_terisi += 1
+                total_skor_audit += audit.skor
+                k['count_audit'] += 1
+                k['total_skor_audit'] += audit.skor
+            if audit.kategori_kondisi:
+                kategori_map[audit.kategori_kondisi] = kategori_map.get(audit.kategori_kondisi, 0) + 1
+            temuan.append({
+                'id': audit.id,
+                'skor': audit.skor,
+                'kategori_kondisi': audit.kategori_kondisi,
+                'kategori_kondisi_display': str(KATEGORI_LABEL.get(audit.kategori_kondisi, '')),
+                'deskripsi_kondisi': audit.deskripsi_kondisi,
+                'auditor': {'nama_lengkap': audit.auditor.nama_lengkap} if audit.auditor else None,
+                'penilaian_diri': {
+                    'skor': penilaian.skor,
+                    'elemen': {
+                        'kode': elemen.kode,
+                        'nama': elemen.nama,
+                        'kriteria': {'kode': k['kode'], 'nama': k['nama']},
+                    },
+                },
+            })
+
+        kriteria_list = []
+        for k in kriteria.values():
+            k['rata_rata'] = _rata_rata(k.pop('total_skor'), k['count'])
+            k['rata_rata_auditor'] = _rata_rata(k.pop('total_skor_audit'), k['count_audit'])
+            kriteria_list.append(k)
+
+        # Kekuatan/kelemahan ditentukan dari rata-rata penilaian diri per kriteria
+        dinilai = [k for k in kriteria_list if k['count']]
+        if dinilai:
+            terbaik = max(dinilai, key=lambda k: k['rata_rata'])['nama']
+            terlemah = min(dinilai, key=lambda k: k['rata_rata'])['nama']
+        else:
+            terbaik = terlemah = '-'
+
+        total_dibutuhkan = pohon.jumlah_elemen
+        belum_disiapkan = max(total_dibutuhkan - dokumen_tersedia, 0)
+
+        return {
+            'total_elemen': total_elemen,
+            'elemen_terisi': elemen_terisi,
+            'persentase_terisi': (elemen_terisi / total_elemen * 100) if total_elemen else 0,
+            'skor_akhir': _rata_rata(total_skor, elemen_terisi),
+            'kriteria': kriteria_list,
+            'kriteria_terbaik': terbaik,
+            'kriteria_terlemah': terlemah,
+            'audit': {
+                'total': total_audit,
+                'terisi': audit_terisi,
+                'avg_skor': _rata_rata(total_skor_audit, audit_terisi),
+            },
+            'kategori_map': kategori_map,
+            'dokumen': {
+                'total_dibutuhkan': total_dibutuhkan,
+                'belum_disiapkan': belum_disiapkan,
+                'persen_belum': round(belum_disiapkan / total_dibutuhkan * 100, 2) if total_dibutuhkan else 0,
+            },
+            'temuan': temuan,
+        }
+
+    # ----------------------------
+    # Konteks template per laporan
+    # ----------------------------
+    def konteks_laporan_audit(self):
+        data = self.data
+        kriteria_scores = [
+            {'kriteria': {'kode': k['kode'], 'nama': k['nama']}, 'rata_rata': k['rata_rata'], 'count': k['count']}
+            for k in data['kriteria'] if k['count']
+        ]
+        return {
+            'total_indikator': data['total_elemen'],
+            'indikator_terisi': data['elemen_terisi'],
+            'persentase_terisi': data['persentase_terisi'],
+            'kriteria_scores': kriteria_scores,
+            'skor_akhir': data['skor_akhir'],
+            'radar_labels': json.dumps([item['kriteria']['nama'] for item in kriteria_scores]),
+            'radar_pd': json.dumps([item['rata_rata'] for item in kriteria_scores]),
+        }
+
+    def konteks_laporan_auditor(self):
+        data = self.data
+        return {
+            'audits': data['temuan'],
+            'stats': {
+                'total': data['audit']['total'],
+                'avg_skor': data['audit']['avg_skor'],
+                'kategori': [
+                    {'kategori_kondisi': kategori, 'jumlah': jumlah}
+                    for kategori, jumlah in data['kategori_map'].items()
+                ],
+            },
+            'kriteria_scores_auditor': [
+                {'nama': k['nama'], 'jumlah': k['jumlah_audit'], 'rata_rata': k['rata_rata_auditor']}
+                for k in data['kriteria'] if k['jumlah_audit']
+            ],
+        }
+
+    def konteks_laporan_internal(self):
+        data = self.data
+        dinilai = [k for k in data['kriteria'] if k['count']]
+        return {
+            'audits': data['temuan'],
+            'chart_labels_json': json.dumps([k['nama'] or '-' for k in dinilai]),
+            'chart_scores_json': json.dumps([k['rata_rata'] for k in dinilai]),
+            'best_label': data['kriteria_terbaik'],
+            'worst_label': data['kriteria_terlemah'],
+            'total_dokumen_dibutuhkan': data['dokumen']['total_dibutuhkan'],
+            'belum_disipakan': data['dokumen']['belum_disiapkan'],
+            'persen_belum': data['dokumen']['persen_belum'],
+            'kategori_map': data['kategori_map'],
+        }
+
+
+def buat_snapshot(audit_session):
+    """Bekukan hasil laporan sesi audit ke SnapshotLaporan (menimpa yang lama)"""
+    data = SessionReport(audit_session).hitung()
+    snapshot, _ = SnapshotLaporan.objects.update_or_create(
+        audit_session=audit_session,
+        defaults={'data': data, 'skor_akhir': data['skor_akhir']},
+    )
+    return snapshot
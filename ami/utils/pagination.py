@@ -0,0 +1,134 @@
+# ami/utils/pagination.py
+import base64
+import hashlib
+import json
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import F, Q
+
+
+class KeysetPage:
+    """Satu halaman hasil KeysetPaginator (dipakai seperti Page milik Django di template)"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_token(self):
+        if self._has_next and self.object_list:
+            return self.paginator.buat_token(self.object_list[-1], 'n')
+        return ''
+
+    @property
+    def previous_token(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.buat_token(self.object_list[0], 'p')
+        return ''
+
+
+class KeysetPaginator:
+    """
+    Paginasi berbasis cursor dengan urutan (field DESC NULLS LAST, id DESC).
+
+    Setiap halaman hanya membaca per_page + 1 baris melalui kondisi WHERE pada
+    kunci urutan, tanpa COUNT(*) dan tanpa OFFSET, sehingga halaman jauh sama
+    murahnya dengan halaman pertama. Token next/prev bersifat opaque (base64).
+    Total baris bersifat opsional dan hanya perkiraan (di-cache sebentar).
+    """
+
+    TOTAL_TIMEOUT = 5 * 60
+
+    def __init__(self, queryset, per_page, field='tanggal_mulai_penilaian_mandiri', hitung_total=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self.hitung_total = hitung_total
+
+    # ----------------------------
+    # Token
+    # ----------------------------
+    def buat_token(self, obj, arah):
+        nilai = getattr(obj, self.field)
+        data = {'v': nilai.isoformat() if nilai is not None else None, 'id': obj.pk, 'd': arah}
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+    def baca_token(self, token):
+        """Kembalikan (nilai, id, arah) atau None bila token tidak valid"""
+        if not token:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            nilai = date.fromisoformat(data['v']) if data['v'] is not None else None
+            if data['d'] not in ('n', 'p'):
+                return None
+            return nilai, int(data['id']), data['d']
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    # ----------------------------
+    # Query
+    # ----------------------------
+    def _setelah(self, nilai, pk):
+        # Baris sesudah (nilai, pk) pada urutan DESC NULLS LAST
+        f = self.field
+        if nilai is None:
+            return Q(**{f'{f}__isnull': True, 'pk__lt': pk})
+        return (
+            Q(**{f'{f}__lt': nilai})
+            | Q(**{f: nilai, 'pk__lt': pk})
+            | Q(**{f'{f}__isnull': True})
+        )
+
+    def _sebelum(self, nilai, pk):
+        # Baris sebelum (nilai, pk) pada urutan DESC NULLS LAST
+        f = self.field
+        if nilai is None:
+            return Q(**{f'{f}__isnull': True, 'pk__gt': pk}) | Q(**{f'{f}__isnull': False})
+        return Q(**{f'{f}__gt': nilai}) | Q(**{f: nilai, 'pk__gt': pk})
+
+    def get_page(self, token=None):
+        cursor = self.baca_token(token)
+        maju = (F(self.field).desc(nulls_last=True), F('pk').desc())
+        mundur = (F(self.field).asc(nulls_first=True), F('pk').asc())
+
+        if cursor is None:
+            rows = list(self.queryset.order_by(*maju)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        nilai, pk, arah = cursor
+        if arah == 'n':
+            rows = list(self.queryset.filter(self._setelah(nilai, pk)).order_by(*maju)[:self.per_page + 1])
+            return KeysetPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+
+        rows = list(self.queryset.filter(self._sebelum(nilai, pk)).order_by(*mundur)[:self.per_page + 1])
+        halaman = rows[:self.per_page]
+        halaman.reverse()
+        return KeysetPage(halaman, self, True, len(rows) > self.per_page)
+
+    @property
+    def total_perkiraan(self):
+        """Perkiraan jumlah baris (COUNT di-cache beberapa menit), None bila dinonaktifkan"""
+        if not self.hitung_total:
+            return None
+        sql, params = self.queryset.order_by().values('pk').query.sql_with_params()
+        key = 'ami:paginasi:total:' + hashlib.blake2b(f'{sql}{params}'.encode(), digest_size=16).hexdigest()
+        return cache.get_or_set(key, self.queryset.order_by().count, self.TOTAL_TIMEOUT)
@@ -0,0 +1,181 @@
+# ami/utils/penilaian.py
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from ami.models import Elemen, PenilaianDiri
+
+from .progres import hitung_ulang_progres, kontribusi_progres, selisih_progres, ubah_progres
+from .report_cache import naikkan_versi
+
+
+def validasi_skor(skor, skor_maksimal):
+    """Aturan skor penilaian: tidak negatif dan tidak melebihi skor maksimal elemen"""
+    if skor is None:
+        return
+    if skor < 0:
+        raise ValidationError({'skor': 'Skor tidak boleh kurang dari 0.'})
+    if skor_maksimal is not None and skor > skor_maksimal:
+        raise ValidationError({
+            'skor': f'Skor tidak boleh melebihi {skor_maksimal} (skor maksimal untuk indikator ini).'
+        })
+
+
+def peta_skor_maksimal(elemen_ids):
+    """Muat skor_maksimal beberapa elemen sekaligus: {elemen_id: skor_maksimal}"""
+    return dict(Elemen.objects.filter(pk__in=set(elemen_ids)).values_list('pk', 'skor_maksimal'))
+
+
+def validasi_penilaian(penilaian_list, skor_maksimal=None):
+    """
+    Validasi sekumpulan PenilaianDiri di memori.
+
+    skor_maksimal adalah peta {elemen_id: skor_maksimal}; elemen yang belum
+    ada di peta dan belum dimuat pada objeknya diambil dengan satu query.
+    Mengembalikan dict {indeks dalam penilaian_list: ValidationError}.
+    """
+    skor_maksimal = dict(skor_maksimal or {})
+    kurang = set()
+    for penilaian in penilaian_list:
+        if penilaian.elemen_id in skor_maksimal:
+            continue
+        if PenilaianDiri.elemen.is_cached(penilaian) and penilaian.elemen is not None:
+            skor_maksimal[penilaian.elemen_id] = penilaian.elemen.skor_maksimal
+        else:
+            kurang.add(penilaian.elemen_id)
+    if kurang:
+        skor_maksimal.update(peta_skor_maksimal(kurang))
+
+    kesalahan = {}
+    for indeks, penilaian in enumerate(penilaian_list):
+        try:
+            validasi_skor(penilaian.skor, skor_maksimal.get(penilaian.elemen_id))
+        except ValidationError as e:
+            kesalahan[indeks] = e
+    return kesalahan
+
+
+def simpan_penilaian(penilaian_list, fields, validasi=True, skor_maksimal=None):
+    """
+    Jalur simpan massal PenilaianDiri untuk pembaruan internal/terpercaya.
+
+    Dengan validasi=True seluruh baris dicek dulu dengan validasi_penilaian
+    (ValidationError bila ada yang gagal); validasi=False dipakai bila data
+    sudah divalidasi sebelumnya (misalnya oleh formset). Status diubah
+    menjadi TERISI untuk baris yang memiliki skor, lalu semuanya disimpan
+    dengan satu bulk_update yang juga menaikkan versi setiap baris (versi
+    baru dimuat kembali ke objeknya). Karena bulk_update tidak memicu signal,
+    penghitung progres (dari selisih nilai awal, atau dihitung ulang bila
+    nilai awal tidak diketahui) dan versi cache laporan sesi diperbarui di sini.
+    """
+    penilaian_list = list(penilaian_list)
+    _simpan_massal(penilaian_list, fields, validasi, skor_maksimal)
+    return len(penilaian_list)
+
+
+def simpan_penilaian_bersyarat(penilaian_list, versi, fields, validasi=True, skor_maksimal=None):
+    """
+    Seperti simpan_penilaian, tetapi dengan optimistic concurrency per baris.
+
+    versi adalah peta {pk: versi yang dibaca klien}. Baris yang versinya di
+    database sudah berbeda (diubah autosave/form lain sejak halaman dibuka)
+    tidak disimpan; baris lainnya tetap disimpan dalam satu bulk_update.
+    Mengembalikan daftar baris yang ditolak karena konflik versi.
+    """
+    return _simpan_massal(list(penilaian_list), fields, validasi, skor_maksimal, versi)
+
+
+def _simpan_massal(penilaian_list, fields, validasi, skor_maksimal, versi_klien=None):
+    if not penilaian_list:
+        return []
+    if validasi:
+        kesalahan = validasi_penilaian(penilaian_list, skor_maksimal)
+        if kesalahan:
+            raise ValidationError({
+                str(penilaian_list[indeks].pk): error.messages for indeks, error in kesalahan.items()
+            })
+
+    fields = list(dict.fromkeys([*fields, 'status', 'versi']))
+    konflik = []
+    with transaction.atomic():
+        if versi_klien is not None:
+            # Versi dibaca dengan kunci baris agar tidak ada penulis lain di
+            # antara pemeriksaan dan bulk_update di bawah
+            terkini = dict(
+                PenilaianDiri.objects.select_for_update()
+                .filter(pk__in=[p.pk for p in penilaian_list])
+                .values_list('pk', 'versi')
+            )
+            konflik = [p for p in penilaian_list if terkini.get(p.pk) != versi_klien.get(p.pk)]
+            penilaian_list = [p for p in penilaian_list if p not in konflik]
+            if not penilaian_list:
+                return konflik
+
+        for penilaian in penilaian_list:
+            if penilaian.skor is not None:
+                penilaian.status = 'TERISI'
+            # Versi dinaikkan di database (bukan dari nilai di memori) agar autosave
+            # atau form yang dibuka sebelum penyimpanan ini mendapat konflik versi
+            penilaian.versi = F('versi') + 1
+
+        selisih_sesi, hitung_ulang = {}, set()
+        for penilaian in penilaian_list:
+            nilai_awal = getattr(penilaian, '_nilai_awal', None)
+            if nilai_awal is None or 'skor' not in nilai_awal:
+                hitung_ulang.add(penilaian.audit_session_id)
+                continue
+            selisih = selisih_progres(kontribusi_progres(penilaian, nilai_awal), kontribusi_progres(penilaian))
+            total = selisih_sesi.setdefault(penilaian.audit_session_id, {})
+            for kolom, delta in selisih.items():
+                total[kolom] = total.get(kolom, 0) + delta
+
+        PenilaianDiri.objects.bulk_update(penilaian_list, fields)
+        for session_id, selisih in selisih_sesi.items():
+            if session_id not in hitung_ulang:
+                ubah_progres(session_id, selisih)
+        if hitung_ulang:
+            hitung_ulang_progres(sorted(hitung_ulang))
+        versi = dict(PenilaianDiri.objects.filter(pk__in=[p.pk for p in penilaian_list]).values_list('pk', 'versi'))
+    for session_id in sorted({p.audit_session_id for p in penilaian_list}):
+        naikkan_versi(session_id)
+    for penilaian in penilaian_list:
+        penilaian.versi = versi[penilaian.pk]
+        penilaian.tandai_nilai_awal()
+    return konflik
+
+
+def perbarui_bersyarat(obj, perubahan, versi, session_id):
+    """
+    Perbarui sebagian field PenilaianDiri/Audit dengan optimistic concurrency.
+
+    UPDATE hanya dijalankan bila kolom versi di database masih sama dengan
+    `versi` milik klien, sekaligus menaikkan versi. Mengembalikan True bila
+    berhasil (obj ikut diperbarui di memori), False bila terjadi konflik,
+    yaitu baris sudah diubah pihak lain sejak versi tersebut dibaca.
+
+    obj harus dimuat dari database dengan nilai awal yang masih lengkap
+    (_nilai_awal) agar selisih penghitung progres sesi bisa diterapkan tanpa
+    menghitung ulang.
+    """
+    if obj.versi != versi:
+        return False
+    model = type(obj)
+    nilai_awal = getattr(obj, '_nilai_awal', None) or {}
+    with transaction.atomic():
+        diperbarui = model.objects.filter(pk=obj.pk, versi=versi).update(
+            **perubahan, versi=F('versi') + 1
+        )
+        if not diperbarui:
+            return False
+        for field, nilai in perubahan.items():
+            setattr(obj, field, nilai)
+        obj.versi = versi + 1
+        # Baris di database belum berubah sejak obj dimuat (versi sama), jadi
+        # nilai awal obj adalah nilai lama yang sebenarnya
+        if 'skor' in nilai_awal:
+            ubah_progres(session_id, selisih_progres(kontribusi_progres(obj, nilai_awal), kontribusi_progres(obj)))
+        else:
+            hitung_ulang_progres([session_id])
+    naikkan_versi(session_id)
+    obj.tandai_nilai_awal()
+    return True
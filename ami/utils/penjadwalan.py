@@ -0,0 +1,144 @@
+# ami/utils/penjadwalan.py
+import logging
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ami.models import TRANSISI_STATUS, AuditSession
+
+logger = logging.getLogger(__name__)
+
+URUTAN_STATUS = [TRANSISI_STATUS[0][0]] + [tujuan for _, tujuan in TRANSISI_STATUS]
+
+
+def jendela_jadwal():
+    """Rentang ke depan (timedelta) tempat tugas transisi boleh dikirim ke broker"""
+    return timedelta(seconds=getattr(settings, 'AMI_TRANSISI_JENDELA', 26 * 60 * 60))
+
+
+def _awal_hari(tanggal):
+    # Kondisi transisi membandingkan dengan timezone.now().date() (UTC karena USE_TZ)
+    return datetime.combine(tanggal, time.min, tzinfo=dt_timezone.utc)
+
+
+def batas_fase(audit_session):
+    """
+    Waktu paling awal setiap status berikutnya berlaku menurut tanggal sesi,
+    mengikuti kondisi pada models.syarat_transisi.
+    """
+    s = audit_session
+    if not s.tanggal_mulai_penilaian_mandiri:
+        return {}
+
+    batas = {'PENILAIAN_MANDIRI': s.tanggal_mulai_penilaian_mandiri}
+    if s.tanggal_selesai_penilaian_mandiri and s.tanggal_mulai_penilaian_auditor:
+        batas['PENILAIAN_AUDITOR'] = max(
+            s.tanggal_selesai_penilaian_mandiri + timedelta(days=1),
+            s.tanggal_mulai_penilaian_auditor,
+        )
+    if s.tanggal_selesai_penilaian_auditor:
+        batas['SELESAI'] = s.tanggal_selesai_penilaian_auditor + timedelta(days=1)
+    return {tujuan: _awal_hari(tanggal) for tujuan, tanggal in batas.items()}
+
+
+def _revoke(task_id):
+    from ami.tasks import transisi_status_sesi
+
+    try:
+        transisi_status_sesi.app.control.revoke(task_id)
+    except Exception:
+        logger.warning('Gagal membatalkan tugas transisi %s', task_id, exc_info=True)
+
+
+def jadwalkan_transisi(session_id):
+    """
+    Jadwalkan tugas Celery (ETA) untuk setiap batas fase sesi yang akan datang
+    dalam jendela_jadwal(). Batas yang lebih jauh tidak dikirim ke broker
+    (tugas ETA panjang di Redis dikirim ulang setiap visibility_timeout dan
+    ditahan di memori worker); jadwalkan_transisi_mendatang() dari sapuan harian
+    mengirimnya setelah masuk jendela.
+
+    Batas fase yang sudah lewat (mis. sesi dibuat atau tanggalnya diubah
+    mundur) langsung diterapkan tanpa menunggu sapuan harian. Jadwal yang
+    tersimpan di AuditSession.jadwal_transisi dibandingkan dengan tanggal
+    saat ini: tugas yang waktunya berubah atau tidak relevan lagi
+    dibatalkan, tugas baru dikirim. Bila broker tidak tersedia, jadwal
+    dilewati dan transisi tetap ditangani oleh sapuan harian.
+    """
+    from ami.tasks import transisi_status_sesi
+
+    audit_session = AuditSession.objects.filter(pk=session_id).first()
+    if audit_session is None:
+        return {}
+
+    sekarang = timezone.now()
+    posisi = URUTAN_STATUS.index(audit_session.status)
+    if any(
+        eta <= sekarang and URUTAN_STATUS.index(tujuan) > posisi
+        for tujuan, eta in batas_fase(audit_session).items()
+    ):
+        AuditSession.objects.filter(pk=session_id).terapkan_transisi_status()
+        audit_session.refresh_from_db(fields=['status'])
+        posisi = URUTAN_STATUS.index(audit_session.status)
+    target = {
+        tujuan: eta
+        for tujuan, eta in batas_fase(audit_session).items()
+        if sekarang < eta <= sekarang + jendela_jadwal() and URUTAN_STATUS.index(tujuan) > posisi
+    }
+
+    lama = audit_session.jadwal_transisi or {}
+    jadwal = {}
+    for tujuan, item in lama.items():
+        if target.get(tujuan) and target[tujuan].isoformat() == item['eta']:
+            jadwal[tujuan] = item
+        elif datetime.fromisoformat(item['eta']) > sekarang:
+            _revoke(item['task_id'])
+
+    baru = [(tujuan, eta) for tujuan, eta in target.items() if tujuan not in jadwal]
+    if baru:
+        try:
+            # Gagal cepat (tanpa retry) agar penyimpanan sesi tidak tertahan ketika broker mati
+            with transisi_status_sesi.app.connection_for_write() as conn:
+                conn.ensure_connection(max_retries=0)
+                for tujuan, eta in baru:
+                    hasil = transisi_status_sesi.apply_async(
+                        args=[session_id], eta=eta, connection=conn, retry=False
+                    )
+                    jadwal[tujuan] = {'task_id': hasil.id, 'eta': eta.isoformat()}
+        except Exception:
+            logger.warning('Broker tidak tersedia, transisi sesi %s ditunda ke sapuan harian', session_id)
+
+    if jadwal != lama:
+        AuditSession.objects.filter(pk=session_id).update(jadwal_transisi=jadwal)
+    return jadwal
+
+
+def jadwalkan_transisi_mendatang():
+    """
+    Jadwalkan tugas transisi untuk sesi yang memiliki batas fase dalam
+    jendela_jadwal() berikutnya (dipanggil sapuan harian). Mengembalikan
+    jumlah sesi yang diperiksa.
+    """
+    awal = timezone.now().date()
+    akhir = (timezone.now() + jendela_jadwal()).date()
+    # Batas SELESAI dan PENILAIAN_AUDITOR jatuh sehari setelah tanggal selesai fase
+    kondisi = (
+        Q(tanggal_mulai_penilaian_mandiri__range=(awal, akhir))
+        | Q(tanggal_mulai_penilaian_auditor__range=(awal, akhir))
+        | Q(tanggal_selesai_penilaian_mandiri__range=(awal - timedelta(days=1), akhir - timedelta(days=1)))
+        | Q(tanggal_selesai_penilaian_auditor__range=(awal - timedelta(days=1), akhir - timedelta(days=1)))
+    )
+    session_ids = list(
+        AuditSession.objects.filter(kondisi).exclude(status='SELESAI').values_list('pk', flat=True)
+    )
+    for session_id in session_ids:
+        jadwalkan_transisi(session_id)
+    return len(session_ids)
+
+
+def batalkan_transisi(jadwal):
+    """Batalkan seluruh tugas transisi pada jadwal (mis. saat sesi dihapus)"""
+    for item in (jadwal or {}).values():
+        _revoke(item['task_id'])
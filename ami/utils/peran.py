@@ -0,0 +1,49 @@
+# ami/utils/peran.py
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+
+Peran = namedtuple('Peran', ['role', 'program_studi', 'auditor'])
+
+PERAN_ANONIM = Peran('unknown', None, None)
+
+# Relasi balik one-to-one User yang menentukan peran
+_RELASI_PERAN = ('koordinatorprogramstudi', 'auditor')
+
+
+def peran_pengguna(user):
+    """
+    Peran, program studi (koordinator) dan auditor milik user.
+
+    Dimuat dengan satu query lalu disimpan pada objek user, termasuk cache
+    relasi user.koordinatorprogramstudi dan user.auditor, sehingga akses
+    berikutnya di view maupun template tidak menambah query.
+    """
+    peran = getattr(user, '_ami_peran', None)
+    if peran is not None:
+        return peran
+    if not user.is_authenticated:
+        return PERAN_ANONIM
+
+    dimuat = User.objects.select_related(
+        'koordinatorprogramstudi__program_studi', 'auditor'
+    ).get(pk=user.pk)
+    terkait = {}
+    for nama in _RELASI_PERAN:
+        terkait[nama] = getattr(dimuat, nama, None)
+        User._meta.get_field(nama).set_cached_value(user, terkait[nama])
+
+    koordinator = terkait['koordinatorprogramstudi']
+    auditor = terkait['auditor']
+    if user.is_superuser:
+        role = 'admin'
+    elif koordinator is not None:
+        role = 'koordinator'
+    elif auditor is not None:
+        role = 'auditor'
+    else:
+        role = 'unknown'
+
+    peran = Peran(role, koordinator.program_studi if koordinator else None, auditor)
+    user._ami_peran = peran
+    return peran
@@ -0,0 +1,167 @@
+# ami/utils/preview.py
+import io
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+
+from ami.models import BlobBerkas
+
+from .storage import hash_dari_nama, path_preview, storage_berkas
+
+logger = logging.getLogger(__name__)
+
+# Naikkan bila cara render berubah agar preview lama di disk dibuat ulang
+VERSI_PREVIEW = 1
+
+
+def _lebar():
+    return getattr(settings, 'AMI_PREVIEW_LEBAR', 320)
+
+
+def _render_pdf(path):
+    """PNG halaman pertama dan jumlah halaman PDF; None bila PyMuPDF tidak terpasang"""
+    try:
+        import pymupdf
+    except ImportError:
+        try:
+            # Nama modul PyMuPDF sebelum versi 1.24
+            import fitz as pymupdf
+        except ImportError:
+            return None
+    with pymupdf.open(path) as dokumen:
+        if dokumen.page_count == 0:
+            return None
+        halaman = dokumen[0]
+        skala = _lebar() / max(halaman.rect.width, 1)
+        pixmap = halaman.get_pixmap(matrix=pymupdf.Matrix(skala, skala), alpha=False)
+        return pixmap.tobytes('png'), dokumen.page_count
+
+
+def _render_gambar(path):
+    """PNG kecil dan jumlah frame gambar; None bila Pillow tidak terpasang atau format tidak dikenal"""
+    try:
+        from PIL import Image, UnidentifiedImageError
+    except ImportError:
+        return None
+    try:
+        with Image.open(path) as gambar:
+            jumlah = getattr(gambar, 'n_frames', 1)
+            ukuran = (_lebar(), _lebar() * 2)
+            # JPEG besar dapat didekode langsung pada resolusi kecil
+            gambar.draft('RGB', ukuran)
+            gambar = gambar.convert('RGB')
+            gambar.thumbnail(ukuran)
+            hasil = io.BytesIO()
+            gambar.save(hasil, 'PNG', optimize=True)
+            return hasil.getvalue(), jumlah
+    except UnidentifiedImageError:
+        return None
+
+
+def render_preview(path):
+    """
+    (png_bytes, jumlah_halaman) untuk berkas PDF (PyMuPDF) atau gambar
+    (Pillow), atau None bila jenis berkasnya tidak didukung. Jenis dikenali
+    dari isi berkas, bukan dari content type kiriman browser.
+    """
+    with open(path, 'rb') as berkas:
+        kepala = berkas.read(5)
+    if kepala == b'%PDF-':
+        return _render_pdf(path)
+    return _render_gambar(path)
+
+
+def _baca_info(path):
+    try:
+        with open(path, encoding='utf-8') as berkas:
+            info = json.load(berkas)
+    except (OSError, ValueError):
+        return None
+    return info if info.get('versi') == VERSI_PREVIEW else None
+
+
+def _tulis_atomik(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, sementara = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as berkas:
+            berkas.write(data)
+        os.replace(sementara, path)
+    except BaseException:
+        os.remove(sementara)
+        raise
+
+
+def buat_preview(hash_hex):
+    """
+    Buat preview halaman pertama dan jumlah halaman untuk blob, lalu catat
+    di BlobBerkas. Preview disimpan di storage berkas, di preview/<aa>/<bb>/
+    <hash>.png beserta <hash>.json: blob yang sama (unggahan duplikat, tugas
+    yang dijalankan ulang) tidak dirender lagi selama berkas itu ada.
+    Mengembalikan status_preview.
+    """
+    blob = BlobBerkas.objects.filter(hash=hash_hex).first()
+    if blob is None:
+        return None
+    if blob.status_preview != 'BELUM':
+        return blob.status_preview
+
+    storage = storage_berkas()
+    path_png = storage.path(path_preview(hash_hex))
+    path_info = storage.path(path_preview(hash_hex, '.json'))
+    info = _baca_info(path_info) if os.path.exists(path_png) else None
+    hasil = None
+    if info is None:
+        try:
+            hasil = render_preview(storage.path(blob.nama))
+        except Exception:
+            logger.exception('Gagal membuat preview blob %s', hash_hex)
+            hasil = False
+        if hasil:
+            png, jumlah_halaman = hasil
+            _tulis_atomik(path_png, png)
+            info = {'versi': VERSI_PREVIEW, 'jumlah_halaman': jumlah_halaman}
+            _tulis_atomik(path_info, json.dumps(info).encode('utf-8'))
+
+    if info is not None:
+        status, jumlah_halaman = 'SIAP', info['jumlah_halaman']
+    else:
+        # Tidak didukung tidak disimpan di disk: preview dapat dicoba lagi
+        # (buat_preview_berkas --ulang) setelah Pillow/PyMuPDF dipasang
+        status, jumlah_halaman = ('GAGAL' if hasil is False else 'TIDAK_DIDUKUNG'), None
+    BlobBerkas.objects.filter(pk=blob.pk).update(status_preview=status, jumlah_halaman=jumlah_halaman)
+    return status
+
+
+def jadwalkan_preview(hash_hex):
+    """Kirim tugas pembuatan preview ke Celery; gagal cepat bila broker tidak tersedia"""
+    from ami.tasks import buat_preview_dokumen
+
+    try:
+        with buat_preview_dokumen.app.connection_for_write() as conn:
+            conn.ensure_connection(max_retries=0)
+            buat_preview_dokumen.apply_async(args=[hash_hex], connection=conn, retry=False)
+    except Exception:
+        logger.warning('Broker tidak tersedia, preview blob %s ditunda ke buat_preview_berkas', hash_hex)
+
+
+def lampirkan_preview(dokumen_list):
+    """
+    Isi atribut preview_siap dan jumlah_halaman pada DokumenPendukung dari
+    BlobBerkas-nya (satu query untuk seluruh daftar).
+    """
+    dokumen_list = list(dokumen_list)
+    hashes = {d.pk: hash_dari_nama(d.file.name) for d in dokumen_list}
+    blob = {
+        row['hash']: row for row in BlobBerkas.objects.filter(
+            hash__in=set(hashes.values()) - {None}
+        ).values('hash', 'status_preview', 'jumlah_halaman')
+    }
+    for dokumen in dokumen_list:
+        row = blob.get(hashes[dokumen.pk], {})
+        dokumen.preview_siap = row.get('status_preview') == 'SIAP'
+        dokumen.jumlah_halaman = row.get('jumlah_halaman')
+    return dokumen_list
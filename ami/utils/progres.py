@@ -0,0 +1,88 @@
+# ami/utils/progres.py
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from ami.models import Audit, AuditSession, DokumenPendukung, KategoriKondisi, PenilaianDiri
+
+KOLOM_KATEGORI = {
+    KategoriKondisi.SESUAI: 'jumlah_sesuai',
+    KategoriKondisi.KT_MINOR: 'jumlah_kt_minor',
+    KategoriKondisi.KT_MAYOR: 'jumlah_kt_mayor',
+}
+
+KOLOM_PROGRES = (
+    'jumlah_elemen', 'jumlah_terisi', 'jumlah_teraudit', 'jumlah_dokumen',
+    *KOLOM_KATEGORI.values(),
+)
+
+
+def kontribusi_progres(instance, nilai=None):
+    """
+    Sumbangan satu baris PenilaianDiri/Audit/DokumenPendukung ke penghitung
+    progres sesinya. `nilai` dapat berisi nilai field lama (_nilai_awal).
+    """
+    nilai = instance.__dict__ if nilai is None else nilai
+    if isinstance(instance, PenilaianDiri):
+        return {'jumlah_elemen': 1, 'jumlah_terisi': int(nilai.get('skor') is not None)}
+    if isinstance(instance, Audit):
+        hasil = {'jumlah_teraudit': int(nilai.get('skor') is not None)}
+        kolom = KOLOM_KATEGORI.get(nilai.get('kategori_kondisi'))
+        if kolom:
+            hasil[kolom] = 1
+        return hasil
+    if isinstance(instance, DokumenPendukung):
+        return {'jumlah_dokumen': 1}
+    return {}
+
+
+def selisih_progres(lama, baru):
+    selisih = {}
+    for kolom in set(lama) | set(baru):
+        delta = baru.get(kolom, 0) - lama.get(kolom, 0)
+        if delta:
+            selisih[kolom] = delta
+    return selisih
+
+
+def ubah_progres(session_id, selisih):
+    """Terapkan selisih penghitung secara atomik dengan F()"""
+    if selisih:
+        AuditSession.objects.filter(pk=session_id).update(
+            **{kolom: F(kolom) + delta for kolom, delta in selisih.items()}
+        )
+
+
+def _jumlah(qs, kolom_sesi):
+    return Coalesce(
+        Subquery(
+            qs.filter(**{kolom_sesi: OuterRef('pk')})
+            .order_by()
+            .values(kolom_sesi)
+            .annotate(n=Count('pk'))
+            .values('n')
+        ),
+        0,
+    )
+
+
+def hitung_ulang_progres(session_ids=None):
+    """
+    Hitung ulang seluruh penghitung progres dari data sebenarnya dengan satu
+    UPDATE. Dipakai setelah operasi massal (bulk_create/update) dan untuk
+    memperbaiki selisih. Mengembalikan jumlah sesi yang diperbarui.
+    """
+    sessions = AuditSession.objects.all()
+    if session_ids is not None:
+        sessions = sessions.filter(pk__in=session_ids)
+
+    sesi_audit = 'penilaian_diri__audit_session'
+    return sessions.update(
+        jumlah_elemen=_jumlah(PenilaianDiri.objects.all(), 'audit_session'),
+        jumlah_terisi=_jumlah(PenilaianDiri.objects.filter(skor__isnull=False), 'audit_session'),
+        jumlah_teraudit=_jumlah(Audit.objects.filter(skor__isnull=False), sesi_audit),
+        jumlah_dokumen=_jumlah(DokumenPendukung.objects.all(), sesi_audit),
+        **{
+            kolom: _jumlah(Audit.objects.filter(kategori_kondisi=kategori), sesi_audit)
+            for kategori, kolom in KOLOM_KATEGORI.items()
+        },
+    )
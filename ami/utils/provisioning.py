@@ -0,0 +1,75 @@
+# ami/utils/provisioning.py
+from django.db import transaction
+
+from ami.models import Audit, AuditSession, Elemen, PenilaianDiri
+
+from .progres import hitung_ulang_progres
+from .report_cache import naikkan_versi
+
+
+def provision_audit_session(audit_session):
+    """
+    Menyiapkan seluruh baris PenilaianDiri dan Audit untuk satu sesi audit.
+
+    Semua elemen milik lembaga akreditasi prodi dibuatkan PenilaianDiri dan
+    Audit dalam satu transaksi memakai bulk_create(ignore_conflicts=True),
+    sehingga aman dipanggil ulang ketika instrumen lembaga berubah.
+    Mengembalikan jumlah PenilaianDiri yang baru dibuat.
+
+    Elemen dibaca langsung dari database, bukan dari katalog: katalog di
+    proses lain bisa tertinggal sampai invalidasinya terlihat, dan baris
+    penilaian yang terlewat tidak akan dibuat ulang.
+    """
+    with transaction.atomic():
+        elemen_ids = Elemen.objects.filter(
+            kriteria__lembaga_akreditasi__program_studi__id=audit_session.program_studi_id
+        ).values_list('id', flat=True)
+        sudah_ada = set(
+            PenilaianDiri.objects.filter(audit_session=audit_session)
+            .values_list('elemen_id', flat=True)
+        )
+        baru = [
+            PenilaianDiri(audit_session=audit_session, elemen_id=elemen_id, status='BELUM')
+            for elemen_id in elemen_ids
+            if elemen_id not in sudah_ada
+        ]
+        PenilaianDiri.objects.bulk_create(baru, ignore_conflicts=True)
+        _provision_audit(PenilaianDiri.objects.filter(audit_session=audit_session))
+        # bulk_create tidak memicu signal penghitung progres maupun versi laporan
+        if baru:
+            hitung_ulang_progres([audit_session.pk])
+    if baru:
+        naikkan_versi(audit_session.pk)
+    return len(baru)
+
+
+def provision_elemen(elemen):
+    """
+    Menambahkan PenilaianDiri dan Audit untuk elemen baru ke setiap sesi audit
+    yang belum selesai pada lembaga akreditasi elemen tersebut.
+    """
+    sessions = list(AuditSession.objects.filter(
+        program_studi__lembaga_akreditasi__kriteria__elemen=elemen
+    ).exclude(status='SELESAI').values_list('id', flat=True))
+
+    with transaction.atomic():
+        PenilaianDiri.objects.bulk_create(
+            [
+                PenilaianDiri(audit_session_id=session_id, elemen=elemen, status='BELUM')
+                for session_id in sessions
+            ],
+            ignore_conflicts=True,
+        )
+        _provision_audit(PenilaianDiri.objects.filter(elemen=elemen))
+        hitung_ulang_progres(sessions)
+    for session_id in sessions:
+        naikkan_versi(session_id)
+
+
+def _provision_audit(penilaian_qs):
+    """Membuat baris Audit untuk PenilaianDiri yang belum memilikinya"""
+    penilaian_ids = penilaian_qs.filter(audit__isnull=True).values_list('id', flat=True)
+    Audit.objects.bulk_create(
+        [Audit(penilaian_diri_id=penilaian_id) for penilaian_id in penilaian_ids],
+        ignore_conflicts=True,
+    )
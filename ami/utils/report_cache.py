@@ -0,0 +1,103 @@
+# ami/utils/report_cache.py
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ami.models import SnapshotLaporan
+
+from .laporan import SessionReport
+
+VERSI_KEY = 'ami:laporan:versi:{session_id}'
+KONTEKS_KEY = 'ami:laporan:{session_id}:v{versi}:{jenis}'
+STATISTIK_KEY = 'ami:laporan:statistik:{nama}'
+
+JENIS_LAPORAN = {
+    'audit': SessionReport.konteks_laporan_audit,
+    'auditor': SessionReport.konteks_laporan_auditor,
+    'internal': SessionReport.konteks_laporan_internal,
+}
+
+
+def _timeout():
+    return getattr(settings, 'AMI_LAPORAN_CACHE_TIMEOUT', 60 * 60)
+
+
+def _increment(key, delta=1):
+    """cache.incr yang membuat key terlebih dahulu bila belum ada"""
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Key terhapus di antara add() dan incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def versi_sesi(session_id):
+    """
+    Versi data laporan untuk sesi audit.
+
+    Nilai awal memakai waktu saat ini sehingga bila key versi terhapus dari
+    cache, konteks lama tidak akan terpakai kembali.
+    """
+    key = VERSI_KEY.format(session_id=session_id)
+    versi = cache.get(key)
+    if versi is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        versi = cache.get(key)
+    return versi
+
+
+def naikkan_versi(session_id):
+    """Tandai seluruh laporan sesi audit sebagai usang"""
+    key = VERSI_KEY.format(session_id=session_id)
+    if cache.get(key) is None:
+        cache.add(key, time.time_ns(), timeout=None)
+    else:
+        _increment(key)
+
+
+def konteks_laporan(audit_session, jenis):
+    """
+    Ambil konteks laporan (statistik dan data chart) dari cache.
+
+    Sesi yang sudah SELESAI dilayani langsung dari SnapshotLaporan. Selain
+    itu, bila konteks belum ada untuk versi data sesi saat ini, konteks
+    dihitung ulang dengan SessionReport lalu disimpan.
+    """
+    if audit_session.status == 'SELESAI':
+        data = (
+            SnapshotLaporan.objects.filter(audit_session_id=audit_session.pk)
+            .values_list('data', flat=True)
+            .first()
+        )
+        if data is not None:
+            return JENIS_LAPORAN[jenis](SessionReport(audit_session, data=data))
+
+    key = KONTEKS_KEY.format(session_id=audit_session.pk, versi=versi_sesi(audit_session.pk), jenis=jenis)
+    konteks = cache.get(key)
+    if konteks is not None:
+        _increment(STATISTIK_KEY.format(nama='hit'))
+        return konteks
+
+    _increment(STATISTIK_KEY.format(nama='miss'))
+    konteks = JENIS_LAPORAN[jenis](SessionReport(audit_session))
+    cache.set(key, konteks, timeout=_timeout())
+    return konteks
+
+
+def statistik_cache():
+    """Jumlah hit/miss cache laporan sejak penghitung terakhir direset"""
+    hit = cache.get(STATISTIK_KEY.format(nama='hit'), 0)
+    miss = cache.get(STATISTIK_KEY.format(nama='miss'), 0)
+    total = hit + miss
+    return {
+        'hit': hit,
+        'miss': miss,
+        'rasio_hit': round(hit / total, 4) if total else 0,
+    }
+
+
+def reset_statistik_cache():
+    cache.delete_many([STATISTIK_KEY.format(nama='hit'), STATISTIK_KEY.format(nama='miss')])
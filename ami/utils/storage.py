@@ -0,0 +1,212 @@
+# ami/utils/storage.py
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+PREFIX_BLOB = 'blob/'
+PREFIX_PREVIEW = 'preview/'
+POLA_NAMA_BLOB = re.compile(r'^blob/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})$')
+UKURAN_CHUNK = 1024 * 1024
+
+
+def path_blob(hash_hex):
+    """Path blob di storage, dipecah dua tingkat agar satu direktori tidak berisi terlalu banyak berkas"""
+    return f'{PREFIX_BLOB}{hash_hex[:2]}/{hash_hex[2:4]}/{hash_hex}'
+
+
+def path_preview(hash_hex, ekstensi='.png'):
+    """Path preview blob (dan berkas info .json-nya), berdampingan dengan pohon blob"""
+    return f'{PREFIX_PREVIEW}{hash_hex[:2]}/{hash_hex[2:4]}/{hash_hex}{ekstensi}'
+
+
+def hash_dari_nama(name):
+    """Hash SHA-256 dari nama berkas blob, atau None untuk berkas lama (non-blob)"""
+    match = POLA_NAMA_BLOB.match(name or '')
+    return match.group(1) if match else None
+
+
+def content_type_berkas(nama):
+    """Jenis isi berkas menurut ekstensi namanya, ditentukan server (bukan dari header klien)"""
+    return mimetypes.guess_type(nama)[0] or 'application/octet-stream'
+
+
+def storage_berkas():
+    """Storage untuk berkas bukti (FileField DokumenPendukung/RekomendasiTindakLanjut)"""
+    return storages['berkas']
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Storage berkas berbasis isi (content-addressed) dengan deduplikasi.
+
+    Berkas di-hash (SHA-256) sambil ditulis ke berkas sementara, chunk demi
+    chunk, lalu dipindahkan ke blob/<aa>/<bb>/<hash> setelah transaksi
+    commit. Bila blob dengan hash yang sama sudah ada, berkas sementara
+    dibuang sehingga unggahan ulang hanya menambah metadata. Setiap blob
+    dicatat di BlobBerkas dengan jumlah referensi yang diubah di bawah kunci
+    baris; delete() melepas satu referensi dan berkas baru dihapus setelah
+    tidak ada lagi yang merujuknya.
+
+    Berkas lama yang disimpan sebelum storage ini dipakai (di luar blob/)
+    tetap bisa dibaca dan dihapus seperti biasa.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Nama akhir ditentukan dari isi berkas di _save
+        return name
+
+    def direktori_sementara(self, *bagian):
+        """Direktori berkas sementara di dalam storage (satu filesystem dengan blob)"""
+        path = self.path(PREFIX_BLOB + '/'.join(('tmp', *bagian)))
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _save(self, name, content):
+        fd, path_tmp = tempfile.mkstemp(dir=self.direktori_sementara())
+        try:
+            hasher = hashlib.sha256()
+            ukuran = 0
+            with os.fdopen(fd, 'wb') as berkas:
+                for chunk in content.chunks(UKURAN_CHUNK):
+                    hasher.update(chunk)
+                    berkas.write(chunk)
+                    ukuran += len(chunk)
+        except BaseException:
+            os.remove(path_tmp)
+            raise
+
+        nama_asli = os.path.basename(getattr(content, 'name', '') or name)
+        return self.simpan_berkas_sementara(path_tmp, hasher.hexdigest(), ukuran, nama_asli)
+
+    def simpan_berkas_sementara(self, path_tmp, hash_hex, ukuran, nama_asli):
+        """
+        Tambah referensi blob untuk berkas sementara yang hash SHA-256-nya
+        sudah diketahui, lalu pindahkan berkas itu ke blob-nya (atau buang bila
+        blob sudah ada) setelah transaksi commit. path_tmp sebaiknya berada di
+        direktori_sementara() agar cukup di-rename.
+
+        Referensi ditambah di dalam transaksi yang sedang berjalan (penyimpanan
+        pemilik FileField), jadi ikut dibatalkan bila penyimpanan itu gagal;
+        berkas sementara kemudian tetap di direktori sementara dan dibuang oleh
+        bersihkan_sementara(). content_type blob ditentukan dari ekstensi
+        nama_asli. Mengembalikan nama blob untuk disimpan di FileField.
+        """
+        from ami.models import BlobBerkas
+
+        nama_blob = path_blob(hash_hex)
+        with transaction.atomic():
+            # Kunci baris agar tidak bersilangan dengan delete() yang melepas referensi terakhir
+            blob, dibuat = BlobBerkas.objects.select_for_update().get_or_create(hash=hash_hex, defaults={
+                'nama': nama_blob,
+                'ukuran': ukuran,
+                'content_type': content_type_berkas(nama_asli)[:100],
+                'nama_asli': nama_asli[:255],
+                'jumlah_referensi': 1,
+            })
+            if not dibuat:
+                BlobBerkas.objects.filter(pk=blob.pk).update(jumlah_referensi=F('jumlah_referensi') + 1)
+            transaction.on_commit(lambda: self._letakkan_blob(path_tmp, nama_blob, timpa=dibuat))
+        return nama_blob
+
+    def _letakkan_blob(self, path_tmp, nama_blob, timpa):
+        """
+        Pindahkan berkas sementara ke blob. Blob yang baru dibuat selalu
+        ditimpa: berkas lamanya bisa jadi masih menunggu dihapus oleh delete().
+        """
+        tujuan = self.path(nama_blob)
+        try:
+            if not timpa and os.path.exists(tujuan):
+                os.remove(path_tmp)
+            else:
+                os.makedirs(os.path.dirname(tujuan), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(path_tmp, self.file_permissions_mode)
+                os.replace(path_tmp, tujuan)
+        except BaseException:
+            if os.path.exists(path_tmp):
+                os.remove(path_tmp)
+            raise
+
+    def delete(self, name):
+        """Lepas satu referensi blob; berkasnya dihapus setelah commit bila referensi habis"""
+        from ami.models import BlobBerkas
+
+        hash_hex = hash_dari_nama(name)
+        if hash_hex is None:
+            super().delete(name)
+            return
+        with transaction.atomic():
+            blob = BlobBerkas.objects.select_for_update().filter(hash=hash_hex).first()
+            if blob is None:
+                return
+            if blob.jumlah_referensi > 1:
+                BlobBerkas.objects.filter(pk=blob.pk).update(jumlah_referensi=F('jumlah_referensi') - 1)
+                return
+            blob.delete()
+            transaction.on_commit(lambda: self._hapus_blob(name, hash_hex))
+
+    def _blob_dirujuk(self, hash_hex):
+        from ami.models import BlobBerkas
+
+        return BlobBerkas.objects.filter(hash=hash_hex).exists()
+
+    def _hapus_blob(self, name, hash_hex):
+        """
+        Hapus berkas blob yang barisnya sudah dihapus delete().
+
+        Unggahan dengan isi yang sama bisa membuat barisnya lagi kapan saja,
+        jadi pengecekan baris dan penghapusan berkas tidak boleh terpisah.
+        Blob lebih dulu dipindah (rename) ke direktori sementara, lalu baris
+        dicek ulang: bila sudah ada lagi, unggahan itu mungkin sudah meletakkan
+        blob yang baru saja dipindah sehingga blob dikembalikan. Unggahan yang
+        membuat barisnya setelah pengecekan ulang selalu meletakkan blobnya
+        sendiri (timpa=True), jadi berkas yang dipindah aman dihapus.
+        """
+        if self._blob_dirujuk(hash_hex):
+            return
+        path = self.path(name)
+        fd, path_buang = tempfile.mkstemp(dir=self.direktori_sementara('hapus'), prefix=hash_hex)
+        os.close(fd)
+        try:
+            os.replace(path, path_buang)
+        except FileNotFoundError:
+            os.remove(path_buang)
+            path_buang = None
+
+        if self._blob_dirujuk(hash_hex):
+            if path_buang is not None:
+                os.replace(path_buang, path)
+            return
+        if path_buang is not None:
+            os.remove(path_buang)
+        # Preview ikut dibuang bersama isinya
+        for ekstensi in ('.png', '.json'):
+            super().delete(path_preview(hash_hex, ekstensi))
+
+    def bersihkan_sementara(self, umur):
+        """
+        Hapus berkas sementara yang lebih tua dari `umur` detik, yaitu sisa
+        penyimpanan yang transaksinya dibatalkan sebelum berkas dipindah ke
+        blob. Berkas unggahan bertahap (tmp/unggahan) diurus oleh
+        UnggahanBertahap. Mengembalikan jumlah berkas yang dihapus.
+        """
+        batas = time.time() - umur
+        jumlah = 0
+        with os.scandir(self.direktori_sementara()) as entri:
+            for berkas in entri:
+                if berkas.is_file() and berkas.stat().st_mtime < batas:
+                    try:
+                        os.remove(berkas.path)
+                    except FileNotFoundError:
+                        continue
+                    jumlah += 1
+        return jumlah
@@ -0,0 +1,149 @@
+# ami/utils/unduhan.py
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from .storage import UKURAN_CHUNK, content_type_berkas, hash_dari_nama
+
+POLA_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Jenis berkas unggahan yang boleh ditampilkan langsung di browser; jenis
+# lain (HTML, SVG, dll.) selalu dikirim sebagai lampiran
+CONTENT_TYPE_INLINE = frozenset({'application/pdf', 'image/png', 'image/jpeg'})
+
+# Nilai AMI_MEDIA_OFFLOAD
+OFFLOAD_NGINX = 'x-accel-redirect'
+OFFLOAD_SENDFILE = 'x-sendfile'
+
+
+def info_berkas(field_file, nama=None):
+    """
+    (nama unduhan, content_type) untuk berkas di FileField. Blob tidak punya
+    ekstensi, jadi ekstensi diambil dari nama asli di BlobBerkas; nama
+    unduhan memakai `nama` (misalnya nama dokumen) bila diberikan. Content
+    type selalu ditentukan dari ekstensi, bukan dari nilai yang tersimpan
+    (baris blob lama menyimpan header dari klien).
+    """
+    from ami.models import BlobBerkas
+
+    nama_asli = os.path.basename(field_file.name)
+    hash_hex = hash_dari_nama(field_file.name)
+    if hash_hex is not None:
+        nama_blob = BlobBerkas.objects.filter(hash=hash_hex).values_list('nama_asli', flat=True).first()
+        nama_asli = nama_blob or nama_asli
+    ekstensi = os.path.splitext(nama_asli)[1]
+    content_type = content_type_berkas(nama_asli)
+    if nama:
+        nama_asli = nama if nama.lower().endswith(ekstensi.lower()) else nama + ekstensi
+    return nama_asli, content_type
+
+
+def _parse_range(header, ukuran):
+    """(awal, akhir) inklusif dari header Range satu rentang; None bila tidak dipakai, False bila tidak valid"""
+    match = POLA_RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    awal, akhir = match.groups()
+    if not awal:
+        if not akhir or int(akhir) == 0:
+            return False
+        return max(ukuran - int(akhir), 0), ukuran - 1
+    awal = int(awal)
+    akhir = min(int(akhir), ukuran - 1) if akhir else ukuran - 1
+    if awal > akhir or awal >= ukuran:
+        return False
+    return awal, akhir
+
+
+def _baca_rentang(berkas, awal, panjang):
+    with berkas:
+        berkas.seek(awal)
+        while panjang > 0:
+            data = berkas.read(min(UKURAN_CHUNK, panjang))
+            if not data:
+                break
+            panjang -= len(data)
+            yield data
+
+
+def respons_berkas(request, field_file, nama=None, as_attachment=True):
+    """
+    Respons unduhan berkas FileField setelah izin diperiksa oleh view.
+
+    Berkas dikirim sebagai lampiran; dengan as_attachment=False berkas
+    ditampilkan di browser hanya bila jenisnya ada di CONTENT_TYPE_INLINE.
+
+    Dengan AMI_MEDIA_OFFLOAD = 'x-accel-redirect' (nginx) atau 'x-sendfile'
+    (Apache mod_xsendfile/lighttpd) isi berkas dikirim oleh web server
+    sehingga worker Django langsung bebas. Tanpa offload (pengembangan) berkas
+    di-stream dari Python per potongan, mendukung satu rentang header Range.
+    """
+    nama_unduhan, content_type = info_berkas(field_file, nama)
+    hash_hex = hash_dari_nama(field_file.name)
+    # Isi blob tidak pernah berubah untuk nama yang sama, jadi hash-nya dipakai sebagai ETag
+    return kirim_berkas(
+        request, field_file.storage, field_file.name, nama_unduhan, content_type,
+        as_attachment=as_attachment, etag=f'"{hash_hex}"' if hash_hex else None,
+    )
+
+
+def kirim_berkas(request, storage, name, nama_unduhan, content_type, as_attachment=True, etag=None):
+    """
+    Kirim berkas `name` di storage (lihat respons_berkas) dengan nama dan
+    content type tertentu. Http404 bila berkasnya tidak ada di storage.
+
+    Isi berkas berasal dari pengguna, jadi respons selalu diberi
+    Content-Security-Policy: sandbox agar tidak bisa menjalankan skrip di
+    origin aplikasi meskipun dibuka langsung.
+    """
+    offload = getattr(settings, 'AMI_MEDIA_OFFLOAD', None)
+
+    if etag and etag in request.headers.get('If-None-Match', ''):
+        respons = HttpResponseNotModified()
+        respons['ETag'] = etag
+        return respons
+
+    if offload == OFFLOAD_NGINX:
+        respons = HttpResponse(content_type=content_type)
+        url_internal = getattr(settings, 'AMI_MEDIA_INTERNAL_URL', '/media-internal/')
+        respons['X-Accel-Redirect'] = url_internal + quote(name)
+    elif offload == OFFLOAD_SENDFILE:
+        respons = HttpResponse(content_type=content_type)
+        respons['X-Sendfile'] = storage.path(name)
+    else:
+        # Berkas dibuka di sini agar berkas yang hilang menjadi 404, bukan
+        # kesalahan di tengah streaming
+        try:
+            berkas = open(storage.path(name), 'rb')
+        except FileNotFoundError:
+            raise Http404('Berkas tidak ditemukan.')
+        ukuran = os.fstat(berkas.fileno()).st_size
+        rentang = _parse_range(request.headers.get('Range'), ukuran) if ukuran else None
+        if rentang is False:
+            berkas.close()
+            respons = HttpResponse(status=416)
+            respons['Content-Range'] = f'bytes */{ukuran}'
+            return respons
+        awal, akhir = rentang or (0, ukuran - 1)
+        panjang = akhir - awal + 1 if ukuran else 0
+        respons = StreamingHttpResponse(
+            _baca_rentang(berkas, awal, panjang), content_type=content_type, status=206 if rentang else 200
+        )
+        respons['Content-Length'] = str(panjang)
+        if rentang:
+            respons['Content-Range'] = f'bytes {awal}-{akhir}/{ukuran}'
+
+    respons['Accept-Ranges'] = 'bytes'
+    inline = not as_attachment and content_type in CONTENT_TYPE_INLINE
+    respons['Content-Disposition'] = content_disposition_header(not inline, nama_unduhan)
+    respons['Content-Security-Policy'] = 'sandbox'
+    respons['X-Content-Type-Options'] = 'nosniff'
+    # Berkas bukti bersifat privat: boleh disimpan browser, tidak oleh cache bersama
+    respons['Cache-Control'] = 'private, max-age=3600'
+    if etag:
+        respons['ETag'] = etag
+    return respons
@@ -0,0 +1,233 @@
+# ami/utils/unggahan.py
+import fcntl
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from ami.models import DokumenPendukung, UnggahanBertahap
+
+from .storage import UKURAN_CHUNK, storage_berkas
+
+UKURAN_BACA = 64 * 1024
+
+
+def ukuran_chunk():
+    """Ukuran potongan yang disarankan ke klien (juga batas maksimum satu PUT)"""
+    return getattr(settings, 'AMI_UNGGAHAN_CHUNK', 8 * 1024 * 1024)
+
+
+def ukuran_maksimal():
+    return getattr(settings, 'AMI_UNGGAHAN_MAKS', 500 * 1024 * 1024)
+
+
+# Jenis berkas dokumen pendukung yang boleh diunggah (unggahan biasa maupun bertahap)
+EKSTENSI_BERKAS = (
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp',
+    '.txt', '.csv', '.png', '.jpg', '.jpeg', '.zip',
+)
+
+
+def ekstensi_diizinkan():
+    return tuple(getattr(settings, 'AMI_UNGGAHAN_EKSTENSI', EKSTENSI_BERKAS))
+
+
+def validasi_nama_berkas(nama_berkas):
+    """Periksa ekstensi berkas dokumen pendukung; mengembalikan nama berkas tanpa path"""
+    nama = os.path.basename(nama_berkas.replace('\\', '/'))
+    if os.path.splitext(nama)[1].lower() not in ekstensi_diizinkan():
+        raise ValidationError(
+            f"Jenis berkas tidak diizinkan. Gunakan salah satu: {', '.join(ekstensi_diizinkan())}.",
+            code='ekstensi',
+        )
+    return nama
+
+
+def validasi_ukuran_berkas(ukuran):
+    """Periksa ukuran berkas dokumen pendukung terhadap AMI_UNGGAHAN_MAKS"""
+    maksimal = ukuran_maksimal()
+    if ukuran <= 0:
+        raise ValidationError('Berkas tidak boleh kosong.', code='ukuran')
+    if ukuran > maksimal:
+        raise ValidationError(f'Ukuran berkas melebihi batas {maksimal // (1024 * 1024)} MB.', code='ukuran')
+
+
+def path_sementara(unggahan):
+    """Berkas sementara unggahan, di storage berkas agar bisa langsung dipindah ke blob"""
+    return os.path.join(storage_berkas().direktori_sementara('unggahan'), f'{unggahan.pk}.part')
+
+
+def _buka_terkunci(unggahan):
+    """
+    Buka berkas sementara unggahan (dibuat bila belum ada) dengan kunci
+    eksklusif flock. Kunci dilepas saat berkas ditutup, jadi permintaan lain
+    untuk unggahan yang sama menunggu sampai permintaan ini selesai.
+    """
+    fd = os.open(path_sementara(unggahan), os.O_RDWR | os.O_CREAT, 0o600)
+    berkas = os.fdopen(fd, 'r+b')
+    try:
+        fcntl.flock(berkas, fcntl.LOCK_EX)
+    except BaseException:
+        berkas.close()
+        raise
+    return berkas
+
+
+def _muat_ulang(unggahan):
+    """Offset dan status terbaru dari database, dibaca setelah kunci berkas didapat"""
+    terkini = UnggahanBertahap.objects.filter(pk=unggahan.pk).values('diterima', 'status').first()
+    if terkini is None:
+        raise ValidationError('Unggahan ini sudah dibatalkan.', code='status')
+    unggahan.diterima, unggahan.status = terkini['diterima'], terkini['status']
+
+
+def _hash_berkas(berkas):
+    hasher = hashlib.sha256()
+    berkas.seek(0)
+    for chunk in iter(lambda: berkas.read(UKURAN_CHUNK), b''):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _periksa_aktif(unggahan):
+    if unggahan.status != 'AKTIF':
+        raise ValidationError('Unggahan ini sudah selesai.', code='status')
+
+
+def tulis_chunk(unggahan, offset, stream, panjang, checksum=None):
+    """
+    Tulis satu potongan dari stream (dibaca bertahap, tidak pernah utuh di
+    memori) ke berkas sementara mulai dari offset, lalu catat offset baru.
+
+    Penulisan diserialkan dengan flock pada berkas sementara, bukan dengan
+    transaksi database: membaca stream dari klien yang lambat tidak boleh
+    menahan kunci database. Offset dibaca ulang setelah kunci berkas didapat
+    dan harus sama dengan jumlah byte yang sudah diterima (ValidationError
+    code='offset' bila tidak, misalnya karena potongan dikirim ulang); offset
+    baru dicatat dengan UPDATE bersyarat pada offset lama. Bila koneksi
+    terputus di tengah potongan, byte yang sempat diterima tetap disimpan
+    sehingga klien cukup melanjutkan dari offset terbaru. Dengan checksum
+    (SHA-256 potongan) potongan hanya disimpan bila utuh dan cocok.
+    Mengembalikan offset berikutnya.
+    """
+    if panjang <= 0:
+        raise ValidationError('Potongan tidak boleh kosong.', code='panjang')
+    if panjang > ukuran_chunk():
+        raise ValidationError(f'Potongan melebihi {ukuran_chunk()} byte.', code='panjang')
+
+    with _buka_terkunci(unggahan) as berkas:
+        _muat_ulang(unggahan)
+        _periksa_aktif(unggahan)
+        if offset != unggahan.diterima:
+            raise ValidationError(
+                f'Offset tidak sesuai, server sudah menerima {unggahan.diterima} byte.', code='offset'
+            )
+        if offset + panjang > unggahan.ukuran:
+            raise ValidationError('Potongan melebihi ukuran berkas yang diumumkan.', code='panjang')
+
+        hasher = hashlib.sha256() if checksum else None
+        ditulis = 0
+        # Buang sisa tulisan yang tidak sempat tercatat sebelumnya
+        berkas.seek(offset)
+        berkas.truncate()
+        try:
+            while ditulis < panjang:
+                data = stream.read(min(UKURAN_BACA, panjang - ditulis))
+                if not data:
+                    break
+                berkas.write(data)
+                ditulis += len(data)
+                if hasher:
+                    hasher.update(data)
+        except OSError:
+            # Koneksi klien terputus: simpan yang sudah diterima
+            pass
+        if hasher and (ditulis != panjang or hasher.hexdigest() != checksum.lower()):
+            berkas.truncate(offset)
+            raise ValidationError('Checksum potongan tidak cocok, kirim ulang potongan ini.', code='checksum')
+        berkas.flush()
+
+        diperbarui = UnggahanBertahap.objects.filter(pk=unggahan.pk, diterima=offset, status='AKTIF').update(
+            diterima=offset + ditulis, tanggal_diperbarui=timezone.now()
+        )
+        if not diperbarui:
+            _muat_ulang(unggahan)
+            _periksa_aktif(unggahan)
+            raise ValidationError(
+                f'Offset tidak sesuai, server sudah menerima {unggahan.diterima} byte.', code='offset'
+            )
+    unggahan.diterima = offset + ditulis
+    return unggahan.diterima
+
+
+def selesaikan_unggahan(unggahan, checksum=None):
+    """
+    Hitung SHA-256 berkas yang sudah lengkap, pindahkan ke storage blob tanpa
+    menyalin ulang, lalu buat DokumenPendukung-nya.
+
+    Checksum dari klien (dari permintaan ini atau yang dikirim saat unggahan
+    dimulai) bersifat opsional karena setiap potongan sudah dapat diperiksa
+    saat dikirim; bila diberikan dan tidak cocok berkas sementara dibuang dan
+    unggahan diulang dari offset 0. Berkas baru dipindah ke blob setelah
+    transaksi commit, jadi bila pembuatan dokumen gagal berkas sementara dan
+    unggahan tetap ada dan penyelesaian dapat dicoba lagi.
+    """
+    checksum = (checksum or unggahan.checksum).lower()
+    path = path_sementara(unggahan)
+    # Kunci berkas yang sama dengan tulis_chunk agar potongan yang masih
+    # ditulis tidak ikut terhitung setengah jalan
+    with _buka_terkunci(unggahan) as berkas:
+        _muat_ulang(unggahan)
+        _periksa_aktif(unggahan)
+        if unggahan.diterima != unggahan.ukuran:
+            raise ValidationError(
+                f'Unggahan belum lengkap ({unggahan.diterima} dari {unggahan.ukuran} byte).', code='offset'
+            )
+        hash_hex = _hash_berkas(berkas)
+        if checksum and hash_hex != checksum:
+            berkas.truncate(0)
+            UnggahanBertahap.objects.filter(pk=unggahan.pk).update(diterima=0, tanggal_diperbarui=timezone.now())
+            unggahan.diterima = 0
+            raise ValidationError('Checksum berkas tidak cocok, unggah ulang dari awal.', code='checksum')
+
+    with transaction.atomic():
+        nama_blob = storage_berkas().simpan_berkas_sementara(path, hash_hex, unggahan.ukuran, unggahan.nama_berkas)
+        dokumen = DokumenPendukung(
+            penilaian_diri_id=unggahan.penilaian_diri_id,
+            nama=unggahan.nama,
+            deskripsi=unggahan.deskripsi,
+        )
+        dokumen.file.name = nama_blob
+        dokumen.save()
+        # Status diubah dengan UPDATE bersyarat agar dua permintaan selesai tidak
+        # membuat dokumen ganda; yang kalah dibatalkan bersama dokumennya
+        selesai = UnggahanBertahap.objects.filter(pk=unggahan.pk, status='AKTIF').update(
+            status='SELESAI', dokumen=dokumen, tanggal_diperbarui=timezone.now()
+        )
+        if not selesai:
+            raise ValidationError('Unggahan ini sudah selesai.', code='status')
+    unggahan.status, unggahan.dokumen = 'SELESAI', dokumen
+    return dokumen
+
+
+def hapus_berkas_sementara(unggahan):
+    try:
+        os.remove(path_sementara(unggahan))
+    except FileNotFoundError:
+        pass
+
+
+def bersihkan_unggahan_kedaluwarsa():
+    """
+    Hapus unggahan yang tidak dilanjutkan (beserta berkas sementaranya lewat
+    signal) dan sisa berkas sementara dari penyimpanan yang dibatalkan.
+    """
+    umur = getattr(settings, 'AMI_UNGGAHAN_KEDALUWARSA', 24 * 60 * 60)
+    batas = timezone.now() - timedelta(seconds=umur)
+    jumlah, _ = UnggahanBertahap.objects.filter(status='AKTIF', tanggal_diperbarui__lt=batas).delete()
+    storage_berkas().bersihkan_sementara(umur)
+    return jumlah
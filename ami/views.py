@@ -1,15 +1,22 @@
 # ami/views.py
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
-from django.http import HttpResponseForbidden, Http404
+from django.http import HttpResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
 from django.core.paginator import Paginator
 from django.contrib.auth.models import User
 from django.http import JsonResponse
 from django.db.models import Q
 from django.utils import timezone
 from django.db.models import Avg, Count
+from django.forms.models import model_to_dict
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_http_methods
 
 from .models import (
     LembagaAkreditasi,
@@ -23,6 +30,8 @@ from .models import (
     Kriteria,
     Elemen,
     KoordinatorProgramStudi,
+    SnapshotLaporan,
+    UnggahanBertahap,
 )
 from .forms import (
     LembagaAkreditasiForm,
@@ -30,25 +39,32 @@ from .forms import (
     AuditorForm,
     AuditSessionForm,
     PenilaianDiriForm,
+    PenilaianDiriFormSet,
     AuditForm,
     DokumenPendukungForm,
     RekomendasiTindakLanjutForm,
     KriteriaForm,
     ElemenForm,
     KoordinatorProgramStudiForm,
+    UnggahanBertahapForm,
 )
+from .utils.arsip import stream_arsip_sesi
+from .utils.katalog import katalog
+from .utils.pagination import KeysetPaginator
+from .utils.penilaian import perbarui_bersyarat, simpan_penilaian_bersyarat
+from .utils.peran import peran_pengguna
+from .utils.report_cache import konteks_laporan, statistik_cache
+from .utils.preview import lampirkan_preview
+from .utils.storage import hash_dari_nama, path_preview
+from .utils.unduhan import kirim_berkas, respons_berkas
+from .utils.unggahan import selesaikan_unggahan, tulis_chunk, ukuran_chunk
 # ----------------------------
 # Helper Functions
 # ----------------------------
 def get_user_program_studi(user):
     """Mendapatkan program studi yang terkait dengan user"""
-    try:
-        # Perbaikan: Mengakses program_studi dari KoordinatorProgramStudi
-        if hasattr(user, 'koordinatorprogramstudi'):
-            return user.koordinatorprogramstudi.program_studi
-        return None
-    except AttributeError:
-        return None
+    # Dimuat sekali per request (lihat ami.middleware.PeranPenggunaMiddleware)
+    return peran_pengguna(user).program_studi
     
 # def get_user_program_studi(user):
 #     """Mendapatkan program studi yang terkait dengan user"""
@@ -59,17 +75,29 @@ def get_user_program_studi(user):
 
 def get_user_auditor(user):
     """Mendapatkan objek auditor yang terkait dengan user"""
-    try:
-        return user.auditor
-    except AttributeError:
-        return None
+    return peran_pengguna(user).auditor
 
 def check_program_studi_permission(user, program_studi):
     """Memeriksa apakah user memiliki izin untuk mengakses program studi tertentu"""
     # if user.is_superuser:
     #     return True
     user_program_studi = get_user_program_studi(user)
-    return user_program_studi == program_studi
+    program_studi_id = getattr(program_studi, 'pk', program_studi)
+    return user_program_studi is not None and user_program_studi.pk == program_studi_id
+
+def check_auditor_session_permission(user, audit_session):
+    """Memeriksa apakah user adalah auditor (ketua/anggota) sesi audit (maksimal satu query)"""
+    user_auditor = get_user_auditor(user)
+    if user_auditor is None:
+        return False
+    if audit_session.auditor_ketua_id == user_auditor.id:
+        return True
+    prefetched = getattr(audit_session, '_prefetched_objects_cache', {})
+    if 'auditor_anggota' in prefetched:
+        return any(a.id == user_auditor.id for a in prefetched['auditor_anggota'])
+    return AuditSession.auditor_anggota.through.objects.filter(
+        auditsession_id=audit_session.pk, auditor_id=user_auditor.id
+    ).exists()
 
 def check_audit_session_permission(user, audit_session):
     """Memeriksa apakah user memiliki izin untuk mengakses sesi audit tertentu"""
@@ -77,19 +105,68 @@ def check_audit_session_permission(user, audit_session):
         return True
 
     # Pemeriksaan untuk program studi
-    if get_user_program_studi(user) == audit_session.program_studi:
+    if check_program_studi_permission(user, audit_session.program_studi_id):
         return True
     
     # Pemeriksaan untuk auditor
+    return check_auditor_session_permission(user, audit_session)
+
+def periksa_audit_dapat_diubah(user, audit_session):
+    """
+    Periksa apakah user boleh mengubah hasil audit pada sesi ini (audit_session
+    harus dimuat dengan with_effective_status).
+
+    Mengembalikan (auditor, pesan): auditor None berarti tidak berizin sama
+    sekali; pesan tidak kosong berarti audit belum/tidak bisa diubah saat ini.
+    """
+    # Periksa izin akses - hanya auditor yang ditunjuk yang bisa mengakses
+    if not check_audit_session_permission(user, audit_session):
+        return None, "Anda tidak memiliki izin untuk mengubah audit ini."
+    
+    # Periksa apakah user adalah auditor
     user_auditor = get_user_auditor(user)
-    if user_auditor:
-        return (user_auditor == audit_session.auditor_ketua or 
-                user_auditor in audit_session.auditor_anggota.all())
+    if not user_auditor:
+        return None, "Anda tidak memiliki izin untuk mengubah audit ini."
+    
+    # Periksa status sesi audit
+    if audit_session.status_efektif != 'PENILAIAN_AUDITOR':
+        return user_auditor, "Audit hanya bisa dilakukan saat status sesi adalah 'Penilaian Auditor'."
     
-    return False
+    # Periksa apakah masih dalam rentang tanggal penilaian auditor
+    today = timezone.now().date()
+    if audit_session.tanggal_mulai_penilaian_auditor and audit_session.tanggal_selesai_penilaian_auditor:
+        if today < audit_session.tanggal_mulai_penilaian_auditor or today > audit_session.tanggal_selesai_penilaian_auditor:
+            return user_auditor, "Audit hanya bisa dilakukan dalam rentang tanggal penilaian auditor."
+    return user_auditor, None
+
+PESAN_KONFLIK_VERSI = (
+    "Data ini telah diubah oleh pengguna lain sejak halaman dibuka. "
+    "Muat ulang halaman untuk melihat perubahan terbaru sebelum menyimpan."
+)
+
+def simpan_form_bersyarat(request, form, obj, session_id, perubahan_tambahan=None):
+    """
+    Simpan form edit yang sudah is_valid() dengan syarat versi yang dikirim
+    form (input tersembunyi "versi") masih sama dengan versi di database,
+    lihat perbarui_bersyarat. Bila sudah usang, error ditambahkan ke form
+    dan False dikembalikan.
+    """
+    versi = request.POST.get('versi')
+    try:
+        versi = obj.versi if versi is None else int(versi)
+    except ValueError:
+        versi = None
+    perubahan = {field: form.cleaned_data[field] for field in form._meta.fields}
+    perubahan.update(perubahan_tambahan or {})
+    if versi is None or not perbarui_bersyarat(obj, perubahan, versi, session_id):
+        form.add_error(None, PESAN_KONFLIK_VERSI)
+        return False
+    return True
+
 # ----------------------------
 # Dashboard Views
 # ----------------------------
+
 @login_required
 # ami/views.py (di dalam fungsi dashboard)
 @login_required
@@ -100,13 +177,15 @@ def dashboard(request):
         'page_subtitle': 'Sistem Audit Mutu Internal - Universitas Tadulako',
     }
 
-    if request.user.is_superuser:
+    peran = request.peran
+
+    if peran.role == 'admin':
         # Dashboard untuk Admin
         total_program_studi = ProgramStudi.objects.count()
         total_audit_session = AuditSession.objects.count()
         total_penilaian_diri = PenilaianDiri.objects.count()
         total_audit = Audit.objects.count()
-        latest_audit_sessions = AuditSession.objects.select_related('program_studi').order_by('-tanggal_mulai_penilaian_mandiri')[:5]
+        latest_audit_sessions = AuditSession.objects.with_effective_status().select_related('program_studi').order_by('-tanggal_mulai_penilaian_mandiri')[:5]
         latest_penilaian_diri = PenilaianDiri.objects.select_related('audit_session', 'audit_session__program_studi', 'elemen').order_by('-tanggal_penilaian')[:5]
 
         context.update({
@@ -119,11 +198,11 @@ def dashboard(request):
             'user_role': 'admin' # Kirim role ke template
         })
 
-    elif hasattr(request.user, 'koordinatorprogramstudi'):
+    elif peran.role == 'koordinator':
         # Dashboard untuk Koordinator Prodi
-        user_program_studi = request.user.koordinatorprogramstudi.program_studi
+        user_program_studi = peran.program_studi
         # Ambil sesi audit untuk program studi ini
-        audit_sessions = AuditSession.objects.filter(program_studi=user_program_studi).order_by('-tanggal_mulai_penilaian_mandiri')[:5]
+        audit_sessions = AuditSession.objects.with_effective_status().filter(program_studi=user_program_studi).order_by('-tanggal_mulai_penilaian_mandiri')[:5]
         # Ambil penilaian diri untuk program studi ini
         penilaian_diri = PenilaianDiri.objects.filter(
             audit_session__program_studi=user_program_studi
@@ -136,13 +215,11 @@ def dashboard(request):
             'user_role': 'koordinator' # Kirim role ke template
         })
 
-    elif hasattr(request.user, 'auditor'):
+    elif peran.role == 'auditor':
         # Dashboard untuk Auditor
-        user_auditor = request.user.auditor
+        user_auditor = peran.auditor
         # Ambil sesi audit yang ditugaskan ke auditor ini (sebagai ketua atau anggota)
-        audit_sessions = AuditSession.objects.filter(
-            Q(auditor_ketua=user_auditor) | Q(auditor_anggota=user_auditor)
-        ).distinct().order_by('-tanggal_mulai_penilaian_mandiri')[:5]
+        audit_sessions = AuditSession.objects.with_effective_status().visible_to(request.user).order_by('-tanggal_mulai_penilaian_mandiri')[:5]
         # Ambil hasil audit yang dibuat oleh auditor ini
         audits = Audit.objects.filter(auditor=user_auditor).select_related(
             'penilaian_diri__audit_session__program_studi',
@@ -188,7 +265,7 @@ def lembaga_akreditasi_list(request):
 def lembaga_akreditasi_detail(request, pk):
     """View untuk detail lembaga akreditasi beserta kriterianya"""
     lembaga = get_object_or_404(LembagaAkreditasi, pk=pk)
-    kriteria_list = lembaga.kriteria.all().order_by('kode')
+    kriteria_list = katalog.pohon(lembaga.pk).kriteria
     
     # Pagination
     paginator = Paginator(kriteria_list, 10)
@@ -292,9 +369,21 @@ def program_studi_detail(request, pk):
     program = get_object_or_404(ProgramStudi, pk=pk)
     audit_sessions = program.audit_sessions.all().order_by('-tanggal_mulai_penilaian_mandiri')
     
+    # Riwayat skor dari snapshot laporan sesi yang sudah selesai
+    riwayat_skor = SnapshotLaporan.objects.filter(
+        audit_session__program_studi=program
+    ).values(
+        'audit_session_id',
+        'audit_session__tahun_akademik',
+        'audit_session__semester',
+        'skor_akhir',
+        'data__kategori_map',
+    ).order_by('audit_session__tahun_akademik', 'audit_session__semester')
+    
     context = {
         'program': program,
-        'audit_sessions': audit_sessions
+        'audit_sessions': audit_sessions,
+        'riwayat_skor': riwayat_skor,
     }
     
     return render(request, 'ami/program_studi_detail.html', context)
@@ -529,20 +618,10 @@ def audit_session_list(request):
     user_auditor = get_user_auditor(request.user)
     
     # Mulai dengan semua sesi audit
-    audit_session_list = AuditSession.objects.select_related(
+    # Koordinator hanya melihat sesi prodinya, auditor hanya sesi yang ditugaskan
+    audit_session_list = AuditSession.objects.visible_to(request.user).with_effective_status().select_related(
         'program_studi', 'auditor_ketua'
-    ).prefetch_related('auditor_anggota').all()
-    
-    # Filter berdasarkan peran user (hanya membatasi sesi yang ditampilkan, tidak menghapus dari daftar)
-    if not request.user.is_superuser:
-        if user_program_studi:
-            # Koordinator program studi hanya melihat sesi audit untuk program studi mereka
-            audit_session_list = audit_session_list.filter(program_studi=user_program_studi)
-        elif user_auditor:
-            # Auditor hanya melihat sesi audit yang mereka ditugaskan
-            audit_session_list = audit_session_list.filter(
-                Q(auditor_ketua=user_auditor) | Q(auditor_anggota=user_auditor)
-            ).distinct()
+    ).prefetch_related('auditor_anggota')
     
     # Filter berdasarkan program studi jika ada parameter
     program_studi_id = request.GET.get('program_studi')
@@ -557,17 +636,13 @@ def audit_session_list(request):
 
 
     
-    # Urutkan
-    audit_session_list = audit_session_list.order_by('-tanggal_mulai_penilaian_mandiri')
-    
-    # Pagination
-    paginator = Paginator(audit_session_list, 10)
-    page_number = request.GET.get('page')
-    audit_sessions = paginator.get_page(page_number)
+    # Pagination berbasis cursor (urut tanggal mulai penilaian mandiri terbaru)
+    paginator = KeysetPaginator(audit_session_list, 10, hitung_total=True)
+    audit_sessions = paginator.get_page(request.GET.get('cursor'))
     
     # Ambil semua program studi untuk filter
-    program_studi = ProgramStudi.objects.all().order_by('nama')
-    lembaga = LembagaAkreditasi.objects.all().order_by('nama')
+    program_studi = katalog.program_studi()
+    lembaga = katalog.lembaga_akreditasi()
 
     
     return render(request, 'ami/audit_session_list.html', {
@@ -598,60 +673,49 @@ def audit_session_create(request):
 @login_required
 def audit_session_detail(request, pk):
     """View untuk detail sesi audit"""
-    audit_session = get_object_or_404(AuditSession, pk=pk)
-    # Perbarui status berdasarkan tanggal
-
-    audit_session.update_status()
+    # Status ditampilkan dari tanggal (status_efektif); status tersimpan diperbarui oleh tugas terjadwal
+    audit_session = get_object_or_404(
+        AuditSession.objects.with_effective_status().select_related('program_studi'), pk=pk
+    )
     # Periksa izin akses
     if not check_audit_session_permission(request.user, audit_session):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengakses halaman ini.")
     
-    # Ambil semua elemen dari lembaga akreditasi prodi
-    lembaga = audit_session.program_studi.lembaga_akreditasi
-    semua_elemen = Elemen.objects.filter(kriteria__lembaga_akreditasi=lembaga).order_by('kode')
-    
-    # Untuk setiap elemen, pastikan ada penilaian diri
-    penilaian_diri_list = []
-    for elemen in semua_elemen:
-        penilaian, created = PenilaianDiri.objects.get_or_create(
+    # Baris penilaian diri sudah disiapkan saat sesi dibuat (lihat ami.utils.provisioning)
+    pohon = katalog.pohon(audit_session.program_studi.lembaga_akreditasi_id)
+    penilaian_diri_list = list(
+        PenilaianDiri.objects.filter(
             audit_session=audit_session,
-            elemen=elemen,
-            defaults={
-                'status': 'BELUM'
-            }
-        )
-        penilaian_diri_list.append(penilaian)
-    
-    # Hitung statistik
-    total_indikator = len(penilaian_diri_list)
-    indikator_terisi = sum(1 for p in penilaian_diri_list if p.skor is not None)
-    persentase_terisi = (indikator_terisi / total_indikator * 100) if total_indikator > 0 else 0
-    
-    # Ambil data audit
-    audit_items = Audit.objects.filter(
-        penilaian_diri__in=penilaian_diri_list
-    ).select_related(
-        'auditor'
+            elemen__kriteria_id__in=pohon.kriteria_ids,
+        ).select_related('elemen').order_by('elemen__kode')
     )
+    for penilaian in penilaian_diri_list:
+        penilaian.kriteria = pohon.kriteria_by_id[penilaian.elemen.kriteria_id]
     
-    # Hitung statistik audit
-    total_audit = audit_items.count()
-    audit_selesai = audit_items.exclude(skor__isnull=True).count()
-    persentase_audit = (audit_selesai / total_audit * 100) if total_audit > 0 else 0
-    
+    # Statistik diambil dari penghitung progres sesi (ami.utils.progres)
     context = {
         'audit_session': audit_session,
         'penilaian_diri': penilaian_diri_list,
-        'audit_items': audit_items,
-        'total_indikator': total_indikator,
-        'indikator_terisi': indikator_terisi,
-        'persentase_terisi': persentase_terisi,
-        'total_audit': total_audit,
-        'audit_selesai': audit_selesai,
-        'persentase_audit': persentase_audit,
+        'total_indikator': audit_session.jumlah_elemen,
+        'indikator_terisi': audit_session.jumlah_terisi,
+        'persentase_terisi': audit_session.persentase_terisi,
+        'total_audit': audit_session.jumlah_elemen,
+        'audit_selesai': audit_session.jumlah_teraudit,
+        'persentase_audit': audit_session.persentase_teraudit,
     }
     return render(request, 'ami/audit_session_detail.html', context)
 
+@login_required
+def audit_session_arsip(request, pk):
+    """View untuk mengunduh seluruh bukti sesi audit sebagai satu ZIP (di-stream)"""
+    audit_session = get_object_or_404(AuditSession.objects.select_related('program_studi'), pk=pk)
+    if not check_audit_session_permission(request.user, audit_session):
+        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengunduh bukti sesi ini.")
+    nama = f'bukti-{audit_session.program_studi.kode}-{audit_session.tahun_akademik}-{audit_session.semester}'
+    response = StreamingHttpResponse(stream_arsip_sesi(audit_session), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, nama.replace('/', '-') + '.zip')
+    return response
+
 @login_required
 def audit_session_update(request, pk):
     """View untuk memperbarui sesi audit"""
@@ -694,43 +758,25 @@ def audit_session_delete(request, pk):
 @login_required
 def penilaian_diri_list(request, session_id):
     """View untuk menampilkan daftar penilaian diri"""
-    audit_session = get_object_or_404(AuditSession, pk=session_id)
+    audit_session = get_object_or_404(AuditSession.objects.select_related('program_studi'), pk=session_id)
     # Periksa izin akses
     if not check_audit_session_permission(request.user, audit_session):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengakses halaman ini.")
     
-    # Ambil semua elemen dari lembaga akreditasi prodi
-    lembaga = audit_session.program_studi.lembaga_akreditasi
-    semua_elemen = Elemen.objects.filter(
-        kriteria__lembaga_akreditasi=lembaga,
-        status='aktif'
-    ).order_by('kriteria__kode', 'kode')
-    
-    # Untuk setiap elemen, pastikan ada penilaian diri
-    grouped_data = {}
-    elemen_count = 0
-    elemen_terisi = 0
-    
-    for elemen in semua_elemen:
-        elemen_count += 1
-        # Dapatkan atau buat penilaian diri
-        penilaian, created = PenilaianDiri.objects.get_or_create(
-            audit_session=audit_session,
-            elemen=elemen,
-            defaults={
-                'status': 'BELUM'
-            }
-        )
-        
-        # Cek apakah elemen sudah terisi
-        if penilaian.skor is not None:
-            elemen_terisi += 1
-        
-        # Kelompokkan berdasarkan kriteria
-        kriteria = elemen.kriteria
-        if kriteria not in grouped_data:
-            grouped_data[kriteria] = []
-        grouped_data[kriteria].append(penilaian)
+    # Ambil penilaian diri untuk semua elemen aktif dari lembaga akreditasi prodi
+    pohon = katalog.pohon(audit_session.program_studi.lembaga_akreditasi_id)
+    semua_penilaian = list(PenilaianDiri.objects.filter(
+        audit_session=audit_session,
+        elemen__kriteria_id__in=pohon.kriteria_ids,
+        elemen__status='aktif'
+    ).select_related('elemen').order_by('elemen__kode'))
+    
+    elemen_count = len(semua_penilaian)
+    # Cek apakah elemen sudah terisi
+    elemen_terisi = sum(1 for penilaian in semua_penilaian if penilaian.skor is not None)
+    
+    # Kelompokkan berdasarkan kriteria (urutan kriteria dari katalog instrumen)
+    grouped_data = pohon.kelompokkan(semua_penilaian, lambda penilaian: penilaian.elemen.kriteria_id)
     
     # Hitung statistik
     persentase_terisi = (elemen_terisi / elemen_count * 100) if elemen_count > 0 else 0
@@ -751,7 +797,7 @@ def penilaian_diri_create(request, session_id):
     audit_session = get_object_or_404(AuditSession, pk=session_id)
     
     # Periksa izin akses - hanya program studi yang bersangkutan yang bisa mengisi
-    if not check_program_studi_permission(request.user, audit_session.program_studi):
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengisi penilaian diri ini.")
     
     if request.method == 'POST':
@@ -788,7 +834,7 @@ def penilaian_diri_update(request, pk):
     penilaian = get_object_or_404(PenilaianDiri, pk=pk)
     audit_session = penilaian.audit_session
     # Periksa izin akses - hanya program studi yang bersangkutan yang bisa mengisi
-    if not check_program_studi_permission(request.user, audit_session.program_studi):
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengubah penilaian diri ini.")
     
     # # Periksa status sesi audit
@@ -805,13 +851,11 @@ def penilaian_diri_update(request, pk):
     
     if request.method == 'POST':
         form = PenilaianDiriForm(request.POST, instance=penilaian)
-        if form.is_valid():
-            penilaian = form.save()
-            # Update status penilaian
-            if penilaian.skor is not None:
-                penilaian.status = 'TERISI'
-                penilaian.save()
-            
+        # Form sudah menjalankan validasi model, simpan sekali tanpa validasi ulang
+        if form.is_valid() and simpan_form_bersyarat(
+            request, form, penilaian, audit_session.id,
+            {'status': 'TERISI'} if form.cleaned_data['skor'] is not None else None,
+        ):
             messages.success(request, 'Penilaian diri berhasil diperbarui.')
             return redirect('ami:penilaian_diri_list', session_id=audit_session.id)
     else:
@@ -825,17 +869,88 @@ def penilaian_diri_update(request, pk):
     }
     return render(request, 'ami/penilaian_diri_form.html', context)
 
+@login_required
+def penilaian_diri_batch(request, session_id):
+    """
+    View untuk mengisi penilaian diri seluruh elemen satu kriteria (parameter
+    ?kriteria=<id>) atau seluruh sesi sekaligus dalam satu request.
+
+    Elemen dimuat bersama penilaian sehingga validasi skor_maksimal tidak
+    memerlukan query per baris, dan baris yang berubah disimpan dengan satu
+    bulk_update.
+    """
+    audit_session = get_object_or_404(AuditSession.objects.select_related('program_studi'), pk=session_id)
+    # Periksa izin akses - hanya program studi yang bersangkutan yang bisa mengisi
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
+        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengisi penilaian diri ini.")
+
+    pohon = katalog.pohon(audit_session.program_studi.lembaga_akreditasi_id)
+    kriteria = None
+    kriteria_ids = pohon.kriteria_ids
+    kriteria_id = request.GET.get('kriteria')
+    if kriteria_id:
+        kriteria = pohon.kriteria_by_id.get(int(kriteria_id)) if kriteria_id.isdigit() else None
+        if kriteria is None:
+            raise Http404("Kriteria tidak ditemukan.")
+        kriteria_ids = [kriteria.id]
+
+    queryset = PenilaianDiri.objects.filter(
+        audit_session=audit_session,
+        elemen__kriteria_id__in=kriteria_ids,
+        elemen__status='aktif',
+    ).select_related('elemen').order_by('elemen__kode')
+
+    if request.method == 'POST':
+        formset = PenilaianDiriFormSet(request.POST, queryset=queryset)
+        if formset.is_valid():
+            form_diubah = [form for form in formset.forms if form.has_changed()]
+            versi = {form.instance.pk: form.cleaned_data['versi'] for form in form_diubah}
+            diubah = [form.save(commit=False) for form in form_diubah]
+            # Formset sudah memvalidasi setiap baris terhadap elemen yang dimuat;
+            # baris yang diubah pihak lain sejak halaman dibuka tidak ditimpa
+            konflik = simpan_penilaian_bersyarat(
+                diubah, versi, ['skor', 'komentar', 'bukti_dokumen'], validasi=False
+            )
+
+            disimpan = len(diubah) - len(konflik)
+            if konflik:
+                if disimpan:
+                    messages.success(request, f'{disimpan} penilaian diri berhasil disimpan.')
+                kode = ', '.join(p.elemen.kode for p in konflik)
+                messages.error(request, f'Elemen {kode} tidak disimpan. {PESAN_KONFLIK_VERSI}')
+                # Muat ulang halaman batch agar nilai dan versi terbaru yang tampil
+                return redirect(request.get_full_path())
+            messages.success(request, f'{disimpan} penilaian diri berhasil disimpan.')
+            return redirect('ami:penilaian_diri_list', session_id=audit_session.id)
+    else:
+        formset = PenilaianDiriFormSet(queryset=queryset)
+
+    grouped_forms = pohon.kelompokkan(formset.forms, lambda form: form.instance.elemen.kriteria_id)
+
+    if kriteria:
+        title = f'Isi Penilaian Diri {kriteria.kode} - {audit_session.program_studi}'
+    else:
+        title = f'Isi Seluruh Penilaian Diri - {audit_session.program_studi}'
+    context = {
+        'formset': formset,
+        'grouped_forms': grouped_forms,
+        'audit_session': audit_session,
+        'kriteria': kriteria,
+        'title': title,
+    }
+    return render(request, 'ami/penilaian_diri_batch.html', context)
+
 @login_required
 def submit_penilaian_diri(request, session_id):
     """View untuk mengirim penilaian diri dan mengubah status sesi audit"""
-    audit_session = get_object_or_404(AuditSession, pk=session_id)
+    audit_session = get_object_or_404(AuditSession.objects.with_effective_status(), pk=session_id)
     
     # Periksa izin akses - hanya program studi yang bersangkutan yang bisa mengirim
-    if not check_program_studi_permission(request.user, audit_session.program_studi):
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengirim penilaian ini.")
     
     # Periksa status saat ini
-    if audit_session.status != 'PENILAIAN_MANDIRI':
+    if audit_session.status_efektif != 'PENILAIAN_MANDIRI':
         messages.error(request, "Penilaian hanya bisa dikirim saat status sesi adalah 'Penilaian Mandiri'.")
         return redirect('ami:audit_session_list')
     
@@ -863,52 +978,40 @@ def submit_penilaian_diri(request, session_id):
 @login_required
 def audit_list(request, session_id):
     """View untuk menampilkan daftar hasil audit"""
-    audit_session = get_object_or_404(AuditSession, pk=session_id)
+    audit_session = get_object_or_404(AuditSession.objects.select_related('program_studi'), pk=session_id)
     # Periksa izin akses - hanya auditor yang ditunjuk yang bisa mengakses
     if not check_audit_session_permission(request.user, audit_session):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengakses halaman ini.")
     
-    # Ambil semua elemen dari lembaga akreditasi prodi
-    lembaga = audit_session.program_studi.lembaga_akreditasi
-    semua_elemen = Elemen.objects.filter(
-        kriteria__lembaga_akreditasi=lembaga,
-        status='aktif'
-    ).order_by('kriteria__kode', 'kode')
+    # Ambil hasil audit untuk semua elemen aktif dari lembaga akreditasi prodi
+    pohon = katalog.pohon(audit_session.program_studi.lembaga_akreditasi_id)
+    semua_audit = Audit.objects.filter(
+        penilaian_diri__audit_session=audit_session,
+        penilaian_diri__elemen__kriteria_id__in=pohon.kriteria_ids,
+        penilaian_diri__elemen__status='aktif'
+    ).select_related(
+        'auditor', 'penilaian_diri', 'penilaian_diri__elemen'
+    ).order_by('penilaian_diri__elemen__kode')
     
-    # Untuk setiap elemen, pastikan ada penilaian diri dan audit
-    grouped_data = {}
-    elemen_count = 0
+    items = []
     elemen_teraudit = 0
     
-    for elemen in semua_elemen:
-        elemen_count += 1
-        # Dapatkan atau buat penilaian diri
-        penilaian_diri, created = PenilaianDiri.objects.get_or_create(
-            audit_session=audit_session,
-            elemen=elemen,
-            defaults={
-                'status': 'BELUM'
-            }
-        )
-        
-        # Dapatkan atau buat hasil audit
-        audit, created = Audit.objects.get_or_create(
-            penilaian_diri=penilaian_diri
-        )
+    for audit in semua_audit:
+        penilaian_diri = audit.penilaian_diri
         
         # Cek apakah elemen sudah diaudit
         if audit.skor is not None:
             elemen_teraudit += 1
         
-        # Kelompokkan berdasarkan kriteria
-        kriteria = elemen.kriteria
-        if kriteria not in grouped_data:
-            grouped_data[kriteria] = []
-        grouped_data[kriteria].append({
-            'elemen': elemen,
+        items.append({
+            'elemen': penilaian_diri.elemen,
             'penilaian_diri': penilaian_diri,
             'audit': audit
         })
+    elemen_count = len(items)
+    
+    # Kelompokkan berdasarkan kriteria (urutan kriteria dari katalog instrumen)
+    grouped_data = pohon.kelompokkan(items, lambda item: item['elemen'].kriteria_id)
     
     # Hitung statistik
     persentase_teraudit = (elemen_teraudit / elemen_count * 100) if elemen_count > 0 else 0
@@ -925,38 +1028,23 @@ def audit_list(request, session_id):
 @login_required
 def audit_update(request, pk):
     """View untuk memperbarui hasil audit"""
-    audit_item = get_object_or_404(Audit, pk=pk)
+    audit_item = get_object_or_404(Audit.objects.select_related('penilaian_diri'), pk=pk)
     penilaian_diri = audit_item.penilaian_diri
-    audit_session = penilaian_diri.audit_session
+    audit_session = AuditSession.objects.with_effective_status().get(pk=penilaian_diri.audit_session_id)
     
-    # Periksa izin akses - hanya auditor yang ditunjuk yang bisa mengakses
-    if not check_audit_session_permission(request.user, audit_session):
-        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengubah audit ini.")
-    
-    # Periksa apakah user adalah auditor
-    user_auditor = get_user_auditor(request.user)
+    user_auditor, pesan = periksa_audit_dapat_diubah(request.user, audit_session)
     if not user_auditor:
-        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengubah audit ini.")
-    
-    # Periksa status sesi audit
-    if audit_session.status != 'PENILAIAN_AUDITOR':
-        messages.error(request, "Audit hanya bisa dilakukan saat status sesi adalah 'Penilaian Auditor'.")
+        return HttpResponseForbidden(pesan)
+    if pesan:
+        messages.error(request, pesan)
         return redirect('ami:audit_list', session_id=audit_session.id)
     
-    # Periksa apakah masih dalam rentang tanggal penilaian auditor
-    today = timezone.now().date()
-    if audit_session.tanggal_mulai_penilaian_auditor and audit_session.tanggal_selesai_penilaian_auditor:
-        if today < audit_session.tanggal_mulai_penilaian_auditor or today > audit_session.tanggal_selesai_penilaian_auditor:
-            messages.error(request, "Audit hanya bisa dilakukan dalam rentang tanggal penilaian auditor.")
-            return redirect('ami:audit_list', session_id=audit_session.id)
-    
     if request.method == 'POST':
         form = AuditForm(request.POST, instance=audit_item)
-        if form.is_valid():
-            audit = form.save(commit=False)
-            # Set auditor ke user yang sedang login
-            audit.auditor = user_auditor
-            audit.save()
+        # Set auditor ke user yang sedang login
+        if form.is_valid() and simpan_form_bersyarat(
+            request, form, audit_item, audit_session.id, {'auditor': user_auditor}
+        ):
             messages.success(request, 'Hasil audit berhasil diperbarui.')
             return redirect('ami:audit_list', session_id=audit_session.id)
     else:
@@ -966,11 +1054,96 @@ def audit_update(request, pk):
         'form': form,
         'audit_session': audit_session,
         'penilaian_diri': penilaian_diri,
+        'audit': audit_item,
+        'dokumen_pendukung': lampirkan_preview(penilaian_diri.dokumen_pendukung.all()),
         'title': f'Audit - {audit_session.program_studi} - {penilaian_diri.elemen.kode}'
     }
     return render(request, 'ami/audit_form.html', context)
 
 
+# ----------------------------
+# Views untuk Autosave (API)
+# ----------------------------
+def _autosave(request, obj, form_class, session_id, perubahan_tambahan=None):
+    """
+    Simpan sebagian field form secara langsung dari body JSON
+    {"versi": <int>, "<field>": <nilai>, ...}.
+
+    Hanya field milik form yang diterima dan validasinya memakai form yang
+    sama dengan halaman edit. Penyimpanan bersyarat pada kolom versi: bila
+    versi klien sudah usang dikembalikan 409 beserta versi dan nilai terbaru.
+    """
+    fields = list(form_class._meta.fields)
+    try:
+        patch = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Body request harus berupa JSON.'}, status=400)
+    if not isinstance(patch, dict):
+        return JsonResponse({'error': 'Body request harus berupa objek JSON.'}, status=400)
+
+    versi = patch.pop('versi', None)
+    if not isinstance(versi, int) or isinstance(versi, bool):
+        return JsonResponse({'error': 'Field "versi" wajib diisi dengan bilangan bulat.'}, status=400)
+    tidak_dikenal = sorted(set(patch) - set(fields))
+    if tidak_dikenal:
+        return JsonResponse({'error': f"Field tidak dapat diubah: {', '.join(tidak_dikenal)}."}, status=400)
+    if not patch:
+        return JsonResponse({'error': 'Tidak ada field yang diubah.'}, status=400)
+
+    def respons_konflik():
+        obj.refresh_from_db(fields=[*fields, 'versi'])
+        return JsonResponse({
+            'error': PESAN_KONFLIK_VERSI,
+            'versi': obj.versi,
+            'data': model_to_dict(obj, fields),
+        }, status=409)
+
+    if obj.versi != versi:
+        return respons_konflik()
+
+    # Field yang tidak dikirim diisi dengan nilai saat ini agar form tervalidasi utuh
+    data = model_to_dict(obj, fields)
+    data.update(patch)
+    form = form_class({k: '' if v is None else v for k, v in data.items()}, instance=obj)
+    if not form.is_valid():
+        return JsonResponse({
+            'errors': {field: [str(e) for e in errors] for field, errors in form.errors.items()},
+        }, status=400)
+
+    perubahan = {field: form.cleaned_data[field] for field in patch}
+    if perubahan_tambahan:
+        perubahan.update(perubahan_tambahan(form.cleaned_data))
+    if not perbarui_bersyarat(obj, perubahan, versi, session_id):
+        return respons_konflik()
+    return JsonResponse({'versi': obj.versi, 'data': model_to_dict(obj, fields)})
+
+@login_required
+@require_http_methods(['PATCH'])
+def penilaian_diri_autosave(request, pk):
+    """API autosave sebagian field penilaian diri (PATCH JSON)"""
+    penilaian = get_object_or_404(PenilaianDiri.objects.select_related('elemen', 'audit_session'), pk=pk)
+    if not check_program_studi_permission(request.user, penilaian.audit_session.program_studi_id):
+        return JsonResponse({'error': 'Anda tidak memiliki izin untuk mengubah penilaian diri ini.'}, status=403)
+
+    def status_terisi(cleaned_data):
+        return {'status': 'TERISI'} if cleaned_data.get('skor') is not None else {}
+
+    return _autosave(request, penilaian, PenilaianDiriForm, penilaian.audit_session_id, status_terisi)
+
+@login_required
+@require_http_methods(['PATCH'])
+def audit_autosave(request, pk):
+    """API autosave sebagian field hasil audit (PATCH JSON)"""
+    audit_item = get_object_or_404(Audit.objects.select_related('penilaian_diri'), pk=pk)
+    session_id = audit_item.penilaian_diri.audit_session_id
+    audit_session = AuditSession.objects.with_effective_status().get(pk=session_id)
+    user_auditor, pesan = periksa_audit_dapat_diubah(request.user, audit_session)
+    if not user_auditor or pesan:
+        return JsonResponse({'error': pesan}, status=403)
+
+    # Sama seperti audit_update: auditor diisi dengan user yang sedang login
+    return _autosave(request, audit_item, AuditForm, session_id, lambda cleaned_data: {'auditor': user_auditor})
+
 # ----------------------------
 # Views untuk Dokumen Pendukung
 # ----------------------------
@@ -980,7 +1153,7 @@ def dokumen_pendukung_create(request, penilaian_id):
     penilaian = get_object_or_404(PenilaianDiri, pk=penilaian_id)
     audit_session = penilaian.audit_session
     # Periksa izin akses
-    if not check_program_studi_permission(request.user, audit_session.program_studi):
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengunggah dokumen pendukung ini.")
     if request.method == 'POST':
         form = DokumenPendukungForm(request.POST, request.FILES)
@@ -1006,7 +1179,7 @@ def dokumen_pendukung_delete(request, pk):
     audit_session = penilaian.audit_session
     
     # Periksa izin akses
-    if not check_program_studi_permission(request.user, audit_session.program_studi):
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk menghapus dokumen ini.")
     
     if request.method == 'POST':
@@ -1019,6 +1192,139 @@ def dokumen_pendukung_delete(request, pk):
         'dokumen': dokumen
     })
 
+@login_required
+def dokumen_pendukung_unduh(request, pk):
+    """View untuk mengunduh berkas dokumen pendukung (hanya prodi dan auditor sesi)"""
+    dokumen = get_object_or_404(
+        DokumenPendukung.objects.select_related('penilaian_diri__audit_session'), pk=pk
+    )
+    if not check_audit_session_permission(request.user, dokumen.penilaian_diri.audit_session):
+        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengunduh dokumen ini.")
+    if not dokumen.file:
+        raise Http404("Berkas dokumen tidak ditemukan.")
+    return respons_berkas(request, dokumen.file, nama=dokumen.nama, as_attachment=False)
+
+@login_required
+def dokumen_pendukung_preview(request, pk):
+    """View untuk gambar preview halaman pertama dokumen pendukung (lihat ami.utils.preview)"""
+    dokumen = get_object_or_404(
+        DokumenPendukung.objects.select_related('penilaian_diri__audit_session'), pk=pk
+    )
+    if not check_audit_session_permission(request.user, dokumen.penilaian_diri.audit_session):
+        return HttpResponseForbidden("Anda tidak memiliki izin untuk melihat dokumen ini.")
+    lampirkan_preview([dokumen])
+    if not dokumen.preview_siap:
+        raise Http404("Preview dokumen belum tersedia.")
+    hash_hex = hash_dari_nama(dokumen.file.name)
+    return kirim_berkas(
+        request, dokumen.file.storage, path_preview(hash_hex), f'preview-{hash_hex[:12]}.png', 'image/png',
+        as_attachment=False, etag=f'"preview-{hash_hex}"',
+    )
+
+# ----------------------------
+# Views untuk Unggahan Bertahap (API)
+# ----------------------------
+def _status_unggahan(unggahan, status=200):
+    return JsonResponse({
+        'id': str(unggahan.pk),
+        'url': reverse('ami:unggahan_detail', args=[unggahan.pk]),
+        'url_selesai': reverse('ami:unggahan_selesai', args=[unggahan.pk]),
+        'offset': unggahan.diterima,
+        'ukuran': unggahan.ukuran,
+        'ukuran_chunk': ukuran_chunk(),
+        'status': unggahan.status,
+    }, status=status)
+
+def _kesalahan_unggahan(unggahan, error):
+    """ValidationError dari ami.utils.unggahan: offset tidak sesuai → 409, lainnya 400"""
+    respons = JsonResponse({
+        'error': ' '.join(error.messages),
+        'offset': unggahan.diterima,
+    }, status=409 if error.code in ('offset', 'status') else 400)
+    respons['Upload-Offset'] = str(unggahan.diterima)
+    return respons
+
+def _ambil_unggahan(request, pk):
+    # Unggahan hanya dapat dilanjutkan oleh pengguna yang memulainya
+    return get_object_or_404(UnggahanBertahap, pk=pk, pengguna=request.user)
+
+@login_required
+@require_http_methods(['POST'])
+def unggahan_mulai(request, penilaian_id):
+    """
+    API untuk memulai unggahan bertahap dokumen pendukung. Body JSON:
+    {nama, deskripsi, nama_berkas, ukuran, checksum}.
+    """
+    penilaian = get_object_or_404(PenilaianDiri.objects.select_related('audit_session'), pk=penilaian_id)
+    if not check_program_studi_permission(request.user, penilaian.audit_session.program_studi_id):
+        return JsonResponse({'error': 'Anda tidak memiliki izin untuk mengunggah dokumen pendukung ini.'}, status=403)
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Body request harus berupa JSON.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Body request harus berupa objek JSON.'}, status=400)
+
+    form = UnggahanBertahapForm({k: '' if v is None else v for k, v in data.items()})
+    if not form.is_valid():
+        return JsonResponse({
+            'errors': {field: [str(e) for e in errors] for field, errors in form.errors.items()},
+        }, status=400)
+    unggahan = form.save(commit=False)
+    unggahan.penilaian_diri = penilaian
+    unggahan.pengguna = request.user
+    unggahan.save()
+    return _status_unggahan(unggahan, status=201)
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def unggahan_detail(request, pk):
+    """
+    API unggahan bertahap: GET melihat offset untuk melanjutkan, PUT mengirim
+    satu potongan (body mentah, header Upload-Offset dan opsional
+    Upload-Checksum berisi SHA-256 potongan), DELETE membatalkan.
+    """
+    unggahan = _ambil_unggahan(request, pk)
+    if request.method == 'GET':
+        return _status_unggahan(unggahan)
+    if request.method == 'DELETE':
+        if unggahan.status != 'AKTIF':
+            return JsonResponse({'error': 'Unggahan ini sudah selesai.'}, status=409)
+        unggahan.delete()
+        return HttpResponse(status=204)
+
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        panjang = int(request.META['CONTENT_LENGTH'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Header Upload-Offset dan Content-Length wajib diisi.'}, status=400)
+    try:
+        # request dibaca langsung sebagai stream, bukan lewat request.body
+        tulis_chunk(unggahan, offset, request, panjang, request.headers.get('Upload-Checksum'))
+    except ValidationError as e:
+        return _kesalahan_unggahan(unggahan, e)
+    return _status_unggahan(unggahan)
+
+@login_required
+@require_http_methods(['POST'])
+def unggahan_selesai(request, pk):
+    """API untuk menyelesaikan unggahan bertahap. Body JSON opsional: {checksum}"""
+    unggahan = _ambil_unggahan(request, pk)
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Body request harus berupa JSON.'}, status=400)
+    checksum = data.get('checksum') if isinstance(data, dict) else None
+    try:
+        dokumen = selesaikan_unggahan(unggahan, checksum if isinstance(checksum, str) else None)
+    except ValidationError as e:
+        return _kesalahan_unggahan(unggahan, e)
+    messages.success(request, 'Dokumen pendukung berhasil diunggah.')
+    return JsonResponse({
+        'dokumen_id': dokumen.pk,
+        'redirect': reverse('ami:penilaian_diri_list', args=[unggahan.penilaian_diri.audit_session_id]),
+    }, status=201)
+
 # ----------------------------
 # Views untuk Rekomendasi Tindak Lanjut
 # ----------------------------
@@ -1052,7 +1358,7 @@ def rekomendasi_tindak_lanjut_update(request, pk):
     audit_session = audit.penilaian_diri.audit_session
     
     # Periksa izin akses - hanya program studi yang bersangkutan yang bisa memperbarui status
-    if not check_program_studi_permission(request.user, audit_session.program_studi):
+    if not check_program_studi_permission(request.user, audit_session.program_studi_id):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk memperbarui rekomendasi ini.")
     
     if request.method == 'POST':
@@ -1071,6 +1377,18 @@ def rekomendasi_tindak_lanjut_update(request, pk):
         'title': f'Update Tindak Lanjut - {audit_session.program_studi}'
     })
 
+@login_required
+def rekomendasi_bukti_unduh(request, pk):
+    """View untuk mengunduh bukti tindak lanjut (hanya prodi dan auditor sesi)"""
+    rekomendasi = get_object_or_404(
+        RekomendasiTindakLanjut.objects.select_related('audit__penilaian_diri__audit_session'), pk=pk
+    )
+    if not check_audit_session_permission(request.user, rekomendasi.audit.penilaian_diri.audit_session):
+        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengunduh bukti ini.")
+    if not rekomendasi.bukti_tindak_lanjut:
+        raise Http404("Bukti tindak lanjut belum diunggah.")
+    return respons_berkas(request, rekomendasi.bukti_tindak_lanjut, as_attachment=False)
+
 
 # ----------------------------
 # View untuk Laporan auditi
@@ -1078,98 +1396,44 @@ def rekomendasi_tindak_lanjut_update(request, pk):
 @login_required
 def laporan_audit(request, session_id):
     """View untuk menampilkan laporan audit"""
-    audit_session = get_object_or_404(AuditSession, pk=session_id)
+    audit_session = get_object_or_404(AuditSession.objects.select_related('program_studi'), pk=session_id)
     # izin akses
     if not check_audit_session_permission(request.user, audit_session):
         return HttpResponseForbidden("Anda tidak memiliki izin untuk mengakses laporan ini.")
-    # semua penilaian diri dan hasil audit
-    penilaian_diri_list = PenilaianDiri.objects.filter(
-        audit_session=audit_session
-    ).select_related(
-        'elemen', 'elemen__kriteria'  
-    ).prefetch_related(
-        'dokumen_pendukung'
-    ).order_by('elemen__kode')  
-
-    # Hitung statistik untuk laporan
-    total_indikator = penilaian_diri_list.count()
-    indikator_terisi = penilaian_diri_list.exclude(skor__isnull=True).count()
-    persentase_terisi = (indikator_terisi / total_indikator * 100) if total_indikator > 0 else 0
-    
-    # --- Hitung skor per kriteria untuk tabel ---
-    kriteria_scores = []
-    kriteria_list = audit_session.program_studi.lembaga_akreditasi.kriteria.all()
-    for kriteria in kriteria_list:
-        total_skor, count = 0, 0
-        for elemen in kriteria.elemen.all():
-            try:
-                penilaian = PenilaianDiri.objects.get(audit_session=audit_session, elemen=elemen)
-                if penilaian.skor is not None:
-                    total_skor += float(penilaian.skor)
-                    count += 1
-            except PenilaianDiri.DoesNotExist:
-                pass
-        if count > 0:
-            kriteria_scores.append({
-                "kriteria": kriteria,
-                "rata_rata": round(total_skor / count, 2),
-                "count": count,
-            })
-    
-    # Hitung skor keseluruhan
-    total_skor = sum(item["rata_rata"] * item["count"] for item in kriteria_scores)
-    total_count = sum(item["count"] for item in kriteria_scores)
-    skor_akhir = round(total_skor / total_count, 2) if total_count > 0 else 0
-
-    # --- Data Radar Chart  ---
-    radar_labels, radar_pd = [], []
-    for item in kriteria_scores:
-        radar_labels.append(item["kriteria"].nama)
-        radar_pd.append(item["rata_rata"])
 
-    context = {
-        'audit_session': audit_session,
-        'penilaian_diri_list': penilaian_diri_list,
-        'total_indikator': total_indikator,
-        'indikator_terisi': indikator_terisi,
-        'persentase_terisi': persentase_terisi,
-        'kriteria_scores': kriteria_scores,
-        'skor_akhir': skor_akhir,
-        "radar_labels": radar_labels,
-        "radar_pd": radar_pd,
-        
-    }
+    # Statistik, skor per kriteria dan data radar chart (di-cache per versi data sesi)
+    context = {'audit_session': audit_session}
+    context.update(konteks_laporan(audit_session, 'audit'))
     return render(request, 'ami/laporan_audit.html', context)
 
 
 
+@login_required
+def laporan_cache_stats(request):
+    """API statistik hit/miss cache laporan (khusus superuser)"""
+    if not request.user.is_superuser:
+        return HttpResponseForbidden("Anda tidak memiliki izin untuk mengakses halaman ini.")
+    return JsonResponse(statistik_cache())
+
 @login_required
 def laporan_index_audit(request):
     """Index daftar sesi audit untuk melihat laporan"""
     user_program_studi = get_user_program_studi(request.user)
     user_auditor = get_user_auditor(request.user)
 
-    qs = AuditSession.objects.select_related('program_studi', 'auditor_ketua')\
-        .prefetch_related('auditor_anggota').all()
-
-    if not request.user.is_superuser:
-        if user_program_studi:
-            qs = qs.filter(program_studi=user_program_studi)
-        elif user_auditor:
-            qs = qs.filter(Q(auditor_ketua=user_auditor) | Q(auditor_anggota=user_auditor)).distinct()
+    qs = AuditSession.objects.visible_to(request.user).with_effective_status()\
+        .select_related('program_studi', 'auditor_ketua')\
+        .prefetch_related('auditor_anggota')
 
    
     program_studi_id = request.GET.get('program_studi')
     if program_studi_id:
         qs = qs.filter(program_studi_id=program_studi_id)
 
-    qs = qs.order_by('-tanggal_mulai_penilaian_mandiri')
+    paginator = KeysetPaginator(qs, 10)
+    audit_sessions = paginator.get_page(request.GET.get('cursor'))
 
-    paginator = Paginator(qs, 10)
-    page_number = request.GET.get('page')
-    audit_sessions = paginator.get_page(page_number)
-
-    programs = ProgramStudi.objects.all().order_by('nama')
+    programs = katalog.program_studi()
 
     return render(request, 'ami/laporan_index_audit.html', {
         'audit_sessions': audit_sessions,
@@ -1197,78 +1461,21 @@ def laporan_auditor(request, session_id: int):
     ketua/anggota atau superuser yang dapat akses.
     """
     session = get_object_or_404(
-        AuditSession.objects.select_related('program_studi', 'auditor_ketua')
+        AuditSession.objects.with_effective_status()
+                            .select_related('program_studi', 'auditor_ketua')
                             .prefetch_related('auditor_anggota'),
         pk=session_id
     )
 
     # akses
-    auditor_profile = getattr(request.user, 'auditor', None)
     if not request.user.is_superuser:
-        if auditor_profile is None:
+        if request.peran.auditor is None:
             return HttpResponseForbidden("Halaman dapat diakses oleh auditor.")
-        is_ketua = (session.auditor_ketua_id == auditor_profile.id)
-        is_anggota = session.auditor_anggota.filter(pk=auditor_profile.id).exists()
-        if not (is_ketua or is_anggota):
+        if not check_auditor_session_permission(request.user, session):
             return HttpResponseForbidden("Anda tidak memiliki akses untuk melihat laporan auditor.")
 
-    # Data audit 
-    audits = (
-        Audit.objects
-        .select_related(
-            'auditor',
-            'penilaian_diri',
-            'penilaian_diri__elemen',
-            'penilaian_diri__elemen__kriteria',
-        )
-        .filter(penilaian_diri__audit_session=session)
-        .order_by(
-            'penilaian_diri__elemen__kriteria__nama',  
-            'penilaian_diri__elemen__kode'
-        )
-    )
-
-    # Statistik ringkas
-    stats = {
-        "total": audits.count(),
-        "avg_skor": round(audits.aggregate(v=Avg('skor'))['v'] or 0, 2),
-        "kategori": list(
-            audits.values('kategori_kondisi')
-                  .annotate(jumlah=Count('id'))
-                  .order_by()
-        ),
-    }
-
-    # --- Rekap "Skor per Kriteria (Penilaian Auditor)" ---
-    agg = (
-        audits.values(
-            'penilaian_diri__elemen__kriteria_id',
-            'penilaian_diri__elemen__kriteria__nama',
-        )
-        .annotate(
-            # untuk "jumlah indikator"  ganti ke Count('penilaian_diri__indikator_id', distinct=True)
-            jumlah_indikator=Count('penilaian_diri__elemen_id', distinct=True),
-            rata=Avg('skor'),
-        )
-        .order_by('penilaian_diri__elemen__kriteria__nama')
-    )
-
-    kriteria_scores_auditor = [
-        {
-            "nama": x["penilaian_diri__elemen__kriteria__nama"],
-            "jumlah": x["jumlah_indikator"],
-            "rata_rata": round(x["rata"] or 0, 2),
-        }
-        for x in agg
-    ]
-
-    
-    ctx = {
-        "audit_session": session,
-        "audits": audits,
-        "stats": stats,
-        "kriteria_scores_auditor": kriteria_scores_auditor,
-    }
+    ctx = {"audit_session": session}
+    ctx.update(konteks_laporan(session, 'auditor'))
     return render(request, "ami/laporan_auditor.html", ctx)
 
 
@@ -1276,18 +1483,18 @@ def laporan_auditor(request, session_id: int):
 @login_required
 def laporan_index_auditor(request):
     
-    auditor = getattr(request.user, 'auditor', None)
+    auditor = request.peran.auditor
 
     # Jika bukan auditor dan bukan superuser -> tolak
     if not (request.user.is_superuser or auditor):
         return HttpResponseForbidden("Halaman ini khusus untuk auditor.")
 
-    qs = (AuditSession.objects
+    # Auditor hanya melihat sesi yang ditugaskan kepadanya
+    qs = (AuditSession.objects.visible_to(request.user).with_effective_status()
           .select_related('program_studi',
             'program_studi__lembaga_akreditasi',
             'auditor_ketua')
-          .prefetch_related('auditor_anggota')
-          .all())
+          .prefetch_related('auditor_anggota'))
 
    # --- filters lembaga    ---
     status = request.GET.get('status', '').strip()
@@ -1295,7 +1502,7 @@ def laporan_index_auditor(request):
     lembaga_id = request.GET.get('lembaga', '').strip()  # dari <select name="lembaga">
 
     if status:
-        qs = qs.filter(status=status)
+        qs = qs.filter(status_efektif=status)
 
     if q:
         qs = qs.filter(Q(tahun_akademik__icontains=q) | Q(semester__icontains=q))
@@ -1304,17 +1511,14 @@ def laporan_index_auditor(request):
         qs = qs.filter(program_studi__lembaga_akreditasi_id=lembaga_id)
     
     
-    qs = qs.order_by('-tanggal_mulai_penilaian_mandiri')
-
-    paginator = Paginator(qs, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(qs, 12)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
 
     return render(request, 'ami/laporan_index_auditor.html', {
         'audit_sessions': page_obj,
         'status_selected': status,
         'q': q,
-        'lembaga_list': LembagaAkreditasi.objects.all(),  
+        'lembaga_list': katalog.lembaga_akreditasi(),
         'lembaga_selected': lembaga_id,                  
     })
 
@@ -1338,9 +1542,9 @@ def kriteria_list(request, lembaga_id=None):
     lembaga = None
     if lembaga_id:
         lembaga = get_object_or_404(LembagaAkreditasi, pk=lembaga_id)
-        kriteria_list = Kriteria.objects.filter(lembaga_akreditasi=lembaga).order_by('kode')
+        kriteria_list = Kriteria.objects.filter(lembaga_akreditasi=lembaga).select_related('lembaga_akreditasi').order_by('kode')
     else:
-        kriteria_list = Kriteria.objects.all().order_by('kode')
+        kriteria_list = Kriteria.objects.select_related('lembaga_akreditasi').order_by('kode')
     
     # Pagination
     paginator = Paginator(kriteria_list, 10)
@@ -1348,7 +1552,7 @@ def kriteria_list(request, lembaga_id=None):
     kriteria = paginator.get_page(page_number)
     
     # Ambil semua lembaga akreditasi untuk filter
-    lembaga_akreditasi = LembagaAkreditasi.objects.all().order_by('nama')
+    lembaga_akreditasi = katalog.lembaga_akreditasi()
     
     return render(request, 'ami/kriteria_list.html', {
         'kriteria': kriteria,
@@ -1409,8 +1613,8 @@ def kriteria_update(request, pk):
 @login_required
 def kriteria_detail(request, pk):
     """View untuk detail kriteria"""
-    kriteria = get_object_or_404(Kriteria, pk=pk)
-    elemen_list = kriteria.elemen.all().order_by('kode')
+    kriteria = get_object_or_404(Kriteria.objects.select_related('lembaga_akreditasi'), pk=pk)
+    elemen_list = katalog.pohon(kriteria.lembaga_akreditasi_id).kriteria_by_id[kriteria.pk].elemen
     
     return render(request, 'ami/kriteria_detail.html', {
         'kriteria': kriteria,
@@ -1550,8 +1754,6 @@ def elemen_delete(request, pk):
 #---------------------
 #  VIEW UNTUK LAPORAN INTERNAL
 #---------------------
-import json, re
-
 @login_required
 def laporan_internal(request, session_id: int):
     """
@@ -1560,7 +1762,8 @@ def laporan_internal(request, session_id: int):
     """
     # Ambil sesi + relasi penting
     session = get_object_or_404(
-        AuditSession.objects.select_related('program_studi', 'auditor_ketua')
+        AuditSession.objects.with_effective_status()
+                            .select_related('program_studi', 'auditor_ketua')
                             .prefetch_related('auditor_anggota'),
         pk=session_id
     )
@@ -1569,29 +1772,11 @@ def laporan_internal(request, session_id: int):
     # - superuser 
     # - auditor yang ditugaskan
     if not (request.user.is_superuser or request.user.is_staff):
-        auditor_profile = getattr(request.user, 'auditor', None)
-        if not auditor_profile:
+        if request.peran.auditor is None:
             return HttpResponseForbidden("Halaman ini tidak dapat diakses.")
-        is_ketua = (session.auditor_ketua_id == auditor_profile.id)
-        is_anggota = session.auditor_anggota.filter(pk=auditor_profile.id).exists()
-        if not (is_ketua or is_anggota):
+        if not check_auditor_session_permission(request.user, session):
             return HttpResponseForbidden("Anda tidak memiliki akses untuk melihat laporan ini.")
 
-    # Data hasil audit (pakai ELEMEN)
-    audits = (
-        Audit.objects
-        .select_related(
-            'auditor',
-            'penilaian_diri',
-            'penilaian_diri__elemen',
-            'penilaian_diri__elemen__kriteria',
-            
-        )
-        .filter(penilaian_diri__audit_session=session)
-        .order_by('penilaian_diri__elemen__kriteria__nama',
-                  'penilaian_diri__elemen__kode')
-    )
-
     #koordinator prodi
     koordinator_prodi = (
         KoordinatorProgramStudi.objects
@@ -1600,75 +1785,9 @@ def laporan_internal(request, session_id: int):
         .order_by('-id')  
         .first())
     
-    # rata-rata kriteria
-    kriteria_avg = (
-        PenilaianDiri.objects
-        .filter(audit_session=session, skor__isnull=False)
-        .values(
-            "elemen__kriteria__id",
-            "elemen__kriteria__kode",
-            "elemen__kriteria__nama",
-        )
-        .annotate(avg_skor=Avg("skor"))  # rata-rata skor semua elemen dalam kriteria
-        .order_by("elemen__kriteria__kode", "elemen__kriteria__nama")
-    )
-
-    chart_labels = []
-    chart_scores = []
-    for k in kriteria_avg:
-        kode = k["elemen__kriteria__kode"] or ""
-        nama = k["elemen__kriteria__nama"] or ""
-        label = f"{nama}" if kode else (nama or "-")
-        chart_labels.append(label)
-        chart_scores.append(round(k["avg_skor"] or 0, 2))
-
-    # Narasi 
-    if chart_scores:
-        best_i = max(range(len(chart_scores)), key=lambda i: chart_scores[i])
-        worst_i = min(range(len(chart_scores)), key=lambda i: chart_scores[i])
-        best_label = chart_labels[best_i]
-        worst_label = chart_labels[worst_i]
-    else:
-        best_label = worst_label = "-"
-
-   # Hitung total elemen dan elemen tanpa dokumen
-    total_dokumen_dibutuhkan = 0
-    belum_disipakan = 0
-
-    for k in session.program_studi.lembaga_akreditasi.kriteria.all():
-        for elemen in k.elemen.all():
-         total_dokumen_dibutuhkan += 1
-         pd = PenilaianDiri.objects.filter(audit_session=session, elemen=elemen).first()
-        if not pd or not pd.bukti_dokumen:  # kalau kosong / NULL
-            belum_disipakan += 1
-
-    # hitung persentase
-    persen_belum = round((belum_disipakan / total_dokumen_dibutuhkan) * 100, 2) if total_dokumen_dibutuhkan else 0
-
-    #hitung kategori
-    # Hitung jumlah temuan per kategori_kondisi
-    kategori_counts = (
-    audits.values("kategori_kondisi")
-          .annotate(jumlah=Count("id"))
-          .order_by()
-    )
-
-    
-    kategori_map = {k["kategori_kondisi"]: k["jumlah"] for k in kategori_counts}
-
-
-
     ctx = {
         "audit_session": session,
-        "audits": audits,
         "koordinator_prodi": koordinator_prodi,
-        "chart_labels_json": json.dumps(chart_labels),  
-        "chart_scores_json": json.dumps(chart_scores),
-        "best_label": best_label,
-        "worst_label": worst_label,
-        "total_dokumen_dibutuhkan": total_dokumen_dibutuhkan,
-        "belum_disipakan": belum_disipakan,
-        "persen_belum": persen_belum,
-        "kategori_map": kategori_map,
     }
+    ctx.update(konteks_laporan(session, 'internal'))
     return render(request, "ami/laporan_internal.html", ctx)
\ No newline at end of file
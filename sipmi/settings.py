@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,6 +50,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "ami.middleware.PeranPenggunaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -140,18 +143,79 @@ CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = 'Asia/Jakarta'  # Sesuaikan zona waktu Anda
+# Harus sama dengan zona tanggal transisi status sesi (timezone.now().date(),
+# UTC) agar sapuan harian berjalan setelah tanggal berganti
+CELERY_TIMEZONE = 'UTC'
+
+# Tugas transisi sesi (ETA) hanya dikirim untuk batas fase dalam jendela ini;
+# batas yang lebih jauh dijadwalkan oleh sapuan harian. Harus lebih dari 24
+# jam agar batas tengah malam berikutnya terjangkau dari sapuan pukul 00:05.
+AMI_TRANSISI_JENDELA = 26 * 60 * 60  # detik
+# Redis mengirim ulang tugas yang belum di-ack setelah visibility_timeout
+# (bawaan 1 jam), termasuk tugas ETA yang masih menunggu di worker: harus
+# lebih panjang dari ETA terjauh
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': AMI_TRANSISI_JENDELA + 4 * 60 * 60}
 
 # Untuk Celery Beat (scheduler)
 CELERY_BEAT_SCHEDULE = {
+    # Transisi tepat waktu dijadwalkan per sesi (ami.utils.penjadwalan);
+    # sapuan harian ini menerapkan transisi yang terlewat dan mengirim tugas
+    # untuk batas fase dalam AMI_TRANSISI_JENDELA berikutnya
     'update-audit-sessions-daily': {
         'task': 'ami.tasks.update_audit_sessions_status',
-        'schedule': 60 * 60 * 24,  # Setiap 24 jam (dalam detik)
-        # ATAU pakai crontab (butuh import):
-        # 'schedule': crontab(hour=0, minute=5),
+        'schedule': crontab(hour=0, minute=5),
+    },
+    'bersihkan-unggahan-bertahap': {
+        'task': 'ami.tasks.bersihkan_unggahan_bertahap',
+        'schedule': crontab(minute=30),
     },
 }
 
+# --- Cache ---
+# Versi data laporan (ami.utils.report_cache) dan versi katalog instrumen
+# (ami.utils.katalog) harus terlihat oleh semua worker, jadi cache harus
+# bersama antarproses
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/1",
+    }
+}
+# Test suite memakai LocMemCache lewat runner ini, tidak bergantung pada Redis
+TEST_RUNNER = 'sipmi.test_runner.PenjalanTest'
+AMI_LAPORAN_CACHE_TIMEOUT = 60 * 60  # detik
+AMI_KATALOG_TIMEOUT = 5 * 60  # detik, umur maksimum katalog instrumen di memori proses
+
+# Cache hasil parse workbook impor instrumen (per hash isi file)
+AMI_IMPORT_CACHE_DIR = BASE_DIR / '.cache' / 'import'
+
 #media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Berkas bukti (dokumen pendukung, bukti tindak lanjut) disimpan sekali per
+# isi berkas di MEDIA_ROOT/blob/ dengan jumlah referensi (BlobBerkas)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "berkas": {"BACKEND": "ami.utils.storage.ContentAddressedStorage"},
+}
+
+# Unggahan bertahap (chunked) dokumen pendukung, lihat ami.utils.unggahan
+AMI_UNGGAHAN_CHUNK = 8 * 1024 * 1024  # byte, ukuran maksimum satu potongan
+AMI_UNGGAHAN_MAKS = 500 * 1024 * 1024  # byte, ukuran maksimum satu berkas
+AMI_UNGGAHAN_KEDALUWARSA = 24 * 60 * 60  # detik tanpa aktivitas sebelum unggahan dibuang
+
+# Unduhan berkas bukti lewat view berizin (ami.utils.unduhan). MEDIA_ROOT
+# tidak boleh disajikan langsung ke publik; di produksi isi berkas dikirim
+# web server setelah izin diperiksa:
+#   'x-accel-redirect' (nginx), dengan lokasi internal, misalnya
+#       location /media-internal/ { internal; alias /path/ke/media/; }
+#   'x-sendfile' (Apache mod_xsendfile / lighttpd)
+# None: berkas di-stream oleh Django (pengembangan), mendukung header Range
+AMI_MEDIA_OFFLOAD = None
+AMI_MEDIA_INTERNAL_URL = '/media-internal/'
+
+# Preview halaman pertama dokumen pendukung (ami.utils.preview), dibuat oleh
+# Celery bila Pillow (gambar) / PyMuPDF (PDF) terpasang
+AMI_PREVIEW_LEBAR = 320  # piksel
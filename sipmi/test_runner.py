@@ -0,0 +1,21 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+CACHE_TEST = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+
+class PenjalanTest(DiscoverRunner):
+    """Runner test bawaan dengan cache di memori proses alih-alih Redis"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_test = override_settings(CACHES=CACHE_TEST)
+        self._cache_test.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_test.disable()
+        super().teardown_test_environment(**kwargs)